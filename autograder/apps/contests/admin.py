@@ -19,7 +19,7 @@ class ContestAdmin(admin.ModelAdmin):
             'fields': ('rated', 'tjioi', 'season'),
         }),
         ('Schedule', {
-            'fields': ('start', 'end'),
+            'fields': ('start', 'end', 'freeze_minutes'),
         }),
     )
 
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ContestsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "autograder.apps.contests"
+
+    def ready(self):
+        import autograder.apps.contests.signals  # noqa: F401
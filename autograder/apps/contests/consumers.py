@@ -0,0 +1,43 @@
+import json
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+from .models import Contest
+from .utils import standings_group
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StandingsConsumer(AsyncWebsocketConsumer):
+    async def connect(self):
+        user = self.scope["user"]
+        cid = int(self.scope["url_route"]["kwargs"]["cid"])
+        contest = await database_sync_to_async(Contest.objects.filter(id=cid).first)()
+
+        if not user.is_authenticated or contest is None:
+            await self.close()
+            return
+        if contest.tjioi and not user.is_staff and not user.is_tjioi:
+            await self.close()
+            return
+
+        # staff keep receiving updates during the freeze, everyone else
+        # receives the frozen standings
+        self.group_name = standings_group(cid, user.is_staff)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        if hasattr(self, "group_name"):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def standings_delta(self, event):
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "pnum": event["pnum"],
+                    "rows": event["rows"],
+                    "removed": event["removed"],
+                }
+            )
+        )
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from ...models import Contest
+from ...utils import rebuild_standings
+
+
+class Command(BaseCommand):
+    help = "Recomputes the standings of contests from their submissions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "contests", nargs="*", type=int, help="contest ids (default: all)"
+        )
+
+    def handle(self, *args, **options):
+        contests = Contest.objects.all()
+        if options["contests"]:
+            contests = contests.filter(id__in=options["contests"])
+
+        for contest in contests:
+            rebuild_standings(contest.id)
+            self.stdout.write(f"Rebuilt standings for {contest}")
+
+        self.stdout.write(self.style.SUCCESS("Standings rebuilt."))
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+
+def build_cells(apps, schema_editor):
+    Contest = apps.get_model("contests", "Contest")
+    StandingsCell = apps.get_model("contests", "StandingsCell")
+    Submission = apps.get_model("runtests", "Submission")
+
+    for contest in Contest.objects.all():
+        subs = (
+            Submission.objects.filter(
+                contest=contest, timestamp__range=(contest.start, contest.end)
+            )
+            .order_by("usr_id", "problem_id", "timestamp", "id")
+            .values_list("usr_id", "problem_id", "verdict", "timestamp")
+        )
+
+        cells = {}
+        for usr_id, problem_id, verdict, timestamp in subs.iterator():
+            cell = cells.setdefault(
+                (usr_id, problem_id),
+                StandingsCell(contest=contest, usr_id=usr_id, problem_id=problem_id),
+            )
+            if cell.solved_at is not None or verdict in ("Skipped", "Rerun"):
+                continue
+            cell.attempts += 1
+            if verdict in ("Accepted", "AC"):
+                minutes = int((timestamp - contest.start).total_seconds() / 60)
+                cell.solved_at = timestamp
+                cell.penalty = minutes + 5 * cell.attempts
+
+        StandingsCell.objects.bulk_create(
+            [cell for cell in cells.values() if cell.attempts], batch_size=1000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contests", "0004_standingscell"),
+        ("runtests", "0014_submission_started_at_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(build_cells, migrations.RunPython.noop),
+    ]
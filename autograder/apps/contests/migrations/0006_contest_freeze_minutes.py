@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contests', '0005_build_standings_cells'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contest',
+            name='freeze_minutes',
+            field=models.IntegerField(default=0),
+        ),
+    ]
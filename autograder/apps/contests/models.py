@@ -1,4 +1,6 @@
+from datetime import timedelta
 from django.db import models
+from django.utils import timezone
 from ..index.models import GraderUser
 
 class Contest(models.Model):
@@ -11,6 +13,42 @@ class Contest(models.Model):
     end = models.DateTimeField()
     editorial = models.URLField(null=True, blank=True)
     writers = models.ManyToManyField(GraderUser)
+    # minutes before the end during which non-staff standings stop updating
+    freeze_minutes = models.IntegerField(default=0)
 
     def __str__(self):
         return self.name
+
+    @property
+    def freeze_time(self):
+        return self.end - timedelta(minutes=self.freeze_minutes)
+
+    def is_frozen(self):
+        return self.freeze_minutes > 0 and self.freeze_time <= timezone.now() < self.end
+
+
+class StandingsCell(models.Model):
+    """
+    One user's result on one problem of a contest, kept up to date from their
+    submissions by the signals in signals.py. The scoreboard is built from
+    these instead of from the submissions.
+    """
+
+    contest = models.ForeignKey(Contest, on_delete=models.CASCADE)
+    usr = models.ForeignKey(GraderUser, on_delete=models.CASCADE)
+    problem = models.ForeignKey("problems.Problem", on_delete=models.CASCADE)
+    # counts every attempt up to and including the first accepted one
+    attempts = models.IntegerField(default=0)
+    solved_at = models.DateTimeField(null=True, blank=True)
+    # minutes into the contest plus 5 per attempt, once solved
+    penalty = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["contest", "usr", "problem"], name="unique_standings_cell"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.usr} on {self.problem}"
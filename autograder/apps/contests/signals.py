@@ -0,0 +1,53 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Contest
+from .tasks import schedule_standings_update
+from .utils import invalidate_standings, rebuild_standings, update_cell
+from ..problems.models import Problem
+from ..runtests.models import Submission
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Submission)
+@receiver(post_delete, sender=Submission)
+def update_standings_cell(sender, instance, **kwargs):
+    contest = instance.contest
+    if not contest.start <= instance.timestamp <= contest.end:
+        # practice submissions never reach the standings
+        return
+
+    # after commit, so that the cell is computed from the committed verdict
+    # robust: a failure here must not fail the request or task that saved it
+    def update():
+        update_cell(
+            instance.contest_id,
+            instance.usr_id,
+            instance.problem_id,
+            instance.timestamp,
+        )
+        schedule_standings_update(instance.contest_id)
+
+    transaction.on_commit(update, robust=True)
+
+
+@receiver(post_save, sender=Contest)
+def rebuild_contest_standings(sender, instance, created, **kwargs):
+    # the start or end may have moved, which changes which submissions count
+    if not created:
+
+        def rebuild():
+            rebuild_standings(instance.id)
+            schedule_standings_update(instance.id)
+
+        transaction.on_commit(rebuild, robust=True)
+
+
+@receiver(post_save, sender=Problem)
+@receiver(post_delete, sender=Problem)
+def invalidate_contest_standings(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: invalidate_standings(instance.contest_id, frozen=True), robust=True
+    )
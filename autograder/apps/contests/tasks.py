@@ -0,0 +1,62 @@
+import logging
+from asgiref.sync import async_to_sync
+from celery import shared_task
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+
+from .models import Contest
+from .utils import get_standings, standings_delta, standings_group
+
+logger = logging.getLogger(__name__)
+
+# standings deltas are pushed at most this often (seconds)
+STANDINGS_UPDATE_INTERVAL = 1
+
+
+def _pending_key(cid):
+    return f"standings_{cid}_pending"
+
+
+def _sent_key(group):
+    return f"{group}_sent"
+
+
+@shared_task
+def broadcast_standings(cid):
+    # clear the flag first so a change during the broadcast schedules another
+    cache.delete(_pending_key(cid))
+    try:
+        contest = Contest.objects.get(id=cid)
+    except Contest.DoesNotExist:
+        return
+
+    channel_layer = get_channel_layer()
+    for staff in (True, False):
+        # non-staff see the standings as of the freeze until the contest ends
+        standings = get_standings(cid, frozen=not staff and contest.is_frozen())
+        group = standings_group(cid, staff)
+
+        old = cache.get(_sent_key(group), [])
+        changed, removed = standings_delta(old, standings["load"])
+        cache.set(_sent_key(group), standings["load"], timeout=None)
+        if not changed and not removed:
+            continue
+
+        async_to_sync(channel_layer.group_send)(
+            group,
+            {
+                "type": "standings_delta",
+                "pnum": standings["pnum"],
+                "rows": changed,
+                "removed": removed,
+            },
+        )
+
+
+def schedule_standings_update(cid):
+    """Pushes the changed standings rows soon, collapsing bursts of changes."""
+    try:
+        if cache.add(_pending_key(cid), True, timeout=STANDINGS_UPDATE_INTERVAL * 10):
+            broadcast_standings.apply_async((cid,), countdown=STANDINGS_UPDATE_INTERVAL)
+    except Exception as e:
+        logger.warning(f"Failed to schedule a standings update: {e}")
@@ -1 +1,215 @@
-# Create your tests here.
+import random
+from datetime import timedelta
+from unittest.mock import patch
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..index.models import GraderUser
+from ..problems.models import Problem
+from ..runtests.models import Submission
+from .models import Contest, StandingsCell
+from .tasks import broadcast_standings
+from .utils import get_solve_counts, get_standings, rebuild_standings, standings_group
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+INMEMORY_CHANNEL_LAYERS = {
+    "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHE, CHANNEL_LAYERS=INMEMORY_CHANNEL_LAYERS)
+@patch("autograder.apps.contests.signals.schedule_standings_update")
+class StandingsTests(TestCase):
+    def setUp(self):
+        with patch("autograder.apps.index.signals.schedule_codeforces_refresh"):
+            self.users = [
+                GraderUser.objects.create_user(
+                    email=f"{i}@a.com", username=f"u{i}", display_name=f"User {i}"
+                )
+                for i in range(4)
+            ]
+        self.start = timezone.now() - timedelta(hours=2)
+        self.contest = Contest.objects.create(
+            name="Contest",
+            season=1,
+            start=self.start,
+            end=self.start + timedelta(hours=3),
+        )
+        self.problems = [
+            Problem.objects.create(
+                name=letter,
+                contest=self.contest,
+                contest_letter=letter,
+                points=points,
+                statement="",
+                inputtxt="",
+                outputtxt="",
+                samples="",
+            )
+            for letter, points in (("A", 100), ("B", 200))
+        ]
+
+    def _submit(self, usr, problem, minutes, verdict):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Submission.objects.create(
+                usr=usr,
+                code="",
+                language="python",
+                problem=problem,
+                contest=self.contest,
+                timestamp=self.start + timedelta(minutes=minutes),
+                verdict=verdict,
+            )
+
+    def _cells(self):
+        return sorted(
+            StandingsCell.objects.filter(contest=self.contest).values_list(
+                "usr_id", "problem_id", "attempts", "solved_at", "penalty"
+            )
+        )
+
+    def test_standings(self, schedule):
+        a, b = self.problems
+        self._submit(self.users[0], a, 10, "Wrong Answer on test 1")
+        self._submit(self.users[0], a, 20, "Accepted")
+        self._submit(self.users[0], a, 30, "Wrong Answer on test 1")
+        self._submit(self.users[1], b, 15, "Skipped")
+        self._submit(self.users[1], b, 25, "Accepted")
+        self._submit(self.users[2], a, 5, "Runtime Error")
+
+        load = get_standings(self.contest.id)["load"]
+        self.assertEqual(
+            [
+                (row["id"], row["rank"], row["solved"], row["penalty"], row["problems"])
+                for row in load
+            ],
+            [
+                (self.users[1].id, 1, 200, 30, [0, 1]),
+                (self.users[0].id, 2, 100, 30, [2, 0]),
+            ],
+        )
+        self.assertEqual(get_solve_counts(self.contest), {a.id: 1, b.id: 1})
+
+        self._submit(self.users[2], a, 40, "Accepted")
+        self.assertEqual(get_solve_counts(self.contest), {a.id: 2, b.id: 1})
+
+    def test_outside_contest(self, schedule):
+        a, _ = self.problems
+        self._submit(self.users[0], a, -30, "Accepted")
+        self._submit(self.users[0], a, 200, "Accepted")
+        self.assertEqual(self._cells(), [])
+        schedule.assert_not_called()
+
+    def test_frozen_solve_counts(self, schedule):
+        a, b = self.problems
+        self.contest.freeze_minutes = 150
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contest.save()
+        early = self._submit(self.users[0], a, 10, "Accepted")
+        self._submit(self.users[1], b, 40, "Accepted")
+        self.assertEqual(get_solve_counts(self.contest, frozen=True), {a.id: 1})
+        self.assertEqual(get_solve_counts(self.contest), {a.id: 1, b.id: 1})
+
+        # a rejudge from before the freeze changes the frozen counts
+        with self.captureOnCommitCallbacks(execute=True):
+            early.verdict = "Wrong Answer on test 1"
+            early.save()
+        self.assertEqual(get_solve_counts(self.contest, frozen=True), {})
+
+    # django_user_agents holds on to the cache configured when it was imported
+    @patch("django_user_agents.utils.cache", None)
+    def test_freeze_hides_results(self, schedule):
+        a, _ = self.problems
+        self.contest.freeze_minutes = 150
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contest.save()
+        early = self._submit(self.users[0], a, 10, "Accepted")
+        late = self._submit(self.users[0], a, 40, "Accepted")
+        with patch("autograder.apps.index.signals.schedule_codeforces_refresh"):
+            staff = GraderUser.objects.create_user(
+                email="staff@a.com", username="staff", is_staff=True
+            )
+
+        for viewer, late_verdict in (
+            (self.users[1], "Pending"),
+            (self.users[0], "Accepted"),
+            (staff, "Accepted"),
+        ):
+            self.client.force_login(viewer)
+            response = self.client.get("/status/1/")
+            self.assertEqual(
+                {sub.id: sub.verdict for sub in response.context["submissions"]},
+                {early.id: "Accepted", late.id: late_verdict},
+            )
+
+    def test_incremental_matches_rebuild(self, schedule):
+        rng = random.Random(0)
+        verdicts = [
+            "Accepted",
+            "Wrong Answer on test 2",
+            "Time Limit Exceeded on test 1",
+        ]
+        subs = [
+            self._submit(
+                rng.choice(self.users),
+                rng.choice(self.problems),
+                rng.randrange(-30, 200),
+                rng.choice(verdicts),
+            )
+            for _ in range(60)
+        ]
+        for sub in rng.sample(subs, 10):
+            with self.captureOnCommitCallbacks(execute=True):
+                sub.verdict = rng.choice(["Skipped", "Rerun", "Accepted"])
+                sub.save()
+
+        incremental = self._cells()
+        standings = get_standings(self.contest.id)
+        rebuild_standings(self.contest.id)
+        self.assertEqual(self._cells(), incremental)
+        self.assertEqual(get_standings(self.contest.id), standings)
+
+    def test_freeze_and_deltas(self, schedule):
+        a, b = self.problems
+        self.contest.freeze_minutes = 150
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contest.save()
+        self.assertTrue(self.contest.is_frozen())
+
+        channel_layer = get_channel_layer()
+        channels = {}
+        for staff in (True, False):
+            channels[staff] = async_to_sync(channel_layer.new_channel)()
+            async_to_sync(channel_layer.group_add)(
+                standings_group(self.contest.id, staff), channels[staff]
+            )
+
+        # before the freeze at minute 30
+        self._submit(self.users[0], a, 10, "Accepted")
+        broadcast_standings(self.contest.id)
+        for staff in (True, False):
+            event = async_to_sync(channel_layer.receive)(channels[staff])
+            self.assertEqual([row["id"] for row in event["rows"]], [self.users[0].id])
+
+        self._submit(self.users[1], b, 40, "Accepted")
+        self.assertEqual(len(get_standings(self.contest.id, frozen=True)["load"]), 1)
+        broadcast_standings(self.contest.id)
+        event = async_to_sync(channel_layer.receive)(channels[True])
+        self.assertEqual(
+            [(row["id"], row["rank"]) for row in event["rows"]],
+            [(self.users[1].id, 1), (self.users[0].id, 2)],
+        )
+        self.assertEqual(event["removed"], [])
+
+        # a rejudge from before the freeze still reaches the frozen standings
+        sub = Submission.objects.get(usr=self.users[0], problem=a)
+        with self.captureOnCommitCallbacks(execute=True):
+            sub.verdict = "Wrong Answer on test 1"
+            sub.save()
+        broadcast_standings(self.contest.id)
+        event = async_to_sync(channel_layer.receive)(channels[False])
+        self.assertEqual(event["rows"], [])
+        self.assertEqual(event["removed"], [self.users[0].id])
+        self.assertEqual(schedule.call_count, 4)
@@ -1,4 +1,7 @@
-from .models import Contest
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from .models import Contest, StandingsCell
 from ..problems.models import Problem
 from ..index.models import GraderUser
 from ..runtests.models import Submission
@@ -6,49 +9,184 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+STANDINGS_CACHE_TIMEOUT = 10 * 60
 
-def get_standings(cid):
-    contest = Contest.objects.get(id=cid)
 
-    problems = list(Problem.objects.filter(contest=contest).order_by("contest_letter"))
-    pid_index = {p.contest_letter: i for i, p in enumerate(problems)}
-    start, end = contest.start, contest.end
-
-    users = GraderUser.objects.filter(is_staff=False)
-    stats = {
-        u.id: {
-            "id": u.id,
-            "name": u.display_name,
-            "solved": 0,
-            "penalty": 0,
-            "problems": [0] * len(problems),
-        }
-        for u in users
-    }
-
-    subs = (
-        Submission.objects.filter(contest=contest, timestamp__range=(start, end))
-        .order_by("timestamp")
-        .select_related("usr")
-    )
+def _standings_key(cid, frozen=False):
+    return f"standings_{cid}_frozen" if frozen else f"standings_{cid}"
+
+
+def _solve_counts_key(cid, frozen=False):
+    return f"solve_counts_{cid}_frozen" if frozen else f"solve_counts_{cid}"
+
+
+def standings_group(cid, staff):
+    return f"standings_{cid}_staff" if staff else f"standings_{cid}"
 
-    for s in subs:
-        user_data = stats.get(s.usr_id)
-        prob_idx = pid_index.get(s.problem.contest_letter)
 
-        if user_data is None or prob_idx is None:
+def compute_cell(contest, subs):
+    """
+    Returns (attempts, solved_at, penalty) for one user on one problem from
+    their in-contest submissions in order. Every submission except skipped
+    and rerun ones counts as an attempt until the first accepted one.
+    """
+    attempts = 0
+    for verdict, timestamp in subs:
+        if verdict in ("Skipped", "Rerun"):
             continue
+        attempts += 1
+        if verdict in ("Accepted", "AC"):
+            minutes = int((timestamp - contest.start).total_seconds() / 60)
+            return attempts, timestamp, minutes + 5 * attempts
+    return attempts, None, 0
+
+
+def update_cell(contest_id, usr_id, problem_id, timestamp=None):
+    """
+    Recomputes one cell. timestamp is that of the submission that changed; a
+    change from before the freeze also changes the frozen standings.
+    """
+    contest = Contest.objects.get(id=contest_id)
+    with transaction.atomic():
+        # serializes concurrent updates of the same user's cells
+        list(GraderUser.objects.select_for_update().filter(id=usr_id).values("id"))
+
+        subs = (
+            Submission.objects.filter(
+                contest_id=contest_id,
+                usr_id=usr_id,
+                problem_id=problem_id,
+                timestamp__range=(contest.start, contest.end),
+            )
+            .order_by("timestamp", "id")
+            .values_list("verdict", "timestamp")
+        )
+        attempts, solved_at, penalty = compute_cell(contest, subs)
+
+        cells = StandingsCell.objects.filter(
+            contest_id=contest_id, usr_id=usr_id, problem_id=problem_id
+        )
+        if attempts == 0:
+            cells.delete()
+        else:
+            StandingsCell.objects.update_or_create(
+                contest_id=contest_id,
+                usr_id=usr_id,
+                problem_id=problem_id,
+                defaults={
+                    "attempts": attempts,
+                    "solved_at": solved_at,
+                    "penalty": penalty,
+                },
+            )
+
+    invalidate_standings(
+        contest_id,
+        frozen=contest.freeze_minutes > 0
+        and (timestamp is None or timestamp < contest.freeze_time),
+    )
+
+
+def _cells_from_submissions(contest, before=None):
+    subs = Submission.objects.filter(
+        contest=contest, timestamp__range=(contest.start, contest.end)
+    )
+    if before is not None:
+        subs = subs.filter(timestamp__lt=before)
+    subs = subs.order_by("usr_id", "problem_id", "timestamp", "id").values_list(
+        "usr_id", "problem_id", "verdict", "timestamp"
+    )
+
+    grouped = {}
+    for usr_id, problem_id, verdict, timestamp in subs.iterator():
+        grouped.setdefault((usr_id, problem_id), []).append((verdict, timestamp))
+
+    cells = []
+    for (usr_id, problem_id), cell_subs in grouped.items():
+        attempts, solved_at, penalty = compute_cell(contest, cell_subs)
+        if attempts:
+            cells.append(
+                StandingsCell(
+                    contest=contest,
+                    usr_id=usr_id,
+                    problem_id=problem_id,
+                    attempts=attempts,
+                    solved_at=solved_at,
+                    penalty=penalty,
+                )
+            )
+    return cells
+
+
+def _contest_cells(contest, frozen=False):
+    """
+    The cells the standings are ranked from. The frozen standings are built
+    from the submissions from before the freeze.
+    """
+    if frozen:
+        return _cells_from_submissions(contest, before=contest.freeze_time)
+    return list(StandingsCell.objects.filter(contest=contest))
+
+
+def rebuild_standings(cid):
+    """Recomputes every cell of a contest from its submissions."""
+    contest = Contest.objects.get(id=cid)
+    cells = _cells_from_submissions(contest)
+
+    with transaction.atomic():
+        StandingsCell.objects.filter(contest=contest).delete()
+        StandingsCell.objects.bulk_create(cells, batch_size=1000)
 
-        if user_data["problems"][prob_idx] <= 0 and s.verdict not in ["Skipped", "Rerun"]:
-            user_data["problems"][prob_idx] -= 1
+    invalidate_standings(cid, frozen=True)
 
-        if s.verdict in ("Accepted", "AC"):
-            if user_data["problems"][prob_idx] < 0:
-                user_data["solved"] += problems[prob_idx].points
-                minutes = int((s.timestamp - start).total_seconds() / 60)
 
-                user_data["problems"][prob_idx] = abs(user_data["problems"][prob_idx])
-                user_data["penalty"] += minutes + 5 * user_data["problems"][prob_idx]
+def invalidate_standings(cid, frozen=False):
+    keys = [_standings_key(cid), _solve_counts_key(cid)]
+    if frozen:
+        keys += [_standings_key(cid, frozen=True), _solve_counts_key(cid, frozen=True)]
+    cache.delete_many(keys)
+
+
+def build_standings(cid, frozen=False):
+    """
+    Ranks the cells of a contest. The frozen standings only count submissions
+    from before the freeze; they are rebuilt from those submissions, which
+    only happens again when one of them changes.
+    """
+    contest = Contest.objects.get(id=cid)
+
+    problems = list(Problem.objects.filter(contest=contest).order_by("contest_letter"))
+    pid_index = {p.id: i for i, p in enumerate(problems)}
+
+    cells = _contest_cells(contest, frozen)
+    names = dict(
+        GraderUser.objects.filter(
+            id__in={cell.usr_id for cell in cells}, is_staff=False
+        ).values_list("id", "display_name")
+    )
+
+    stats = {}
+    for cell in cells:
+        prob_idx = pid_index.get(cell.problem_id)
+        if prob_idx is None or cell.usr_id not in names:
+            continue
+
+        user_data = stats.setdefault(
+            cell.usr_id,
+            {
+                "id": cell.usr_id,
+                "name": names[cell.usr_id],
+                "solved": 0,
+                "penalty": 0,
+                "problems": [0] * len(problems),
+            },
+        )
+        if cell.solved_at is None:
+            user_data["problems"][prob_idx] = -cell.attempts
+        else:
+            user_data["problems"][prob_idx] = cell.attempts
+            user_data["solved"] += problems[prob_idx].points
+            user_data["penalty"] += cell.penalty
 
     # Filter and sort
     standings = [
@@ -72,3 +210,60 @@ def get_standings(cid):
     res = {"title": contest.name, "pnum": len(problems), "load": standings}
 
     return res
+
+
+def get_standings(cid, frozen=False):
+    key = _standings_key(cid, frozen)
+    try:
+        res = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Standings cache lookup failed: {e}")
+        return build_standings(cid, frozen)
+
+    if res is None:
+        res = build_standings(cid, frozen)
+        cache.set(key, res, timeout=STANDINGS_CACHE_TIMEOUT)
+    return res
+
+
+def count_solves(contest, frozen=False):
+    """
+    Returns {problem id: number of users who solved it during the contest}.
+    The frozen counts only count submissions from before the freeze.
+    """
+    if frozen:
+        solves = {}
+        for cell in _contest_cells(contest, frozen):
+            if cell.solved_at is not None:
+                solves[cell.problem_id] = solves.get(cell.problem_id, 0) + 1
+        return solves
+
+    return dict(
+        StandingsCell.objects.filter(contest=contest, solved_at__isnull=False)
+        .values("problem_id")
+        .annotate(solves=Count("id"))
+        .values_list("problem_id", "solves")
+    )
+
+
+def get_solve_counts(contest, frozen=False):
+    key = _solve_counts_key(contest.id, frozen)
+    try:
+        res = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Solve count cache lookup failed: {e}")
+        return count_solves(contest, frozen)
+
+    if res is None:
+        res = count_solves(contest, frozen)
+        cache.set(key, res, timeout=STANDINGS_CACHE_TIMEOUT)
+    return res
+
+
+def standings_delta(old, new):
+    """Returns the rows of new that differ from old, and the ids of removed rows."""
+    old_rows = {row["id"]: row for row in old}
+    changed = [row for row in new if old_rows.get(row["id"]) != row]
+    new_ids = {row["id"] for row in new}
+    removed = [uid for uid in old_rows if uid not in new_ids]
+    return changed, removed
@@ -1,15 +1,15 @@
 from django.db.models import Q
 from django.shortcuts import render, redirect, get_object_or_404
-from django.core.paginator import Paginator
+from django.urls import reverse
 from django.conf import settings
 from django.utils import timezone
 from django.http import HttpResponse
 from ..oauth.decorators import login_required, admin_required
 from .models import Contest
 from ..problems.models import Problem
-from ..index.models import GraderUser
 from ..runtests.models import Submission
-from .utils import get_standings
+from ..runtests.utils import hide_frozen_results, keyset_page
+from .utils import get_solve_counts, get_standings
 import logging
 
 logger = logging.getLogger(__name__)
@@ -44,6 +44,9 @@ def contest_view(request, cid):
     if not request.user.is_staff and timezone.now() < contest.start:
         return HttpResponse("Contest has not started yet", status=403)
 
+    solves = get_solve_counts(
+        contest, frozen=not request.user.is_staff and contest.is_frozen()
+    )
     ordered = []
     for problem in problems:
         ordered.append(
@@ -53,35 +56,13 @@ def contest_view(request, cid):
                 "id": problem.id,
                 "letter": problem.contest_letter,
                 "points": getattr(problem, "points", 0),
-                "solves": 0,
+                "solves": solves.get(problem.id, 0),
                 "available": (
                     not getattr(problem, "secret", False) or request.user.is_staff
                 ),
-                "users": [],
             }
         )
 
-    subs = Submission.objects.filter(contest=cid)
-    users = list(GraderUser.objects.all())
-    user_id_map = {user.id: idx for idx, user in enumerate(users)}
-
-    for sub in subs:
-        if sub.timestamp > contest.end or sub.timestamp < contest.start:
-            continue
-        ind = user_id_map.get(sub.usr_id)
-        pind = None
-        for j, prob in enumerate(ordered):
-            if prob["id"] == getattr(sub, "problem_id", None):
-                pind = j
-                break
-        if pind is None or ind is None:
-            continue
-        if sub.verdict in ["Accepted", "AC"]:
-            if ind in ordered[pind]["users"]:
-                continue
-            ordered[pind]["solves"] += 1
-            ordered[pind]["users"].append(ind)
-
     context = {
         "not_empty": "yes" if ordered else "no",
         "title": contest.name,
@@ -104,12 +85,13 @@ def contest_standings_view(request, cid):
     if contest.tjioi and not request.user.is_staff and not request.user.is_tjioi:
         return HttpResponse("You do not have permission to view this contest", status=403)
 
-    standings = get_standings(cid)
-    problems = Problem.objects.filter(contest_id=cid).order_by("contest_letter")
-
     if not request.user.is_staff and timezone.now() < contest.start:
         return HttpResponse("Contest has not started yet", status=403)
 
+    frozen = not request.user.is_staff and contest.is_frozen()
+    standings = get_standings(cid, frozen=frozen)
+    problems = Problem.objects.filter(contest_id=cid).order_by("contest_letter")
+
     context = {
         "title": standings["title"],
         "cid": cid,
@@ -117,6 +99,8 @@ def contest_standings_view(request, cid):
         "load": standings["load"],
         "problems": problems,
         "contest_over": timezone.now() > contest.end,
+        "frozen": frozen,
+        "end": contest.end,
     }
 
     return render(request, "contest/standings.html", context)
@@ -144,12 +128,16 @@ def contest_status_view(request, cid, mine_only, page):
     if not request.user.is_staff:
         subs = subs.filter(timestamp__gte=contest.start)
 
-    subs = subs.order_by("-timestamp")
+    # pages past the first are reached through the cursor of the page before
+    after, before = request.GET.get("after"), request.GET.get("before")
+    if page > 1 and after is None and before is None:
+        return redirect("contests:status", cid=cid, mine_only=mine_only, page=1)
+    try:
+        page_obj = keyset_page(subs, page, after, before, 25)
+    except ValueError:
+        return redirect("contests:status", cid=cid, mine_only=mine_only, page=1)
 
-    # Pagination
-    paginator = Paginator(subs, 25)  # Show 25 submissions per page
-    page_number = page
-    page_obj = paginator.get_page(page_number)
+    hide_frozen_results(request.user, page_obj.object_list)
 
     context = {
         "title": contest.name,
@@ -159,6 +147,7 @@ def contest_status_view(request, cid, mine_only, page):
         "submissions": page_obj.object_list,
         "contest_over": timezone.now() > contest.end,
         "mine_only": mine_only,
+        "page": page,
     }
     return render(request, "contest/status.html", context)
 
@@ -166,9 +155,14 @@ def contest_status_view(request, cid, mine_only, page):
 @login_required
 @admin_required
 def contest_skip_view(request, sid, cid, mine_only, page):
-    sub = get_object_or_404(Submission, id=sid)
+    sub = get_object_or_404(Submission.objects.select_related("contest"), id=sid)
     sub.verdict = "Skipped"
     sub.insight = "Your submission was manually skipped by an admin"
     sub.save()
 
-    return redirect("contests:status", cid=cid, mine_only=mine_only, page=page)
+    url = reverse(
+        "contests:status", kwargs={"cid": cid, "mine_only": mine_only, "page": page}
+    )
+    if request.GET:
+        url += f"?{request.GET.urlencode()}"
+    return redirect(url)
@@ -0,0 +1,362 @@
+"""
+Deterministic synthetic history for query and page benchmarks: users, seasons
+of contests with their problems, submissions and standings. The same seed and
+sizes always produce the same rows, apart from database-assigned ids.
+
+Users, contests, problems and source blobs are few enough for bulk_create;
+submissions and standings cells are streamed into Postgres with COPY. None of
+it goes through signals, so standings cells are computed here with the same
+compute_cell the signals use.
+"""
+
+import hashlib
+import math
+import random
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+
+from ..contests.models import Contest, StandingsCell
+from ..contests.utils import compute_cell
+from ..problems.models import Problem
+from ..runtests.models import SourceBlob, Submission
+from .models import GraderUser
+import logging
+
+logger = logging.getLogger(__name__)
+
+DIVISIONS = [
+    (GraderUser.NOT_PARTICIPATED, 10, 0.0),
+    (GraderUser.BRONZE, 40, 0.5),
+    (GraderUser.SILVER, 28, 1.2),
+    (GraderUser.GOLD, 16, 2.0),
+    (GraderUser.PLATINUM, 6, 2.8),
+]
+GRADES = ["freshman", "sophomore", "junior", "senior"]
+LANGUAGES = [("cpp", 60), ("python", 30), ("java", 10)]
+# how a failed attempt fails, by weight
+FAILURES = [
+    ("Wrong Answer on test {test}", 58),
+    ("Time Limit Exceeded on test {test}", 18),
+    ("Runtime Error", 12),
+    ("Memory Limit Exceeded on test {test}", 3),
+    ("Compilation Error", 9),
+]
+CONTEST_LENGTH = timedelta(hours=2)
+# share of non-participants who practice a contest's problems afterwards
+PRACTICE_RATE = 0.15
+# distinct sources per language that submissions draw from
+SOURCES_PER_LANGUAGE = 500
+
+SUBMISSION_COLUMNS = (
+    "language",
+    "source_id",
+    "usr_id",
+    "verdict",
+    "runtime",
+    "memory",
+    "contest_id",
+    "problem_id",
+    "insight",
+    "timestamp",
+    "queue_class",
+    "enqueued_at",
+    "started_at",
+    "finished_at",
+)
+CELL_COLUMNS = (
+    "contest_id",
+    "usr_id",
+    "problem_id",
+    "attempts",
+    "solved_at",
+    "penalty",
+)
+
+
+def _sigmoid(x):
+    return 1 / (1 + math.exp(-x))
+
+
+def _weighted(rng, choices):
+    return rng.choices([c[0] for c in choices], [c[1] for c in choices])[0]
+
+
+def _copy(table, columns, rows):
+    """Streams rows into table with COPY, returns how many were written."""
+    count = 0
+    with connection.cursor() as cursor:
+        with cursor.cursor.copy(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+        ) as copy:
+            for row in rows:
+                copy.write_row(row)
+                count += 1
+    return count
+
+
+def _source(rng, lang, i):
+    # padded so that compressed sizes vary like real solutions do
+    body = "\n".join(
+        f"    x{j} = {rng.randrange(10**6)}" for j in range(rng.randrange(5, 120))
+    )
+    comment = {"cpp": "//", "java": "//", "python": "#"}[lang]
+    return f"{comment} synthetic {lang} solution {i}\n{body}\n"
+
+
+def _create_sources(rng):
+    pools = {}
+    for lang, _ in LANGUAGES:
+        blobs = []
+        for i in range(SOURCES_PER_LANGUAGE):
+            raw = _source(rng, lang, i).encode()
+            blobs.append(
+                SourceBlob(
+                    sha256=hashlib.sha256(raw).hexdigest(),
+                    data=zlib.compress(raw),
+                    size=len(raw),
+                )
+            )
+        SourceBlob.objects.bulk_create(blobs, batch_size=1000, ignore_conflicts=True)
+        pools[lang] = list(
+            SourceBlob.objects.filter(sha256__in=[b.sha256 for b in blobs])
+            .order_by("sha256")
+            .values_list("id", flat=True)
+        )
+    return pools
+
+
+def _create_users(rng, count, staff, prefix):
+    users, skills = [], []
+    for i in range(count):
+        division = rng.choices(DIVISIONS, [d[1] for d in DIVISIONS])[0]
+        skill = rng.gauss(division[2], 0.6)
+        cf = (
+            max(0, int(rng.gauss(1000 + 450 * skill, 250))) if rng.random() < 0.6 else 0
+        )
+        users.append(
+            GraderUser(
+                email=f"{prefix}{i}@example.com",
+                username=f"{prefix}{i}",
+                display_name=f"Synthetic {i}",
+                usaco_division=division[0],
+                cf_handle=f"{prefix}{i}" if cf else None,
+                cf_rating=cf,
+                grade=rng.choice(GRADES),
+                first_time=False,
+                is_staff=i < staff,
+            )
+        )
+        skills.append(skill)
+    users = GraderUser.objects.bulk_create(users, batch_size=1000)
+    return users, skills
+
+
+def _contest_dates(season, per_season):
+    # a season runs from mid September to the end of May, contests on Sundays
+    first = datetime(season - 1, 9, 14, 18, 0, tzinfo=dt_timezone.utc)
+    span = (datetime(season, 5, 31, tzinfo=dt_timezone.utc) - first).days
+    return [
+        first + timedelta(days=(span * i // per_season) // 7 * 7)
+        for i in range(per_season)
+    ]
+
+
+def _create_contests(rng, seasons, per_season, problems_per_contest, staff_users):
+    contests = []
+    for season in seasons:
+        for i, start in enumerate(_contest_dates(season, per_season)):
+            contests.append(
+                Contest(
+                    name=f"Synthetic {season} #{i + 1}",
+                    season=season,
+                    rated=rng.random() < 0.7,
+                    tjioi=rng.random() < 0.05,
+                    start=start,
+                    end=start + CONTEST_LENGTH,
+                    freeze_minutes=rng.choice([0, 0, 30]),
+                )
+            )
+    contests = Contest.objects.bulk_create(contests)
+
+    next_pid = (Problem.objects.aggregate(Max("id"))["id__max"] or 0) + 1
+    problems, difficulty = [], {}
+    for contest in contests:
+        if staff_users:
+            contest.writers.add(*rng.sample(staff_users, min(2, len(staff_users))))
+        for j in range(problems_per_contest):
+            problems.append(
+                Problem(
+                    id=next_pid,
+                    name=f"Synthetic {next_pid}",
+                    contest=contest,
+                    contest_letter=chr(ord("A") + j),
+                    points=100 * (j + 1),
+                    statement="Statement",
+                    inputtxt="Input",
+                    outputtxt="Output",
+                    samples="Samples",
+                    tl=rng.choice([1000, 2000, 3000]),
+                    ml=256,
+                )
+            )
+            # later letters are harder, with some spread between contests
+            difficulty[next_pid] = 0.8 * j + rng.gauss(0, 0.4)
+            next_pid += 1
+    Problem.objects.bulk_create(problems)
+
+    by_contest = {}
+    for problem in problems:
+        by_contest.setdefault(problem.contest_id, []).append(problem)
+    return contests, by_contest, difficulty
+
+
+class _Generator:
+    def __init__(self, rng, users, skills, sources, difficulty):
+        self.rng = rng
+        self.users = users
+        self.skills = skills
+        self.sources = sources
+        self.difficulty = difficulty
+        self.cells = []
+
+    def _row(self, usr, contest, problem, lang, verdict, timestamp, queue_class):
+        rng = self.rng
+        if verdict == "Compilation Error":
+            runtime, memory = 0, -1
+        elif verdict.startswith("Time Limit"):
+            runtime, memory = problem.tl, rng.randrange(2000, 200000)
+        else:
+            runtime, memory = rng.randrange(1, problem.tl), rng.randrange(2000, 200000)
+        wait = timedelta(seconds=rng.expovariate(1 / 3))
+        grading = timedelta(seconds=rng.uniform(0.3, 8))
+        return (
+            lang,
+            rng.choice(self.sources[lang]),
+            usr.id,
+            verdict,
+            runtime,
+            memory,
+            contest.id,
+            problem.id,
+            "",
+            timestamp,
+            queue_class,
+            timestamp,
+            timestamp + wait,
+            timestamp + wait + grading,
+        )
+
+    def _attempts(self, skill, problem):
+        """The verdicts of one user's attempts at a problem, in order."""
+        rng = self.rng
+        solves = rng.random() < _sigmoid(1.5 * (skill - self.difficulty[problem.id]))
+        tries = min(1 + int(rng.expovariate(1.4)), 10)
+        verdicts = [
+            _weighted(rng, FAILURES).format(test=rng.randrange(1, 25))
+            for _ in range(tries - 1 if solves else tries)
+        ]
+        if solves:
+            verdicts.append("Accepted")
+        return verdicts
+
+    def contest_rows(self, contest, problems):
+        rng = self.rng
+        participation = rng.uniform(0.15, 0.4)
+        for usr, skill in zip(self.users, self.skills):
+            if usr.is_staff:
+                continue
+            live = rng.random() < participation
+            if not live and rng.random() > PRACTICE_RATE:
+                continue
+
+            lang = _weighted(rng, LANGUAGES)
+            clock = contest.start + timedelta(minutes=rng.uniform(1, 10))
+            for problem in problems:
+                if rng.random() > _sigmoid(2 + skill - self.difficulty[problem.id]):
+                    continue
+                # what does not fit in the contest is upsolved some days later
+                later = contest.end + timedelta(days=rng.expovariate(1 / 20))
+                in_contest = []
+                for verdict in self._attempts(skill, problem):
+                    clock += timedelta(minutes=rng.expovariate(1 / 12))
+                    if live and clock < contest.end:
+                        in_contest.append((verdict, clock))
+                        yield self._row(
+                            usr, contest, problem, lang, verdict, clock, Submission.LIVE
+                        )
+                    else:
+                        later += timedelta(minutes=rng.expovariate(1 / 30))
+                        yield self._row(
+                            usr,
+                            contest,
+                            problem,
+                            lang,
+                            verdict,
+                            later,
+                            Submission.PRACTICE,
+                        )
+
+                attempts, solved_at, penalty = compute_cell(contest, in_contest)
+                if attempts:
+                    self.cells.append(
+                        (contest.id, usr.id, problem.id, attempts, solved_at, penalty)
+                    )
+
+
+def generate(
+    users=5000,
+    staff=20,
+    seasons=4,
+    contests_per_season=50,
+    problems_per_contest=6,
+    seed=0,
+    last_season=None,
+    prefix="synthetic_",
+):
+    """
+    Loads a synthetic history of the given size, ending with last_season.
+    Returns the number of rows written per model.
+    """
+    rng = random.Random(seed)
+    last_season = last_season or settings.CURRENT_SEASON
+    season_range = range(last_season - seasons + 1, last_season + 1)
+
+    with transaction.atomic():
+        sources = _create_sources(rng)
+        user_rows, skills = _create_users(rng, users, staff, prefix)
+        contests, problems, difficulty = _create_contests(
+            rng,
+            season_range,
+            contests_per_season,
+            problems_per_contest,
+            [u for u in user_rows if u.is_staff],
+        )
+        generator = _Generator(rng, user_rows, skills, sources, difficulty)
+
+        submissions = _copy(
+            Submission._meta.db_table,
+            SUBMISSION_COLUMNS,
+            (
+                row
+                for contest in contests
+                for row in generator.contest_rows(contest, problems[contest.id])
+            ),
+        )
+        cells = _copy(StandingsCell._meta.db_table, CELL_COLUMNS, generator.cells)
+
+    with connection.cursor() as cursor:
+        for model in (GraderUser, Contest, Problem, Submission, StandingsCell):
+            cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+    counts = {
+        "users": len(user_rows),
+        "contests": len(contests),
+        "problems": sum(len(p) for p in problems.values()),
+        "submissions": submissions,
+        "standings cells": cells,
+    }
+    logger.info(f"Generated {counts}")
+    return counts
@@ -0,0 +1,58 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ...dataset import generate
+from ...models import GraderUser
+from ....rankings.utils import update_rankings
+
+
+class Command(BaseCommand):
+    help = (
+        "Loads a deterministic synthetic history of users, contests, problems, "
+        "submissions and standings for query and page benchmarks. Use a database "
+        "of its own: nothing it creates is cleaned up."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=5000)
+        parser.add_argument("--staff", type=int, default=20)
+        parser.add_argument("--seasons", type=int, default=4)
+        parser.add_argument("--contests-per-season", type=int, default=50)
+        parser.add_argument("--problems-per-contest", type=int, default=6)
+        parser.add_argument("--last-season", type=int, default=settings.CURRENT_SEASON)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--prefix", default="synthetic_")
+        parser.add_argument(
+            "--no-rankings",
+            action="store_true",
+            help="Skip computing the rankings and publishing a snapshot.",
+        )
+
+    def handle(self, *args, **options):
+        if GraderUser.objects.filter(username__startswith=options["prefix"]).exists():
+            raise CommandError(
+                f"Users named {options['prefix']}* already exist; "
+                "use a fresh database or another --prefix"
+            )
+
+        begin = time.perf_counter()
+        counts = generate(
+            users=options["users"],
+            staff=options["staff"],
+            seasons=options["seasons"],
+            contests_per_season=options["contests_per_season"],
+            problems_per_contest=options["problems_per_contest"],
+            seed=options["seed"],
+            last_season=options["last_season"],
+            prefix=options["prefix"],
+        )
+        for name, count in counts.items():
+            self.stdout.write(f"{count:>10} {name}")
+
+        if not options["no_rankings"]:
+            update_rankings()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Done in {time.perf_counter() - begin:.1f}s")
+        )
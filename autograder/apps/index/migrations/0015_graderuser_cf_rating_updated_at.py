@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('index', '0014_alter_problemoftheweek_level_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='graderuser',
+            name='cf_rating_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
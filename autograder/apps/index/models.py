@@ -49,6 +49,7 @@ class GraderUser(AbstractBaseUser, PermissionsMixin):
     usaco_rating = models.IntegerField(default=800)
     cf_handle = models.CharField(max_length=30, blank=True, null=True)
     cf_rating = models.IntegerField(blank=True, null=True, default=0)
+    cf_rating_updated_at = models.DateTimeField(blank=True, null=True)
     grade = models.CharField(max_length=10, default="N/A")
     first_time = models.BooleanField(default=True)
     is_tjioi = models.BooleanField(default=False)
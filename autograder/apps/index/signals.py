@@ -1,7 +1,10 @@
-from django.db.models.signals import post_save
+from datetime import timedelta
+from django.conf import settings
+from django.db.models.signals import post_init, post_save
 from django.dispatch import receiver
+from django.utils import timezone
 from .models import GraderUser
-from ..rankings.tasks import update_codeforces_rating
+from ..rankings.tasks import schedule_codeforces_refresh
 import threading
 import logging
 
@@ -9,6 +12,32 @@ logger = logging.getLogger(__name__)
 _signal_lock = threading.local()
 
 
+@receiver(post_init, sender=GraderUser)
+def remember_cf_handle(sender, instance, **kwargs):
+    # read from __dict__ so that a deferred cf_handle is not loaded here
+    instance._loaded_cf_handle = instance.__dict__.get("cf_handle")
+
+
+def needs_codeforces_refresh(instance, created, update_fields):
+    if created:
+        return True
+    # saves of a few named fields come from the rating tasks themselves, which
+    # must not schedule more refreshes, or from code that did not touch the handle
+    if update_fields is not None:
+        return "cf_handle" in update_fields and (
+            instance.cf_handle != instance._loaded_cf_handle
+        )
+    if "cf_handle" in instance.__dict__ and (
+        instance.cf_handle != instance._loaded_cf_handle
+    ):
+        return True
+    if not instance.cf_handle:
+        return False
+    updated_at = instance.cf_rating_updated_at
+    ttl = timedelta(seconds=settings.CODEFORCES_RATING_TTL)
+    return updated_at is None or timezone.now() - updated_at > ttl
+
+
 @receiver(post_save, sender=GraderUser)
 def handle_user_updates(sender, instance, created, update_fields=None, **kwargs):
     if getattr(_signal_lock, "in_signal", False):
@@ -23,7 +52,8 @@ def handle_user_updates(sender, instance, created, update_fields=None, **kwargs)
     }
 
     new_usaco_rating = usaco_map.get(instance.usaco_division, 800)
-    if instance.usaco_rating != new_usaco_rating:
+    usaco_changed = instance.usaco_rating != new_usaco_rating
+    if usaco_changed:
         instance.usaco_rating = new_usaco_rating
         try:
             _signal_lock.in_signal = True
@@ -31,4 +61,7 @@ def handle_user_updates(sender, instance, created, update_fields=None, **kwargs)
         finally:
             _signal_lock.in_signal = False
 
-    update_codeforces_rating.delay(instance.id)
+    # the refresh also recomputes the index, which depends on the USACO rating
+    if usaco_changed or needs_codeforces_refresh(instance, created, update_fields):
+        schedule_codeforces_refresh(instance.id)
+    instance._loaded_cf_handle = instance.__dict__.get("cf_handle")
@@ -1,6 +1,19 @@
-from django.test import TestCase
-from django.urls import reverse
-from .models import ProblemOfTheWeek
+from datetime import timedelta
+from unittest.mock import patch
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, resolve, reverse
+from django.utils import timezone
+from ..contests.models import Contest, StandingsCell
+from ..contests.utils import _cells_from_submissions
+from ..problems.models import Problem
+from ..rankings.utils import update_rankings
+from ..runtests.models import Submission
+from .dataset import generate
+from .models import GraderUser, ProblemOfTheWeek
 
 
 class POTWViewTests(TestCase):
@@ -16,3 +29,233 @@ class POTWViewTests(TestCase):
         self.assertContains(resp, 'Problem of the Week: Intermediate')
         self.assertContains(resp, 'Problem of the Week: Advanced')
         self.assertContains(resp, 'Click to see')
+
+
+@patch("autograder.apps.index.signals.schedule_codeforces_refresh")
+class CodeforcesRefreshSignalTests(TestCase):
+    def test_refresh_only_on_change(self, schedule):
+        user = GraderUser.objects.create_user(
+            email="a@a.com", username="a", cf_handle="tourist"
+        )
+        self.assertEqual(schedule.call_count, 1)
+
+        user.cf_rating_updated_at = timezone.now()
+        user.save(update_fields=["cf_rating_updated_at"])
+        user = GraderUser.objects.get(id=user.id)
+        user.particles_enabled = False
+        user.save()
+        user.save(update_fields=["index"])
+        self.assertEqual(schedule.call_count, 1)
+
+        user.cf_handle = "Petr"
+        user.save()
+        self.assertEqual(schedule.call_count, 2)
+        user.save()
+        self.assertEqual(schedule.call_count, 2)
+
+        user.cf_rating_updated_at = timezone.now() - timedelta(days=2)
+        user.save()
+        self.assertEqual(schedule.call_count, 3)
+
+
+class DatasetTests(TestCase):
+    def _history(self, prefix):
+        rows = (
+            Submission.objects.filter(usr__username__startswith=prefix)
+            .order_by("timestamp", "id")
+            .values_list(
+                "usr__username",
+                "contest__name",
+                "problem__contest_letter",
+                "language",
+                "verdict",
+                "timestamp",
+            )
+        )
+        return [(username[len(prefix) :], *rest) for username, *rest in rows]
+
+    def test_deterministic(self):
+        sizes = dict(
+            users=40, staff=2, seasons=1, contests_per_season=3, problems_per_contest=3
+        )
+        first = generate(seed=7, prefix="a_", **sizes)
+        second = generate(seed=7, prefix="b_", **sizes)
+        self.assertEqual(first, second)
+        self.assertGreater(first["submissions"], 0)
+
+        # the same rows apart from the usernames
+        self.assertEqual(self._history("a_"), self._history("b_"))
+
+        # standings cells agree with what the signals would build
+        for contest in Contest.objects.all():
+            self.assertEqual(
+                {
+                    (c.usr_id, c.problem_id, c.attempts, c.solved_at, c.penalty)
+                    for c in _cells_from_submissions(contest)
+                },
+                set(
+                    StandingsCell.objects.filter(contest=contest).values_list(
+                        "usr_id", "problem_id", "attempts", "solved_at", "penalty"
+                    )
+                ),
+            )
+
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+MOBILE_AGENT = (
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1"
+)
+# every page must stay within its budget on each of these, the larger having
+# several times the rows of the smaller
+DATASETS = {
+    "small": dict(
+        users=30, staff=2, seasons=1, contests_per_season=2, problems_per_contest=3
+    ),
+    "large": dict(
+        users=120, staff=4, seasons=2, contests_per_season=4, problems_per_contest=6
+    ),
+}
+# seconds the queries of one request may take altogether
+QUERY_TIME_BUDGET = 0.5
+# URLs from other projects, which are not ours to budget
+UNBUDGETED_NAMESPACES = {"admin", "social"}
+
+# (who, method, path, data, query budget); paths are filled in from the dataset
+PAGES = [
+    ("anonymous", "get", "/", None, 0),
+    ("anonymous", "get", "/tjioi/login/", None, 0),
+    ("user", "get", "/mobile/", None, 0),
+    ("user", "get", "/first_time/", None, 2),
+    ("user", "post", "/update_first_time/", {"email": "a@a.com"}, 3),
+    ("user", "get", "/profile/", None, 2),
+    ("user", "get", "/profile/{uid}/", None, 4),
+    ("user", "post", "/update_stats/", {"usaco_div": "gold"}, 4),
+    ("user", "get", "/info/", None, 2),
+    ("user", "get", "/potw/", None, 5),
+    ("user", "get", "/toggle_particles/", None, 3),
+    ("staff", "get", "/validation_settings/", None, 2),
+    ("user", "get", "/oauth/logout/", None, 5),
+    ("user", "get", "/contests/", None, 3),
+    ("user", "get", "/contests/{cid}/", None, 5),
+    ("user", "get", "/contests/{cid}/standings/", None, 8),
+    ("user", "get", "/contests/{cid}/status/all/1/", None, 5),
+    ("staff", "get", "/contests/skip/{sid}/{cid}/all/1/", None, 4),
+    ("user", "get", "/problems/", None, 3),
+    ("user", "get", "/problems/{pid}/", None, 4),
+    ("user", "get", "/status/submit/", None, 4),
+    ("user", "get", "/status/submit/contest/{cid}/", None, 5),
+    ("user", "get", "/status/submit/problem/{pid}/", None, 5),
+    ("user", "get", "/status/1/", None, 4),
+    ("user", "get", "/status/{cid}/1/", None, 5),
+    ("user", "get", "/status/mine/1/", None, 4),
+    ("user", "get", "/status/mine/{cid}/1/", None, 5),
+    ("user", "get", "/status/submission/{sid}/", None, 4),
+    (
+        "user",
+        "post",
+        "/status/process_submit/",
+        {"problemid": "{pid}", "lang": "python", "code": "print()"},
+        10,
+    ),
+    ("staff", "get", "/status/metrics/", None, 3),
+    ("staff", "get", "/status/metrics/dashboard/", None, 5),
+    ("user", "get", "/rankings/", None, 2),
+    ("user", "get", "/rankings/{season}/", None, 5),
+    ("user", "get", "/rankings/{season}/1/", None, 3),
+]
+
+
+def _routes(resolver, prefix=""):
+    for pattern in resolver.url_patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace not in UNBUDGETED_NAMESPACES:
+                yield from _routes(pattern, route)
+        elif isinstance(pattern, URLPattern):
+            yield route
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+# django_user_agents holds on to the cache configured when it was imported
+@patch("django_user_agents.utils.cache", None)
+@patch("autograder.apps.index.signals.schedule_codeforces_refresh")
+@patch("autograder.apps.runtests.views.enqueue_submission")
+class QueryBudgetTests(TestCase):
+    """
+    Renders every page against small and large synthetic datasets. A page
+    whose queries grow with the rows, like a lazy foreign key per row, makes
+    more queries on the larger dataset and fails.
+    """
+
+    def _fill(self, value, names):
+        return value.format(**names) if isinstance(value, str) else value
+
+    def _measure(self, sizes):
+        generate(**sizes)
+        update_rankings()
+        cache.clear()
+
+        staff = GraderUser.objects.filter(is_staff=True).order_by("id").first()
+        # one whose stats update changes their division, as the page posts gold
+        user = (
+            GraderUser.objects.filter(
+                is_staff=False,
+                usaco_division=GraderUser.BRONZE,
+                submission__isnull=False,
+            )
+            .order_by("id")
+            .first()
+        )
+        contest = (
+            Contest.objects.filter(season=settings.CURRENT_SEASON)
+            .order_by("-start")
+            .first()
+        )
+        names = {
+            "uid": user.id,
+            "cid": contest.id,
+            "pid": Problem.objects.filter(contest=contest).order_by("id").first().id,
+            "sid": Submission.objects.filter(contest=contest).order_by("id").first().id,
+            "season": settings.CURRENT_SEASON,
+        }
+
+        measured = {}
+        for who, method, page, data, _ in PAGES:
+            self.client.logout()
+            if who != "anonymous":
+                self.client.force_login(staff if who == "staff" else user)
+            path = self._fill(page, names)
+            data = {key: self._fill(value, names) for key, value in (data or {}).items()}
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(self.client, method)(
+                    path, data, HTTP_USER_AGENT=MOBILE_AGENT if "mobile" in path else ""
+                )
+            self.assertLess(response.status_code, 400, f"{method} {path}")
+            measured[page] = (
+                len(queries),
+                sum(float(query["time"]) for query in queries.captured_queries),
+            )
+        return measured
+
+    def test_every_route_is_budgeted(self, *mocks):
+        budgeted = {
+            resolve(path.format(uid=1, cid=1, pid=1, sid=1, season=1)).route
+            for _, _, path, _, _ in PAGES
+        }
+        self.assertEqual(set(_routes(get_resolver())) - budgeted, set())
+
+    def test_query_budgets(self, *mocks):
+        results = {}
+        for name, sizes in DATASETS.items():
+            with transaction.atomic():
+                results[name] = self._measure(sizes)
+                transaction.set_rollback(True)
+
+        for _, _, page, _, budget in PAGES:
+            counts = {name: result[page][0] for name, result in results.items()}
+            with self.subTest(page=page):
+                self.assertLessEqual(max(counts.values()), budget, counts)
+                self.assertEqual(len(set(counts.values())), 1, counts)
+                for result in results.values():
+                    self.assertLess(result[page][1], QUERY_TIME_BUDGET)
@@ -167,7 +167,7 @@ def info_view(request):
 def user_profile_view(request, id):
     user = get_object_or_404(GraderUser, pk=id)
 
-    rating_changes = (
+    rating_changes = list(
         RatingChange.objects.filter(user=user)
         .order_by("time")
         .values("id", "rating", "time")
@@ -178,14 +178,11 @@ def user_profile_view(request, id):
         "username": user.username,
         "cf": user.cf_handle,
         "usaco": user.usaco_division,
-        "rating_changes": list(rating_changes),
-        "no_rating_history": "false",
+        "rating_changes": rating_changes,
+        "no_rating_history": "false" if rating_changes else "true",
         "admin": request.user.is_staff,
     }
 
-    if rating_changes.count() == 0:
-        context["no_rating_history"] = "true"
-
     return render(request, "index/user_profile.html", context)
 
 
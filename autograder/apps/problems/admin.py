@@ -29,7 +29,7 @@ class ProblemAdmin(admin.ModelAdmin):
     fieldsets = (
         (None, {"fields": ("id", "name", "contest", "points", "contest_letter")}),
         ("Limits", {"fields": ("tl", "ml")}),
-        ("Flags", {"fields": ("interactive", "secret")}),
+        ("Flags", {"fields": ("interactive", "streaming_interactor", "secret")}),
         (
             "Text Fields",
             {"fields": ("statement", "inputtxt", "outputtxt", "samples")},
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0014_remove_problem_interactor_file_alter_problem_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problem',
+            name='streaming_interactor',
+            field=models.BooleanField(default=False),
+        ),
+    ]
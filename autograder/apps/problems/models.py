@@ -17,6 +17,8 @@ class Problem(models.Model):
     ml = models.IntegerField(null=True, blank=True)
 
     interactive = models.BooleanField(default=False)
+    # interactor is started once per test and answers queries line by line
+    streaming_interactor = models.BooleanField(default=False)
     secret = models.BooleanField(default=False)
 
     testcases_zip = models.FileField(upload_to="problem_testcases/", blank=True)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import RatingChange
+from .models import RankingSnapshot, RatingChange
 
 
 @admin.register(RatingChange)
@@ -8,3 +8,10 @@ class RatingChangeAdmin(admin.ModelAdmin):
     list_filter = ("time",)
     search_fields = ("user__username",)
     ordering = ("-time",)
+
+
+@admin.register(RankingSnapshot)
+class RankingSnapshotAdmin(admin.ModelAdmin):
+    list_display = ("id", "season", "created_at")
+    list_filter = ("season",)
+    ordering = ("-id",)
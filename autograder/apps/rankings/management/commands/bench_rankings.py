@@ -0,0 +1,141 @@
+import random
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from ....index.models import GraderUser
+from ....contests.models import Contest, StandingsCell
+from ....contests.utils import invalidate_standings
+from ....problems.models import Problem
+from ...models import RankingSnapshot
+from ...utils import USACO_RATINGS, update_rankings
+
+
+class Command(BaseCommand):
+    help = (
+        "Times update_rankings against synthetic users and contests. "
+        "Everything it creates is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=3000)
+        parser.add_argument("--contests", type=int, default=30)
+        parser.add_argument("--problems", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        # a season of its own, so the live season's snapshots are left alone
+        season = 1 + max(
+            settings.CURRENT_SEASON,
+            Contest.objects.aggregate(Max("season"))["season__max"] or 0,
+            RankingSnapshot.objects.aggregate(Max("season"))["season__max"] or 0,
+        )
+        contest_ids = []
+        try:
+            with transaction.atomic():
+                contest_ids = self._populate(options, season)
+                # standings are cached by contest id, which the rollback frees
+                for cid in contest_ids:
+                    invalidate_standings(cid, frozen=True)
+
+                begin = time.perf_counter()
+                count = update_rankings(season)
+                elapsed = time.perf_counter() - begin
+
+                transaction.set_rollback(True)
+        finally:
+            for cid in contest_ids:
+                invalidate_standings(cid, frozen=True)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Ranked {count} users over {len(contest_ids)} contests "
+                f"in {elapsed:.2f}s"
+            )
+        )
+
+    def _populate(self, options, season):
+        rng = random.Random(options["seed"])
+        now = timezone.now()
+
+        users = GraderUser.objects.bulk_create(
+            [
+                GraderUser(
+                    email=f"bench{i}@example.com",
+                    username=f"bench_rankings_{i}",
+                    display_name=f"Bench {i}",
+                    usaco_division=rng.choice(list(USACO_RATINGS)),
+                    cf_rating=rng.randrange(0, 3000),
+                    author_drops=rng.choice([0, 0, 0, 1]),
+                )
+                for i in range(options["users"])
+            ],
+            batch_size=1000,
+        )
+
+        contests = Contest.objects.bulk_create(
+            [
+                Contest(
+                    name=f"Bench {i}",
+                    rated=True,
+                    season=season,
+                    start=now - timedelta(days=i + 1),
+                    end=now - timedelta(days=i + 1) + timedelta(hours=2),
+                )
+                for i in range(options["contests"])
+            ]
+        )
+
+        next_pid = (Problem.objects.aggregate(Max("id"))["id__max"] or 0) + 1
+        problems = []
+        for contest in contests:
+            contest.writers.add(*rng.sample(users, 2))
+            for j in range(options["problems"]):
+                problems.append(
+                    Problem(
+                        id=next_pid,
+                        name=f"Bench {next_pid}",
+                        contest=contest,
+                        contest_letter=chr(ord("A") + j),
+                        points=100 * (j + 1),
+                        statement="",
+                        inputtxt="",
+                        outputtxt="",
+                        samples="",
+                    )
+                )
+                next_pid += 1
+        Problem.objects.bulk_create(problems)
+
+        # each user takes part in about half the contests
+        participants = {
+            contest.id: rng.sample(users, len(users) // 2) for contest in contests
+        }
+        cells = []
+        for problem in problems:
+            contest = problem.contest
+            for user in participants[contest.id]:
+                if rng.random() < 0.3:
+                    continue
+                attempts = rng.randrange(1, 4)
+                minutes = rng.randrange(0, 120)
+                solved = rng.random() < 0.6
+                cells.append(
+                    StandingsCell(
+                        contest=contest,
+                        usr=user,
+                        problem=problem,
+                        attempts=attempts,
+                        solved_at=contest.start + timedelta(minutes=minutes)
+                        if solved
+                        else None,
+                        penalty=minutes + 5 * attempts if solved else 0,
+                    )
+                )
+        StandingsCell.objects.bulk_create(cells, batch_size=5000)
+
+        return [contest.id for contest in contests]
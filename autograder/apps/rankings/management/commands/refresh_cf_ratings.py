@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from ...tasks import refresh_codeforces_ratings
+
+
+class Command(BaseCommand):
+    help = "Refreshes every user's Codeforces rating in batched API requests."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--queue", action="store_true", help="Run on a Celery worker instead."
+        )
+
+    def handle(self, *args, **options):
+        if options["queue"]:
+            refresh_codeforces_ratings.delay()
+            self.stdout.write(self.style.SUCCESS("Refresh queued."))
+            return
+
+        changed = refresh_codeforces_ratings()
+        self.stdout.write(self.style.SUCCESS(f"Refresh complete ({changed} changed)."))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankings', '0003_alter_ratingchange_rating'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingSnapshot',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('season', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RankingEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.IntegerField()),
+                ('name', models.CharField(max_length=30)),
+                ('usaco', models.IntegerField()),
+                ('cf', models.IntegerField(blank=True, null=True)),
+                ('inhouse', models.DecimalField(decimal_places=3, max_digits=10)),
+                ('index', models.DecimalField(decimal_places=3, max_digits=10)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='rankings.rankingsnapshot')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['snapshot', 'rank'], name='ranking_entry_rank_idx')],
+            },
+        ),
+    ]
@@ -9,3 +9,35 @@ class RatingChange(models.Model):
 
     def __str__(self):
         return f"RatingChange #{self.id} for User {self.user_id} -> {self.rating}"
+
+
+class RankingSnapshot(models.Model):
+    """
+    The rankings of a season as of one ranking run. The rankings page always
+    shows the latest snapshot, so pages of it can be cached by its id.
+    """
+
+    id = models.AutoField(primary_key=True)
+    season = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"RankingSnapshot #{self.id} for season {self.season}"
+
+
+class RankingEntry(models.Model):
+    snapshot = models.ForeignKey(
+        RankingSnapshot, on_delete=models.CASCADE, related_name="entries"
+    )
+    user = models.ForeignKey("index.GraderUser", on_delete=models.CASCADE)
+    rank = models.IntegerField()
+    name = models.CharField(max_length=30)
+    usaco = models.IntegerField()
+    cf = models.IntegerField(blank=True, null=True)
+    inhouse = models.DecimalField(max_digits=10, decimal_places=3)
+    index = models.DecimalField(max_digits=10, decimal_places=3)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["snapshot", "rank"], name="ranking_entry_rank_idx"),
+        ]
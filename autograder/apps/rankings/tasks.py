@@ -1,92 +1,233 @@
 import requests
 import logging
 import string
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
 from ..index.models import GraderUser
 from decimal import Decimal
 from ...celery import app
+from .utils import USACO_RATINGS, publish_snapshot
 
 logger = logging.getLogger(__name__)
 
+HANDLE_CHARS = set(string.ascii_letters + string.digits + "_.-")
+
+# saves of the same user within this many seconds share one refresh
+CODEFORCES_REFRESH_WINDOW = 30
+
+SNAPSHOT_PENDING_KEY = "rankings_snapshot_pending"
+# index changes are published to the rankings page at most this often (seconds)
+SNAPSHOT_INTERVAL = 60
+
+
+def _refresh_pending_key(user_id):
+    return f"cf_refresh_pending_{user_id}"
+
+
+def is_valid_handle(handle):
+    return bool(handle) and all(c in HANDLE_CHARS for c in handle)
+
+
+def fetch_max_ratings(handles):
+    """
+    Returns {lowercased handle: max rating} for one user.info call. Codeforces
+    fails the whole call if any handle does not exist, so unknown handles are
+    dropped from the request and it is retried without them.
+    """
+    handles = list(handles)
+    while handles:
+        response = requests.get(
+            f"{settings.CODEFORCES_API_URL}/user.info",
+            params={"handles": ";".join(handles)},
+            timeout=10,
+        )
+        data = response.json()
+        if data.get("status") == "OK":
+            return {
+                user["handle"].lower(): user.get("maxRating", 0)
+                for user in data["result"]
+            }
+
+        comment = data.get("comment", "")
+        missing = comment.removeprefix("handles: User with handle ").removesuffix(
+            " not found"
+        )
+        if missing == comment or missing not in handles:
+            response.raise_for_status()
+            raise ValueError(f"Codeforces API error: {comment or 'No comment'}")
+        logger.info(f"Codeforces handle {missing} not found")
+        handles.remove(missing)
+        time.sleep(settings.CODEFORCES_API_INTERVAL)
+    return {}
+
+
+def schedule_codeforces_refresh(user_id):
+    """Refreshes a user's Codeforces rating soon, collapsing repeated triggers."""
+    try:
+        if cache.add(
+            _refresh_pending_key(user_id), True, timeout=CODEFORCES_REFRESH_WINDOW * 10
+        ):
+            update_codeforces_rating.apply_async(
+                (user_id,), countdown=CODEFORCES_REFRESH_WINDOW
+            )
+    except Exception as e:
+        logger.warning(f"Failed to schedule a Codeforces refresh: {e}")
+
 
 @app.task(rate_limit="2/s")
 def update_codeforces_rating(user_id):
-    user = GraderUser.objects.get(id=user_id)
+    # clear the flag first so a change during the refresh schedules another
+    cache.delete(_refresh_pending_key(user_id))
+    try:
+        user = GraderUser.objects.get(id=user_id)
+    except GraderUser.DoesNotExist:
+        return
     if not user.cf_handle:
-        update_user_index.delay(user.id)
+        _queue_index_update(user)
         return
 
     handle = str(user.cf_handle)
 
-    if not all(c in string.ascii_letters + string.digits + "_." for c in handle):
+    if not is_valid_handle(handle):
         logger.warning(f"Invalid Codeforces handle: {handle}")
-        update_user_index.delay(user.id)
+        _queue_index_update(user)
         return
 
-    url = f"https://codeforces.com/api/user.info?handles={handle}"
     try:
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to connect to Codeforces API: {e}")
-        update_user_index.delay(user.id)
+        max_rating = fetch_max_ratings([handle]).get(handle.lower())
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.error(f"Failed to fetch the Codeforces rating of {handle}: {e}")
+        _queue_index_update(user)
         return
 
-    data = response.json()
-    if data["status"] == "OK":
-        max_rating = data["result"][0].get("maxRating", 0)
+    # a handle that does not exist is checked again only once the rating is stale
+    now = timezone.now()
+    if max_rating is None or max_rating == user.cf_rating:
+        GraderUser.objects.filter(id=user.id).update(cf_rating_updated_at=now)
+    else:
         logger.info(
             f"Fetched cf rating of {max_rating} from handle {handle} for user {user.username}"
         )
+        user.cf_rating = max_rating
+        user.cf_rating_updated_at = now
+        user.save(update_fields=["cf_rating", "cf_rating_updated_at"])
+    _queue_index_update(user)
 
-        if user.cf_rating != max_rating:
-            user.cf_rating = max_rating
-            user.save(update_fields=["cf_rating"])
-            update_user_index.delay(user.id)
-    else:
-        logger.error(
-            f"Codeforces API error for handle {handle}: {data.get('comment', 'No comment')}"
-        )
 
+def _queue_index_update(user):
+    # the refresh also runs after a USACO division change, which the index
+    # depends on as well
+    if compute_index(user) != user.index:
+        update_user_index.delay(user.id)
 
-@app.task
-def update_user_index(user_id):
-    try:
-        user = GraderUser.objects.get(id=user_id)
-    except GraderUser.DoesNotExist:
-        logger.error(f"User with ID {user_id} not found.")
-        return
-
-    usaco_map = {
-        "Not Participated": 800,
-        "Bronze": 800,
-        "Silver": 1200,
-        "Gold": 1600,
-        "Platinum": 1900,
-    }
 
-    new_usaco_rating = usaco_map.get(user.usaco_division, 800)
+def compute_index(user):
+    new_usaco_rating = USACO_RATINGS.get(user.usaco_division, 800)
 
     # Use writer formula if enabled: 0.4 * min(cf, usaco) + 0.6 * max(cf, usaco)
     # Otherwise use standard formula: 0.2 * min + 0.35 * mid + 0.45 * max
     if user.use_writer_formula:
         cf_rating = Decimal(str(user.cf_rating))
         usaco_rating = Decimal(str(new_usaco_rating))
-        new_index = (
-            Decimal("0.4") * min(cf_rating, usaco_rating)
-            + Decimal("0.6") * max(cf_rating, usaco_rating)
-        )
-    else:
-        vals = sorted(
-            [
-                Decimal(str(new_usaco_rating)),
-                Decimal(str(user.cf_rating)),
-                Decimal(str(user.inhouse)),
-            ]
-        )
-        new_index = (
-            Decimal("0.2") * vals[0] + Decimal("0.35") * vals[1] + Decimal("0.45") * vals[2]
+        return Decimal("0.4") * min(cf_rating, usaco_rating) + Decimal("0.6") * max(
+            cf_rating, usaco_rating
         )
 
+    vals = sorted(
+        [
+            Decimal(str(new_usaco_rating)),
+            Decimal(str(user.cf_rating)),
+            Decimal(str(user.inhouse)),
+        ]
+    )
+    return (
+        Decimal("0.2") * vals[0] + Decimal("0.35") * vals[1] + Decimal("0.45") * vals[2]
+    )
+
+
+@app.task
+def update_user_index(user_id):
+    try:
+        user = GraderUser.objects.get(id=user_id)
+    except GraderUser.DoesNotExist:
+        logger.error(f"User with ID {user_id} not found.")
+        return
+
+    new_index = compute_index(user)
     if user.index != new_index:
         user.index = new_index
         user.save(update_fields=["index"])
+        schedule_snapshot()
+
+
+@app.task
+def publish_rankings_snapshot():
+    # clear the flag first so a change during the publish schedules another
+    cache.delete(SNAPSHOT_PENDING_KEY)
+    publish_snapshot()
+
+
+def schedule_snapshot():
+    """Publishes a new rankings snapshot soon, collapsing bursts of index changes."""
+    try:
+        if cache.add(SNAPSHOT_PENDING_KEY, True, timeout=SNAPSHOT_INTERVAL * 10):
+            publish_rankings_snapshot.apply_async(countdown=SNAPSHOT_INTERVAL)
+    except Exception as e:
+        logger.warning(f"Failed to schedule a rankings snapshot: {e}")
+
+
+@app.task
+def refresh_codeforces_ratings():
+    """
+    Refreshes the Codeforces rating of every user with a valid handle, asking
+    for many handles per request, and recomputes the index of the users whose
+    rating changed. Returns the number of changed users.
+    """
+    users_by_handle = {}
+    for user in GraderUser.objects.exclude(cf_handle__isnull=True).exclude(
+        cf_handle=""
+    ):
+        if is_valid_handle(user.cf_handle):
+            users_by_handle.setdefault(user.cf_handle.lower(), []).append(user)
+        else:
+            logger.warning(f"Invalid Codeforces handle: {user.cf_handle}")
+
+    handles = list(users_by_handle)
+    size = settings.CODEFORCES_BATCH_SIZE
+    changed = []
+    fetched = []
+    for i in range(0, len(handles), size):
+        if i:
+            time.sleep(settings.CODEFORCES_API_INTERVAL)
+        chunk = handles[i : i + size]
+        try:
+            ratings = fetch_max_ratings(chunk)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error(f"Failed to fetch {len(chunk)} Codeforces ratings: {e}")
+            continue
+
+        # handles missing from ratings do not exist; they count as checked too
+        for handle in chunk:
+            for user in users_by_handle[handle]:
+                fetched.append(user.id)
+                max_rating = ratings.get(handle)
+                if max_rating is not None and user.cf_rating != max_rating:
+                    user.cf_rating = max_rating
+                    changed.append(user)
+
+    for user in changed:
+        user.index = compute_index(user)
+    # bulk_update skips post_save, which would queue a per-user refresh again
+    GraderUser.objects.bulk_update(changed, ["cf_rating", "index"], batch_size=500)
+    GraderUser.objects.filter(id__in=fetched).update(
+        cf_rating_updated_at=timezone.now()
+    )
+    if changed:
+        publish_snapshot()
+
+    logger.info(
+        f"Refreshed Codeforces ratings of {len(handles)} handles, {len(changed)} changed"
+    )
+    return len(changed)
@@ -1 +1,263 @@
-# Create your tests here.
+import json
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import StringIO
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
+from django.conf import settings
+from django.core.management import call_command
+from django.db import transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from ..contests.models import Contest, StandingsCell
+from ..index.models import GraderUser
+from ..problems.models import Problem
+from .models import RankingEntry, RankingSnapshot, RatingChange
+from .tasks import (
+    compute_index,
+    refresh_codeforces_ratings,
+    update_codeforces_rating,
+)
+from .utils import latest_snapshot, update_rankings
+from .views import rankings_view
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class UpdateRankingsTests(TestCase):
+    def test_update_rankings(self):
+        with patch("autograder.apps.index.signals.schedule_codeforces_refresh"):
+            first, second, writer = [
+                GraderUser.objects.create_user(
+                    email=f"{i}@a.com",
+                    username=f"u{i}",
+                    cf_rating=1500,
+                    usaco_division="Gold",
+                )
+                for i in range(3)
+            ]
+        start = timezone.now() - timedelta(days=1)
+        contest = Contest.objects.create(
+            name="Contest",
+            season=settings.CURRENT_SEASON,
+            rated=True,
+            start=start,
+            end=start + timedelta(hours=2),
+        )
+        contest.writers.add(writer)
+        problem = Problem.objects.create(
+            id=1,
+            name="A",
+            contest=contest,
+            points=100,
+            statement="",
+            inputtxt="",
+            outputtxt="",
+            samples="",
+        )
+        for usr, minutes in ((first, 10), (second, 20)):
+            StandingsCell.objects.create(
+                contest=contest,
+                usr=usr,
+                problem=problem,
+                attempts=1,
+                solved_at=start + timedelta(minutes=minutes),
+                penalty=minutes + 5,
+            )
+        # unrated contests have standings too, but do not count
+        unrated = Contest.objects.create(
+            name="Unrated",
+            season=settings.CURRENT_SEASON,
+            start=start,
+            end=start + timedelta(hours=2),
+        )
+        StandingsCell.objects.create(
+            contest=unrated,
+            usr=second,
+            problem=Problem.objects.create(
+                id=2,
+                name="A",
+                contest=unrated,
+                points=100,
+                statement="",
+                inputtxt="",
+                outputtxt="",
+                samples="",
+            ),
+            attempts=1,
+            solved_at=start,
+            penalty=5,
+        )
+
+        self.assertEqual(update_rankings(), 3)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        writer.refresh_from_db()
+        self.assertEqual(first.inhouses, [Decimal("2000")])
+        self.assertEqual(second.inhouses, [Decimal("1400")])
+        self.assertEqual(writer.inhouses, [Decimal("1560")])
+        # 0.2 * 1500 + 0.35 * 1600 + 0.45 * 2000
+        self.assertEqual(first.index, Decimal("1760"))
+        self.assertEqual(RatingChange.objects.count(), 3)
+
+        snapshot = RankingSnapshot.objects.get()
+        self.assertEqual(
+            list(
+                RankingEntry.objects.filter(snapshot=snapshot)
+                .order_by("rank")
+                .values_list("user_id", "rank")
+            ),
+            [(first.id, 1), (writer.id, 2), (second.id, 3)],
+        )
+
+        def get():
+            request = RequestFactory().get("/rankings/")
+            request.user = second
+            return rankings_view(request, settings.CURRENT_SEASON)
+
+        self.assertContains(get(), "Page 1 of 1")
+
+        # the cached page is served until a new snapshot is published
+        GraderUser.objects.filter(id=first.id).update(display_name="Renamed")
+        self.assertNotContains(get(), "Renamed")
+        with self.captureOnCommitCallbacks(execute=True):
+            update_rankings()
+        self.assertContains(get(), "Renamed")
+        published = latest_snapshot()
+
+        # a snapshot that is rolled back is never cached
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                update_rankings()
+                transaction.set_rollback(True)
+        self.assertEqual(latest_snapshot(), published)
+
+        # nor is the live season's snapshot replaced by the benchmark's
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("bench_rankings", users=10, contests=2, stdout=StringIO())
+        self.assertEqual(latest_snapshot(), published)
+
+        # a cached snapshot that is gone is replaced by the newest one left
+        published.delete()
+        self.assertContains(get(), "Page 1 of 1")
+        self.assertEqual(latest_snapshot(), snapshot)
+
+
+class CodeforcesStub(BaseHTTPRequestHandler):
+    ratings = {"tourist": 3979, "Petr": 3424, "jiangly": 3963}
+    requests = []
+
+    def do_GET(self):
+        handles = parse_qs(urlparse(self.path).query)["handles"][0].split(";")
+        self.requests.append(handles)
+        missing = [h for h in handles if h.lower() not in map(str.lower, self.ratings)]
+        if missing:
+            body = {
+                "status": "FAILED",
+                "comment": f"handles: User with handle {missing[0]} not found",
+            }
+        else:
+            by_lower = {h.lower(): (h, r) for h, r in self.ratings.items()}
+            body = {
+                "status": "OK",
+                "result": [
+                    {
+                        "handle": by_lower[h.lower()][0],
+                        "maxRating": by_lower[h.lower()][1],
+                    }
+                    for h in handles
+                ],
+            }
+        self.send_response(200 if not missing else 400)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class RefreshCodeforcesRatingsTests(TestCase):
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), CodeforcesStub)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        CodeforcesStub.requests = []
+
+    def test_refresh(self):
+        with patch("autograder.apps.index.signals.schedule_codeforces_refresh"):
+            users = {
+                handle: GraderUser.objects.create_user(
+                    email=f"{handle}@a.com",
+                    username=handle,
+                    cf_handle=handle,
+                    cf_rating=rating,
+                )
+                for handle, rating in (
+                    ("Tourist", 3979),
+                    ("petr", 0),
+                    ("ghost", 0),
+                    ("jiangly", 0),
+                    ("bad;handle", 0),
+                )
+            }
+
+        url = f"http://127.0.0.1:{self.server.server_port}/api"
+        with self.settings(
+            CODEFORCES_API_URL=url, CODEFORCES_BATCH_SIZE=2, CODEFORCES_API_INTERVAL=0
+        ):
+            self.assertEqual(refresh_codeforces_ratings(), 2)
+
+        # ghost is dropped and its chunk retried, bad;handle is never sent
+        self.assertEqual(
+            CodeforcesStub.requests,
+            [["tourist", "petr"], ["ghost", "jiangly"], ["jiangly"]],
+        )
+        for user in users.values():
+            user.refresh_from_db()
+        self.assertEqual(users["petr"].cf_rating, 3424)
+        self.assertEqual(users["jiangly"].cf_rating, 3963)
+        self.assertEqual(users["ghost"].cf_rating, 0)
+        self.assertIsNotNone(users["ghost"].cf_rating_updated_at)
+        # 0.2 * 0 (no inhouses yet) + 0.35 * 800 + 0.45 * 3424
+        self.assertEqual(users["petr"].index, Decimal("1820.800"))
+
+    @patch("autograder.apps.rankings.tasks.update_user_index.delay")
+    def test_update_one(self, delay):
+        with patch("autograder.apps.index.signals.schedule_codeforces_refresh"):
+            ghost, petr = [
+                GraderUser.objects.create_user(
+                    email=f"{handle}@a.com", username=handle, cf_handle=handle
+                )
+                for handle in ("ghost", "Petr")
+            ]
+        for user in (ghost, petr):
+            GraderUser.objects.filter(id=user.id).update(index=compute_index(user))
+
+        url = f"http://127.0.0.1:{self.server.server_port}/api"
+        with self.settings(CODEFORCES_API_URL=url, CODEFORCES_API_INTERVAL=0):
+            update_codeforces_rating(ghost.id)
+            update_codeforces_rating(petr.id)
+            petr.refresh_from_db()
+            self.assertEqual(petr.cf_rating, 3424)
+            delay.assert_called_once_with(petr.id)
+
+            # an unchanged rating is not saved again
+            GraderUser.objects.filter(id=petr.id).update(index=compute_index(petr))
+            with patch("autograder.apps.index.signals.schedule_codeforces_refresh"):
+                with patch.object(GraderUser, "save") as save:
+                    update_codeforces_rating(petr.id)
+            save.assert_not_called()
+            delay.assert_called_once()
+
+        # a handle that does not exist is not checked again on every save
+        ghost.refresh_from_db()
+        self.assertEqual(ghost.cf_rating, 0)
+        self.assertIsNotNone(ghost.cf_rating_updated_at)
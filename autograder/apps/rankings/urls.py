@@ -7,4 +7,5 @@ app_name = "rankings"
 urlpatterns = [
     path("", views.rankings_view, {"season": None}, name="rankings"),
     path("<int:season>/", views.rankings_view, name="rankings"),
+    path("<int:season>/<int:page>/", views.rankings_view, name="rankings"),
 ]
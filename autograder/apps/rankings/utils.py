@@ -0,0 +1,199 @@
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from ..index.models import GraderUser
+from ..contests.models import Contest
+from ..contests.utils import get_standings
+from .models import RankingEntry, RankingSnapshot, RatingChange
+import logging
+
+logger = logging.getLogger(__name__)
+
+# snapshots kept besides the latest, for pages rendered just before a publish
+SNAPSHOTS_KEPT = 2
+
+# Map USACO division to rating
+USACO_RATINGS = {
+    "Not Participated": 800,
+    "Bronze": 800,
+    "Silver": 1200,
+    "Gold": 1600,
+    "Platinum": 1900,
+}
+
+
+def writer_index(cf, usaco):
+    cf_rating = Decimal(str(cf))
+    usaco_rating = Decimal(str(usaco))
+    return Decimal("0.4") * min(cf_rating, usaco_rating) + Decimal("0.6") * max(
+        cf_rating, usaco_rating
+    )
+
+
+def contest_scores(contest):
+    """Returns {user id: inhouse score} for everyone in the contest's standings."""
+    load = get_standings(contest.id)["load"]
+    n = len(load)
+    return {entry["id"]: 1200 * (n - entry["rank"] + 1) / n + 800 for entry in load}
+
+
+def compute_rankings(users, contests):
+    """
+    Returns {user id: (inhouses, inhouse, index)}. Each contest's standings and
+    writers are loaded once, so this makes two queries per contest however many
+    users there are.
+    """
+    results = [
+        (set(contest.writers.values_list("id", flat=True)), contest_scores(contest))
+        for contest in contests
+    ]
+
+    rankings = {}
+    for user in users:
+        usaco = USACO_RATINGS[user.usaco_division]
+
+        inhouses = []
+        for writers, scores in results:
+            # writers get their writer formula index for the contest, no penalty
+            if user.id in writers:
+                inhouses.append(writer_index(user.cf_rating, usaco))
+            else:
+                inhouses.append(scores.get(user.id, 0))
+
+        valid_scores = sorted(float(x) for x in inhouses)
+
+        # Compute drops based on actual participated contests
+        drops = max(0, min(2, len(valid_scores) - 2) + user.author_drops)
+
+        # Compute overall inhouse score after drops
+        overall = sum(valid_scores[drops:]) if len(valid_scores) > drops else 0
+        if len(valid_scores) - drops > 0:
+            overall /= len(valid_scores) - drops
+
+        # Use writer formula if user has no participated inhouses or writer formula is enabled
+        if user.use_writer_formula or len(valid_scores) == 0:
+            index = writer_index(user.cf_rating, usaco)
+        else:
+            vals = sorted([usaco, user.cf_rating, overall])
+            index = (
+                Decimal("0.2") * Decimal(str(vals[0]))
+                + Decimal("0.35") * Decimal(str(vals[1]))
+                + Decimal("0.45") * Decimal(str(vals[2]))
+            )
+
+        rankings[user.id] = (inhouses, overall, index)
+    return rankings
+
+
+def update_rankings(season=None):
+    """
+    Recomputes every ranked user's inhouses, inhouse score and index for the
+    season, the current one by default, and records a RatingChange for each,
+    in one transaction. Returns the number of users updated.
+    """
+    season = season or settings.CURRENT_SEASON
+    users = list(
+        GraderUser.objects.filter(is_tjioi=False, is_staff=False).only(
+            "id",
+            "usaco_division",
+            "cf_rating",
+            "author_drops",
+            "use_writer_formula",
+        )
+    )
+    contests = Contest.objects.filter(rated=True, season=season)
+    rankings = compute_rankings(users, contests)
+
+    changes = []
+    for user in users:
+        user.inhouses, user.inhouse, user.index = rankings[user.id]
+        changes.append(RatingChange(user=user, rating=user.index))
+
+    # bulk_update skips post_save, so this does not queue a Codeforces refresh per user
+    with transaction.atomic():
+        GraderUser.objects.bulk_update(
+            users, ["inhouses", "inhouse", "index"], batch_size=500
+        )
+        RatingChange.objects.bulk_create(changes, batch_size=500)
+
+    logger.info(f"Updated rankings of {len(users)} users")
+    publish_snapshot(season)
+    return len(users)
+
+
+def _snapshot_key(season):
+    return f"rankings_snapshot_{season}"
+
+
+def publish_snapshot(season=None):
+    """Stores the current rankings of ranked users as the season's latest snapshot."""
+    season = season or settings.CURRENT_SEASON
+    users = (
+        GraderUser.objects.filter(is_tjioi=False, is_staff=False)
+        .filter(Q(usaco_rating__gt=800) | Q(cf_rating__gt=0) | Q(inhouse__gt=0))
+        .order_by("-index", "id")
+        .values_list(
+            "id", "display_name", "usaco_rating", "cf_rating", "inhouse", "index"
+        )
+    )
+
+    with transaction.atomic():
+        snapshot = RankingSnapshot.objects.create(season=season)
+        RankingEntry.objects.bulk_create(
+            [
+                RankingEntry(
+                    snapshot=snapshot,
+                    user_id=uid,
+                    rank=rank,
+                    name=name,
+                    usaco=usaco,
+                    cf=cf,
+                    inhouse=inhouse,
+                    index=index,
+                )
+                for rank, (uid, name, usaco, cf, inhouse, index) in enumerate(
+                    users.iterator(), start=1
+                )
+            ],
+            batch_size=1000,
+        )
+        old = RankingSnapshot.objects.filter(season=season).order_by("-id")
+        old_ids = list(old.values_list("id", flat=True)[SNAPSHOTS_KEPT + 1 :])
+        RankingSnapshot.objects.filter(id__in=old_ids).delete()
+
+    def cache_snapshot():
+        try:
+            cache.set(_snapshot_key(season), snapshot, timeout=None)
+        except Exception as e:
+            logger.warning(f"Failed to cache the rankings snapshot: {e}")
+
+    # a snapshot published in a transaction that is rolled back is never cached
+    transaction.on_commit(cache_snapshot)
+    return snapshot
+
+
+def _latest_snapshot(season):
+    snapshot = RankingSnapshot.objects.filter(season=season).order_by("-id").first()
+    return snapshot or publish_snapshot(season)
+
+
+def latest_snapshot(season=None, refresh=False):
+    """
+    Returns the season's latest snapshot, from the cache unless refresh is
+    set, which reloads it from the database in case the cached one is gone.
+    """
+    season = season or settings.CURRENT_SEASON
+    key = _snapshot_key(season)
+    try:
+        snapshot = None if refresh else cache.get(key)
+    except Exception as e:
+        logger.warning(f"Rankings snapshot cache lookup failed: {e}")
+        return _latest_snapshot(season)
+
+    if snapshot is None:
+        snapshot = _latest_snapshot(season)
+        cache.set(key, snapshot, timeout=None)
+    return snapshot
@@ -1,39 +1,40 @@
 from django.shortcuts import render, redirect
 from django.conf import settings
+from django.core.paginator import Paginator
 from ..oauth.decorators import login_required
-from ..index.models import GraderUser
+from .models import RankingEntry
+from .utils import latest_snapshot
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+RANKINGS_PER_PAGE = 100
+# rendered pages are keyed by snapshot, so this only bounds memory use
+RANKINGS_FRAGMENT_TIMEOUT = 60 * 60
+
 
 # Create your views here.
 @login_required
-def rankings_view(request, season):
+def rankings_view(request, season, page=1):
     if season != settings.CURRENT_SEASON:
         return redirect("rankings:rankings", season=settings.CURRENT_SEASON)
 
-    rankings = [
-        {
-            "id": user.id,
-            "name": user.display_name,
-            "index": user.index,
-            "usaco": user.usaco_rating,
-            "cf": user.cf_rating,
-            "inhouse": user.inhouse,
-        }
-        for user in GraderUser.objects.filter(is_tjioi=False, is_staff=False)
-    ]
-
-    rankings = [
-        r for r in rankings if r["usaco"] > 800 or r["cf"] > 0 or r["inhouse"] > 0
-    ]
-
-    rankings.sort(key=lambda x: x["index"], reverse=True)
-    for i in range(len(rankings)):
-        rankings[i]["rank"] = i + 1
-
-    context = {"rankings": rankings}
+    snapshot = latest_snapshot(season)
+    entries = RankingEntry.objects.filter(snapshot=snapshot).order_by("rank")
+    page_obj = Paginator(entries, RANKINGS_PER_PAGE).get_page(page)
+    if not page_obj.paginator.count:
+        # the cached snapshot may have been deleted; the newest one is used
+        snapshot = latest_snapshot(season, refresh=True)
+        entries = RankingEntry.objects.filter(snapshot=snapshot).order_by("rank")
+        page_obj = Paginator(entries, RANKINGS_PER_PAGE).get_page(page)
+
+    context = {
+        "snapshot": snapshot,
+        "page_obj": page_obj,
+        "rankings": page_obj.object_list,
+        "season": season,
+        "fragment_timeout": RANKINGS_FRAGMENT_TIMEOUT,
+    }
 
     return render(request, "rankings/rankings.html", context)
@@ -1,6 +1,7 @@
+from django import forms
 from django.contrib import admin
-from .models import Submission
-from .tasks import grade_submission_task
+from .models import SourceBlob, Submission
+from .tasks import enqueue_submission
 
 
 @admin.action(description="Rerun submissions")
@@ -10,21 +11,41 @@ def rerun_submissions(modeladmin, request, queryset):
             continue
         new_sub = Submission.objects.create(
             usr=old_sub.usr,
-            code=old_sub.code,
+            source_id=old_sub.source_id,
             problem=old_sub.problem,
             language=old_sub.language,
             contest=old_sub.contest,
             timestamp=old_sub.timestamp,
+            queue_class=Submission.REJUDGE,
         )
         new_sub.save()
         old_sub.verdict = "Rerun"
         old_sub.insight = "Your submission was manually rerun by an admin"
         old_sub.save()
-        grade_submission_task.delay(new_sub.id)
+        enqueue_submission(new_sub)
+
+
+class SubmissionAdminForm(forms.ModelForm):
+    code = forms.CharField(widget=forms.Textarea, required=False, strip=False)
+
+    class Meta:
+        model = Submission
+        exclude = ("source",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk is not None:
+            self.initial["code"] = self.instance.code
+
+    def save(self, commit=True):
+        if self.instance.pk is None or self.cleaned_data["code"] != self.instance.code:
+            self.instance.code = self.cleaned_data["code"]
+        return super().save(commit)
 
 
 @admin.register(Submission)
 class SubmissionAdmin(admin.ModelAdmin):
+    form = SubmissionAdminForm
     list_display = (
         "id",
         "usr",
@@ -33,9 +54,11 @@ class SubmissionAdmin(admin.ModelAdmin):
         "language",
         "verdict",
         "runtime",
+        "memory",
+        "queue_class",
         "timestamp",
     )
-    list_filter = ("verdict", "language", "problem", "usr", "contest")
+    list_filter = ("verdict", "language", "queue_class", "problem", "usr", "contest")
     search_fields = ("problem__name", "verdict")
     ordering = ("-timestamp",)
     readonly_fields = ("timestamp",)
@@ -47,8 +70,25 @@ class SubmissionAdmin(admin.ModelAdmin):
         ),
         (
             "Result Info",
-            {"fields": ("verdict", "runtime", "timestamp", "insight")},
+            {
+                "fields": (
+                    "verdict",
+                    "runtime",
+                    "memory",
+                    "queue_class",
+                    "timestamp",
+                    "insight",
+                )
+            },
         ),
     )
 
     actions = [rerun_submissions]
+
+
+@admin.register(SourceBlob)
+class SourceBlobAdmin(admin.ModelAdmin):
+    list_display = ("id", "sha256", "size")
+    search_fields = ("sha256",)
+    readonly_fields = ("sha256", "size", "text")
+    exclude = ("data",)
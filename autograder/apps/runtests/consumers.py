@@ -1,10 +1,25 @@
 import json
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.core.cache import cache
+from .models import Submission
+from .utils import QUEUE_POSITIONS_KEY, frozen_submission_ids
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def _visible_submissions(user, submission_ids):
+    # the results of other users' submissions stay hidden during a freeze
+    subs = (
+        Submission.objects.filter(id__in=submission_ids)
+        .select_related("contest")
+        .only("id", "usr", "timestamp", "contest__end", "contest__freeze_minutes")
+    )
+    hidden = frozen_submission_ids(user, subs)
+    return [sid for sid in submission_ids if int(sid) not in hidden]
+
+
 class SubmissionStatusConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.user_group_name = f"user_{self.scope['user'].id}"
@@ -18,18 +33,52 @@ class SubmissionStatusConsumer(AsyncWebsocketConsumer):
     async def receive(self, text_data):
         data = json.loads(text_data)
         if data["type"] == "join_submissions":
-            submission_ids = data["submission_ids"]
+            submission_ids = await database_sync_to_async(_visible_submissions)(
+                self.scope["user"], data["submission_ids"]
+            )
             for submission_id in submission_ids:
                 group_name = f"submission_{submission_id}"
                 await self.channel_layer.group_add(group_name, self.channel_name)
                 logger.info(f"Added client to group {group_name}")
 
+            # positions are computed by broadcast_queue_positions, never per client
+            positions, depth = await database_sync_to_async(cache.get)(
+                QUEUE_POSITIONS_KEY, ({}, 0)
+            )
+            for submission_id in submission_ids:
+                position = positions.get(int(submission_id))
+                if position is not None:
+                    await self.queue_position(
+                        {
+                            "submission_id": int(submission_id),
+                            "position": position,
+                            "depth": depth,
+                        }
+                    )
+
     async def submission_status(self, event):
         message = event["message"]
         runtime = event["runtime"]
+        memory = event.get("memory", -1)
         submission_id = event["submission_id"]
         await self.send(
             text_data=json.dumps(
-                {"submission_id": submission_id, "message": message, "runtime": runtime}
+                {
+                    "submission_id": submission_id,
+                    "message": message,
+                    "runtime": runtime,
+                    "memory": memory,
+                }
+            )
+        )
+
+    async def queue_position(self, event):
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "submission_id": event["submission_id"],
+                    "queue_position": event["position"],
+                    "queue_depth": event["depth"],
+                }
             )
         )
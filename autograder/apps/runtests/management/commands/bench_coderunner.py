@@ -0,0 +1,239 @@
+import json
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+from django.conf import settings
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.test.utils import override_settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .....coderunner.files import add_tests_to_coderunner
+from .....coderunner.metrics import StageTimer
+from ....contests.models import Contest
+from ....index.models import GraderUser
+from ....problems.models import Problem
+from ...models import SourceBlob, Submission
+
+EXAMPLE_SOLS = Path(settings.BASE_DIR) / "config" / "example_sols"
+SOLUTIONS = {
+    "cpp": "example_sol.cpp",
+    "java": "example_sol.java",
+    "python": "example_sol.py",
+}
+# reported per run, in milliseconds; jail is the wall time of the runs beyond
+# the CPU time the solution itself used
+STAGES = ("compile", "jail", "user", "checker", "cleanup", "total")
+
+
+def breakdown(totals, total):
+    run = totals.get("run", 0)
+    user = totals.get("user", 0)
+    return {
+        "compile": totals.get("compile", 0) * 1000,
+        "jail": max(0, run - user) * 1000,
+        "user": user * 1000,
+        "checker": totals.get("check", 0) * 1000,
+        "cleanup": totals.get("cleanup", 0) * 1000,
+        "total": total * 1000,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Grades the example solutions against the example problem a number of "
+        "times and reports where the time goes. Compares against a baseline file "
+        "and fails when a stage got slower than the threshold allows. Grades "
+        "with CODERUNNER_HANDLER."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument(
+            "--languages", nargs="+", choices=list(SOLUTIONS), default=list(SOLUTIONS)
+        )
+        parser.add_argument(
+            "--baseline",
+            default=str(Path(settings.BASE_DIR) / "coderunner_baseline.json"),
+        )
+        parser.add_argument(
+            "--save-baseline",
+            action="store_true",
+            help="Write the results to the baseline file instead of comparing.",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=20,
+            help="Percentage by which a stage's median may exceed the baseline.",
+        )
+        parser.add_argument(
+            "--min-delta",
+            type=float,
+            default=5,
+            help="Slowdowns of fewer milliseconds than this never count.",
+        )
+        parser.add_argument(
+            "--warm-compile-cache",
+            action="store_true",
+            help="Keep compiled solutions between runs, as a busy worker would.",
+        )
+
+    def handle(self, *args, **options):
+        results = self._bench(options)
+
+        for lang, stages in results.items():
+            self.stdout.write(
+                f"{lang:>6}: "
+                + ", ".join(f"{stage} {stages[stage]:.1f} ms" for stage in STAGES)
+            )
+
+        baseline_path = Path(options["baseline"])
+        report = {"runs": options["runs"], "languages": results}
+        if options["save_baseline"]:
+            baseline_path.write_text(json.dumps(report, indent=2) + "\n")
+            self.stdout.write(
+                self.style.SUCCESS(f"Saved the baseline to {baseline_path}")
+            )
+            return
+        if not baseline_path.exists():
+            self.stdout.write(
+                f"No baseline at {baseline_path}, run with --save-baseline to make one"
+            )
+            return
+
+        baseline = json.loads(baseline_path.read_text())["languages"]
+        regressions = []
+        for lang, stages in results.items():
+            for stage, value in stages.items():
+                before = baseline.get(lang, {}).get(stage)
+                if before is None:
+                    continue
+                if (
+                    value > before * (1 + options["threshold"] / 100)
+                    and value - before >= options["min_delta"]
+                ):
+                    regressions.append(
+                        f"{lang} {stage}: {before:.1f} ms -> {value:.1f} ms"
+                    )
+
+        if regressions:
+            raise CommandError(
+                f"Stages slower than the baseline by more than "
+                f"{options['threshold']:g}%:\n" + "\n".join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS("No stage regressed"))
+
+    def _bench(self, options):
+        cache_dir = Path(tempfile.mkdtemp(prefix="bench_compile_cache_"))
+        problem = None
+        try:
+            # verdicts are never reused, so every run really grades
+            with (
+                override_settings(
+                    CODERUNNER_VERDICT_CACHE=False,
+                    CODERUNNER_COMPILE_CACHE_DIR=str(cache_dir),
+                ),
+                transaction.atomic(),
+            ):
+                problem, submissions = self._populate(options["languages"])
+                results = {
+                    lang: self._grade(problem, submission, cache_dir, options)
+                    for lang, submission in submissions.items()
+                }
+                transaction.set_rollback(True)
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            if problem is not None:
+                problem.testcases_zip.delete(save=False)
+                for root in (
+                    Path("/home/tjctgrader/problems"),
+                    Path(settings.BASE_DIR).parent / "problems",
+                ):
+                    shutil.rmtree(root / str(problem.id), ignore_errors=True)
+        return results
+
+    def _populate(self, languages):
+        now = timezone.now()
+        # bulk_create skips the signals that would queue standings and rating updates
+        (user,) = GraderUser.objects.bulk_create(
+            [GraderUser(email="bench@example.com", username="bench_coderunner")]
+        )
+        contest = Contest.objects.create(
+            name="Coderunner benchmark",
+            season=settings.CURRENT_SEASON,
+            start=now,
+            end=now + timedelta(hours=1),
+        )
+        problem = Problem.objects.create(
+            id=(Problem.objects.aggregate(Max("id"))["id__max"] or 0) + 1,
+            name="Coderunner benchmark",
+            contest=contest,
+            points=0,
+            tl=2000,
+            ml=256,
+            secret=True,
+            statement="",
+            inputtxt="",
+            outputtxt="",
+            samples="",
+        )
+        with open(EXAMPLE_SOLS / "example_testcases.zip", "rb") as f:
+            problem.testcases_zip.save("example_testcases.zip", File(f), save=False)
+        Problem.objects.filter(id=problem.id).update(
+            testcases_zip=problem.testcases_zip.name
+        )
+        add_tests_to_coderunner(problem.id)
+
+        submissions = Submission.objects.bulk_create(
+            [
+                Submission(
+                    usr=user,
+                    contest=contest,
+                    problem=problem,
+                    language=lang,
+                    source=SourceBlob.store(
+                        (EXAMPLE_SOLS / SOLUTIONS[lang]).read_text()
+                    ),
+                )
+                for lang in languages
+            ]
+        )
+        return problem, {s.language: s for s in submissions}
+
+    def _grade(self, problem, submission, cache_dir, options):
+        run_code_handler = import_string(settings.CODERUNNER_HANDLER)
+        runs = []
+        for _ in range(options["runs"]):
+            if not options["warm_compile_cache"]:
+                shutil.rmtree(cache_dir, ignore_errors=True)
+
+            timer = StageTimer(submission.language, problem.id)
+            begin = time.perf_counter()
+            result = run_code_handler(
+                problem.tl,
+                problem.ml,
+                submission.language,
+                problem.id,
+                submission.id,
+                submission.code,
+                timer,
+            )
+            total = time.perf_counter() - begin
+            if result.get("verdict") != "Accepted":
+                raise CommandError(
+                    f"The {submission.language} example solution got "
+                    f"{result.get('verdict') or result.get('error')}: "
+                    f"{result.get('output', '')}"
+                )
+            runs.append(breakdown(timer.totals(), total))
+
+        return {
+            stage: statistics.median(run[stage] for run in runs) for stage in STAGES
+        }
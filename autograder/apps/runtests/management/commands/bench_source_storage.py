@@ -0,0 +1,95 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from django.db.models.functions import Length
+
+from ...models import SourceBlob, Submission
+
+BLOB_TABLE = "bench_blob_submission"
+INLINE_TABLE = "bench_inline_submission"
+
+# the columns the status pages and standings read
+LIST_QUERY = (
+    "SELECT id, usr_id, problem_id, contest_id, verdict, runtime, memory, timestamp "
+    "FROM {table} ORDER BY timestamp DESC, id DESC"
+)
+STANDINGS_QUERY = (
+    "SELECT usr_id, problem_id, verdict, timestamp FROM {table} "
+    "ORDER BY usr_id, problem_id, timestamp, id"
+)
+
+
+def _best_of(cursor, sql, runs):
+    best = None
+    for _ in range(runs):
+        begin = time.perf_counter()
+        cursor.execute(sql)
+        cursor.fetchall()
+        elapsed = time.perf_counter() - begin
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares compacted temporary copies of the submission table with the "
+        "source kept in blobs and with the source inline, as before."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+
+    def handle(self, *args, **options):
+        blobs = SourceBlob.objects.aggregate(
+            size=Sum("size"), stored=Sum(Length("data"))
+        )
+        submissions = Submission.objects.count()
+        self.stdout.write(
+            f"{submissions} submissions share {SourceBlob.objects.count()} blobs: "
+            f"{(blobs['size'] or 0) / 1024:.0f} KB of distinct source stored in "
+            f"{(blobs['stored'] or 0) / 1024:.0f} KB"
+        )
+
+        with connection.cursor() as cursor:
+            for table in (BLOB_TABLE, INLINE_TABLE):
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
+                cursor.execute(
+                    f"CREATE TEMPORARY TABLE {table} AS "
+                    "SELECT * FROM runtests_submission ORDER BY id"
+                )
+            cursor.execute(f"ALTER TABLE {INLINE_TABLE} ADD COLUMN code text")
+            for blob in SourceBlob.objects.iterator(chunk_size=500):
+                cursor.execute(
+                    f"UPDATE {INLINE_TABLE} SET code = %s WHERE source_id = %s",
+                    [blob.text, blob.id],
+                )
+            cursor.execute(f"ALTER TABLE {INLINE_TABLE} DROP COLUMN source_id")
+            # rewrite without the dead rows left by the updates
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE {INLINE_TABLE}_c AS "
+                f"SELECT * FROM {INLINE_TABLE} ORDER BY id"
+            )
+            cursor.execute(f"DROP TABLE {INLINE_TABLE}")
+            cursor.execute(f"ALTER TABLE {INLINE_TABLE}_c RENAME TO {INLINE_TABLE}")
+
+            for label, table in (("blobs", BLOB_TABLE), ("inline", INLINE_TABLE)):
+                cursor.execute(f"ANALYZE {table}")
+                cursor.execute(
+                    "SELECT pg_relation_size(%s), pg_total_relation_size(%s)",
+                    [table, table],
+                )
+                heap, total = cursor.fetchone()
+                list_time = _best_of(
+                    cursor, LIST_QUERY.format(table=table), options["runs"]
+                )
+                standings_time = _best_of(
+                    cursor, STANDINGS_QUERY.format(table=table), options["runs"]
+                )
+                self.stdout.write(
+                    f"{label:>6}: heap {heap / 1024:.0f} KB, "
+                    f"with TOAST {total / 1024:.0f} KB, "
+                    f"status scan {list_time * 1000:.1f} ms, "
+                    f"standings scan {standings_time * 1000:.1f} ms"
+                )
+                cursor.execute(f"DROP TABLE {table}")
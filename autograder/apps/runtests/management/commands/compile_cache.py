@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from .....coderunner import compile_cache
+
+
+class Command(BaseCommand):
+    help = "Reports compile cache hit and miss counts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Reset the hit and miss counters."
+        )
+
+    def handle(self, *args, **options):
+        stats = compile_cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = 100 * stats["hits"] / lookups if lookups else 0
+
+        self.stdout.write(f"Hits: {stats['hits']}")
+        self.stdout.write(f"Misses: {stats['misses']}")
+        self.stdout.write(f"Hit rate: {hit_rate:.1f}%")
+        self.stdout.write(
+            f"Entries: {stats['entries']} ({stats['size'] / 1024 / 1024:.1f} MB)"
+        )
+
+        if options["reset"]:
+            compile_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('runtests', '0011_alter_submission_verdict'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='memory',
+            field=models.IntegerField(default=-1),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('runtests', '0012_submission_memory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='queue_class',
+            field=models.CharField(choices=[('live', 'Live contest'), ('practice', 'Practice'), ('rejudge', 'Rejudge')], default='practice', max_length=10),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contests', '0003_contest_writers'),
+        ('problems', '0015_problem_streaming_interactor'),
+        ('runtests', '0013_submission_queue_class'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(condition=models.Q(('started_at', None), ('verdict', 'Waiting in Queue')), fields=['queue_class', 'usr', 'id'], name='submission_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['usr', 'started_at'], name='submission_usr_started_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:03
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # the submission table is large and must stay writable while these build
+    atomic = False
+
+    dependencies = [
+        ('contests', '0006_contest_freeze_minutes'),
+        ('problems', '0015_problem_streaming_interactor'),
+        ('runtests', '0014_submission_started_at_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='submission',
+            index=models.Index(fields=['timestamp', 'id'], name='submission_time_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='submission',
+            index=models.Index(fields=['contest', 'timestamp', 'id'], name='submission_contest_time_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='submission',
+            index=models.Index(fields=['usr', 'timestamp', 'id'], name='submission_usr_time_idx'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+import hashlib
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH = 2000
+
+
+def move_code_to_blobs(apps, schema_editor):
+    Submission = apps.get_model("runtests", "Submission")
+    SourceBlob = apps.get_model("runtests", "SourceBlob")
+
+    def flush(batch):
+        digests = {}
+        for _, code in batch:
+            raw = code.encode("utf-8")
+            digests.setdefault(hashlib.sha256(raw).hexdigest(), raw)
+        SourceBlob.objects.bulk_create(
+            [
+                SourceBlob(sha256=digest, data=zlib.compress(raw), size=len(raw))
+                for digest, raw in digests.items()
+            ],
+            ignore_conflicts=True,
+        )
+        blob_ids = dict(
+            SourceBlob.objects.filter(sha256__in=digests).values_list("sha256", "id")
+        )
+        subs = []
+        for sid, code in batch:
+            digest = hashlib.sha256(code.encode("utf-8")).hexdigest()
+            subs.append(Submission(id=sid, source_id=blob_ids[digest]))
+        Submission.objects.bulk_update(subs, ["source"])
+
+    batch = []
+    for row in Submission.objects.order_by("id").values_list("id", "code").iterator(
+        chunk_size=BATCH
+    ):
+        batch.append(row)
+        if len(batch) == BATCH:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+
+def move_code_back(apps, schema_editor):
+    Submission = apps.get_model("runtests", "Submission")
+    SourceBlob = apps.get_model("runtests", "SourceBlob")
+
+    for blob in SourceBlob.objects.iterator(chunk_size=BATCH):
+        code = zlib.decompress(blob.data).decode("utf-8")
+        Submission.objects.filter(source_id=blob.id).update(code=code)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('runtests', '0015_submission_status_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SourceBlob',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('data', models.BinaryField()),
+                ('size', models.IntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='source',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, to='runtests.sourceblob'),
+        ),
+        migrations.RunPython(move_code_to_blobs, move_code_back),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+# separate from 0016 so the schema change does not run in the transaction
+# that updated every submission row
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('runtests', '0016_sourceblob'),
+    ]
+
+    operations = [
+        # lets the column be added back empty when this is reversed
+        migrations.AlterField(
+            model_name='submission',
+            name='code',
+            field=models.TextField(default=''),
+        ),
+        migrations.RemoveField(
+            model_name='submission',
+            name='code',
+        ),
+    ]
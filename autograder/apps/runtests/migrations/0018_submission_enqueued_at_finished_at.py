@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:20
+
+import django.utils.timezone
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # the submission table is large and must stay writable while the index builds
+    atomic = False
+
+    dependencies = [
+        ('runtests', '0017_remove_submission_code'),
+    ]
+
+    operations = [
+        # added without a default first, so existing submissions are left
+        # unknown instead of all being stamped with the time of the migration
+        migrations.AddField(
+            model_name='submission',
+            name='enqueued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='enqueued_at',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, null=True),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        AddIndexConcurrently(
+            model_name='submission',
+            index=models.Index(fields=['finished_at'], name='submission_finished_idx'),
+        ),
+    ]
@@ -1,21 +1,129 @@
-from django.db import models
+import hashlib
+import zlib
+from django.db import IntegrityError, models, transaction
 from django.utils import timezone
 
 
+class SourceBlob(models.Model):
+    """
+    Compressed submission source, stored once per distinct text. Keeping it
+    out of the submission table keeps list and standings queries small.
+    """
+
+    id = models.AutoField(primary_key=True)
+    sha256 = models.CharField(max_length=64, unique=True)
+    data = models.BinaryField()
+    size = models.IntegerField()  # uncompressed, in bytes
+
+    def __str__(self):
+        return f"SourceBlob {self.sha256[:12]} ({self.size} bytes)"
+
+    @property
+    def text(self) -> str:
+        return zlib.decompress(self.data).decode("utf-8")
+
+    @classmethod
+    def store(cls, text: str) -> "SourceBlob":
+        raw = text.encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()
+        try:
+            return cls.objects.get(sha256=digest)
+        except cls.DoesNotExist:
+            pass
+        try:
+            with transaction.atomic():
+                return cls.objects.create(
+                    sha256=digest, data=zlib.compress(raw), size=len(raw)
+                )
+        except IntegrityError:
+            # stored by a concurrent submission of the same text
+            return cls.objects.get(sha256=digest)
+
+
 class Submission(models.Model):
+    LIVE = "live"
+    PRACTICE = "practice"
+    REJUDGE = "rejudge"
+    PENDING_VERDICT = "Waiting in Queue"
+    QUEUE_CLASSES = {
+        LIVE: "Live contest",
+        PRACTICE: "Practice",
+        REJUDGE: "Rejudge",
+    }
+
     id = models.AutoField(primary_key=True)
     language = models.CharField(max_length=10)
-    code = models.TextField()
+    # read and written through the code property
+    source = models.ForeignKey(SourceBlob, on_delete=models.PROTECT, null=True)
     usr = models.ForeignKey("index.GraderUser", on_delete=models.CASCADE)
-    verdict = models.TextField(default="Waiting in Queue")
+    verdict = models.TextField(default=PENDING_VERDICT)
     runtime = models.IntegerField(default=-1)
+    memory = models.IntegerField(default=-1)  # peak over all tests, in KB
     contest = models.ForeignKey("contests.Contest", on_delete=models.CASCADE)
     problem = models.ForeignKey("problems.Problem", on_delete=models.CASCADE)
     insight = models.TextField(null=True, blank=True)
     timestamp = models.DateTimeField(default=timezone.now, editable=True)
+    queue_class = models.CharField(
+        max_length=10, choices=QUEUE_CLASSES, default=PRACTICE
+    )
+    # when it was queued, taken by a worker and given its verdict
+    enqueued_at = models.DateTimeField(null=True, blank=True, default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         get_latest_by = "timestamp"
+        indexes = [
+            models.Index(
+                fields=["queue_class", "usr", "id"],
+                condition=models.Q(verdict="Waiting in Queue", started_at=None),
+                name="submission_pending_idx",
+            ),
+            models.Index(
+                fields=["usr", "started_at"], name="submission_usr_started_idx"
+            ),
+            # keyset pagination of the status pages, newest first
+            models.Index(fields=["timestamp", "id"], name="submission_time_idx"),
+            models.Index(
+                fields=["contest", "timestamp", "id"],
+                name="submission_contest_time_idx",
+            ),
+            models.Index(
+                fields=["usr", "timestamp", "id"], name="submission_usr_time_idx"
+            ),
+            # recent grading latency on the metrics dashboard
+            models.Index(fields=["finished_at"], name="submission_finished_idx"),
+        ]
 
     def __str__(self):
         return f"Submission #{self.id} by user {self.usr}"
+
+    @property
+    def code(self) -> str:
+        """
+        The source text. It is loaded from the blob on first access; select_related
+        "source" where it is needed to avoid the extra query.
+        """
+        if not hasattr(self, "_code"):
+            self._code = self.source.text if self.source_id is not None else ""
+        return self._code
+
+    @code.setter
+    def code(self, value: str):
+        self._code = value
+        self._code_changed = True
+
+    def save(self, *args, **kwargs):
+        code_changed = getattr(self, "_code_changed", False)
+        # a blob is never left behind by a submission that failed to save; an
+        # enclosing transaction already guarantees that, so no savepoint
+        with transaction.atomic(savepoint=False):
+            if code_changed:
+                self.source = SourceBlob.store(self._code)
+                update_fields = kwargs.get("update_fields")
+                if update_fields is not None and "code" in update_fields:
+                    kwargs["update_fields"] = [
+                        "source" if f == "code" else f for f in update_fields
+                    ]
+            super().save(*args, **kwargs)
+        self._code_changed = False
@@ -1,7 +1,9 @@
 from django.urls import re_path
 
 from . import consumers
+from ..contests.consumers import StandingsConsumer
 
 websocket_urlpatterns = [
     re_path(r"ws/submissions/", consumers.SubmissionStatusConsumer.as_asgi()),
+    re_path(r"ws/standings/(?P<cid>\d+)/$", StandingsConsumer.as_asgi()),
 ]
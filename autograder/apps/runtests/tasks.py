@@ -1,13 +1,30 @@
 import logging
 from typing import Dict, Any
+from asgiref.sync import async_to_sync
 from celery import shared_task
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
 
 from .models import Submission
-from ...coderunner.handlers import run_code_handler
+from .utils import QUEUE_POSITIONS_KEY, claim_next_submission, queue_positions
+from ...coderunner.metrics import StageTimer
 
 logger = logging.getLogger(__name__)
 
+QUEUES = {
+    Submission.LIVE: "coderunner_live",
+    Submission.PRACTICE: "coderunner_queue",
+    Submission.REJUDGE: "coderunner_rejudge",
+}
+
+QUEUE_UPDATE_PENDING_KEY = "queue_positions_pending"
+# queue positions are pushed at most this often (seconds)
+QUEUE_UPDATE_INTERVAL = 1
+
 
 @transaction.atomic
 def _update_submission_from_result(submission_id: int, result_data: Dict[str, Any]):
@@ -16,6 +33,7 @@ def _update_submission_from_result(submission_id: int, result_data: Dict[str, An
     submission.runtime = result_data.get("runtime", -1)
     submission.memory = result_data.get("memory", -1)
     submission.insight = result_data.get("output", "")
+    submission.finished_at = timezone.now()
     submission.save()
 
 
@@ -27,15 +45,17 @@ def _mark_submission_as_error(submission_id: int, error_message: str):
         submission.insight = error_message
         submission.runtime = -1
         submission.memory = -1
+        submission.finished_at = timezone.now()
         submission.save()
     except Submission.DoesNotExist:
         logger.error(f"Could not find submission {submission_id} to mark as an error.")
 
 
-@shared_task(bind=True, max_retries=3, default_retry_delay=60, queue="coderunner_queue")
-def grade_submission_task(self, submission_id: int):
+def _grade_submission(submission_id: int):
     try:
-        submission = Submission.objects.select_related("problem").get(id=submission_id)
+        submission = Submission.objects.select_related("problem", "source").get(
+            id=submission_id
+        )
         if submission.verdict == "Skipped":
             logger.info(
                 f"Submission {submission_id} is marked as 'Skipped'. Aborting task."
@@ -46,18 +66,102 @@ def grade_submission_task(self, submission_id: int):
         logger.error(f"Submission {submission_id} not found. Task will not be retried.")
         return
 
-    response = run_code_handler(
-        submission.problem.tl,
-        submission.problem.ml,
-        submission.language,
-        submission.problem.id,
-        submission.id,
-        submission.code,
+    timer = StageTimer(submission.language, submission.problem_id)
+    if submission.enqueued_at and submission.started_at:
+        timer.observe(
+            "queue_wait",
+            (submission.started_at - submission.enqueued_at).total_seconds(),
+        )
+
+    try:
+        with timer.span("total"):
+            response = import_string(settings.CODERUNNER_HANDLER)(
+                submission.problem.tl,
+                submission.problem.ml,
+                submission.language,
+                submission.problem.id,
+                submission.id,
+                submission.code,
+                timer,
+            )
+            with timer.span("db_update"):
+                if "error" in response:
+                    logger.exception(
+                        f"An error occurred while processing submission {submission.id}"
+                    )
+                    _mark_submission_as_error(submission_id, response["error"])
+                else:
+                    _update_submission_from_result(submission_id, response)
+    finally:
+        timer.flush()
+
+
+@shared_task(queue="coderunner_queue")
+def grade_next_submission(queue_class: str):
+    # A message on a coderunner queue is only a token for one grading slot;
+    # which submission it grades is decided by the fair-share claim
+    submission_id = claim_next_submission(queue_class)
+    if submission_id is None:
+        return
+    schedule_queue_update()
+    _grade_submission(submission_id)
+
+
+@shared_task(queue="coderunner_queue")
+def grade_submission_task(submission_id: int):
+    # kept for one release so messages queued before the fair-share scheduler
+    # are still handled; each of them now only stands for a grading slot
+    submission = Submission.objects.filter(
+        id=submission_id,
+        verdict=Submission.PENDING_VERDICT,
+        started_at__isnull=True,
+    ).first()
+    if submission is not None:
+        enqueue_submission(submission)
+
+
+def classify_submission(usr, contest, rejudge: bool = False) -> str:
+    if rejudge:
+        return Submission.REJUDGE
+    # staff test submissions during a contest are not contestants waiting on a verdict
+    if not usr.is_staff and contest.start <= timezone.now() < contest.end:
+        return Submission.LIVE
+    return Submission.PRACTICE
+
+
+def enqueue_submission(submission: Submission):
+    grade_next_submission.apply_async(
+        (submission.queue_class,), queue=QUEUES[submission.queue_class]
     )
-    if "error" in response:
-        logger.exception(
-            f"An error occurred while processing submission {submission.id}"
+    schedule_queue_update()
+
+
+@shared_task
+def broadcast_queue_positions():
+    # clear the flag first so a change during the broadcast schedules another
+    cache.delete(QUEUE_UPDATE_PENDING_KEY)
+    positions, depth = queue_positions()
+    cache.set(QUEUE_POSITIONS_KEY, (positions, depth), timeout=None)
+
+    channel_layer = get_channel_layer()
+    for submission_id, position in positions.items():
+        async_to_sync(channel_layer.group_send)(
+            f"submission_{submission_id}",
+            {
+                "type": "queue_position",
+                "submission_id": submission_id,
+                "position": position,
+                "depth": depth,
+            },
         )
-        _mark_submission_as_error(submission_id, response["error"])
-    else:
-        _update_submission_from_result(submission_id, response)
+
+
+def schedule_queue_update():
+    """Pushes fresh queue positions soon, collapsing bursts of queue changes."""
+    try:
+        if cache.add(
+            QUEUE_UPDATE_PENDING_KEY, True, timeout=QUEUE_UPDATE_INTERVAL * 10
+        ):
+            broadcast_queue_positions.apply_async(countdown=QUEUE_UPDATE_INTERVAL)
+    except Exception as e:
+        logger.warning(f"Failed to schedule a queue position update: {e}")
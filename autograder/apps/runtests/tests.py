@@ -0,0 +1,843 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from ...coderunner import compile_cache, verdict_cache
+from ...coderunner.cgroups import read_usage
+from ...coderunner.comparator import DEFAULT_CHECKER, compare_output
+from ...coderunner.handlers import _grade_tests
+from ...coderunner.interactive_checker import run_interactive_tests
+from ...coderunner.metrics import StageTimer, collect, quantile
+from ...coderunner.runner import run_code
+from ..contests.models import Contest
+from ..index.models import GraderUser
+from ..problems.models import Problem
+from .models import SourceBlob, Submission
+from .tasks import _grade_submission, classify_submission, grade_submission_task
+from .views import metrics_view, submit_post
+from .utils import (
+    THROTTLE_INTERVAL,
+    claim_next_submission,
+    keyset_page,
+    queue_depths,
+    queue_positions,
+    submission_interval,
+)
+
+
+class ComparatorTests(SimpleTestCase):
+    cases = [
+        ("1\n2\n3\n", "1\n2\n3\n"),
+        ("1\n2\n3\n", "  1\n\n2  \n3"),
+        ("1\n2\n3\n", "1\n5\n3\n"),
+        ("1 2\n", "1  2\n"),
+        ("1\n2\n", "1\n"),
+        ("1\n", ""),
+        ("1\n", "1\n2\n3\n4\n5\n6\n7\n8\n9\n10\n11\n12\n"),
+        ("a\n", "b" * 150 + "\n"),
+    ]
+
+    def _run_checker(self, tmp):
+        return subprocess.run(
+            [sys.executable, str(DEFAULT_CHECKER)],
+            cwd=tmp,
+            capture_output=True,
+            text=True,
+        ).stdout
+
+    def test_matches_default_checker(self):
+        test_input = "\n".join(["x" * 120] + [str(i) for i in range(12)]) + "\n"
+        for sol, out in self.cases:
+            with self.subTest(sol=sol, out=out), tempfile.TemporaryDirectory() as tmp:
+                tmp = Path(tmp)
+                (tmp / "sol.txt").write_text(sol)
+                (tmp / "output.txt").write_text(out)
+                (tmp / "test.txt").write_text(test_input)
+                self.assertEqual(
+                    compare_output(
+                        tmp / "sol.txt", tmp / "output.txt", tmp / "test.txt"
+                    ),
+                    self._run_checker(tmp),
+                )
+
+
+@override_settings(CODERUNNER_PARALLEL_SLOTS=6)
+@patch("autograder.coderunner.handlers.broadcast_status_update")
+class GradeTestsTests(SimpleTestCase):
+    # the result of each test's run; test 2 only fails once tests 1 and 3 have
+    # been checked and test 4 has failed, and tests 5 and 6 run until cancelled
+    outcomes = {
+        "1": ("", "", 100, 1000),
+        "2": ("Time Limit Exceeded", "", 2000, 2000),
+        "3": ("", "", 300, 3000),
+        "4": ("Runtime Error", "exit code 1", 4000, 4000),
+        "5": ("", "", 5000, 5000),
+        "6": ("", "", 6000, 6000),
+    }
+
+    def _run_code(self, subdir, entry, *args, cancel_event=None, **kwargs):
+        if entry.stem == "2":
+            self.checked.wait(5)
+            time.sleep(0.05)
+        elif entry.stem in ("5", "6") and not cancel_event.wait(5):
+            self.ran_on.append(entry.stem)
+        return self.outcomes[entry.stem]
+
+    def _compare_output(self, *args):
+        with self.lock:
+            self.checks.append(args[2].stem)
+            if len(self.checks) == 2:
+                self.checked.set()
+        return "AC"
+
+    def test_lowest_failure_wins(self, broadcast):
+        self.ran_on, self.checks = [], []
+        self.checked, self.lock = threading.Event(), threading.Lock()
+        with (
+            tempfile.TemporaryDirectory() as tmp,
+            patch("autograder.coderunner.handlers.run_code", self._run_code),
+            patch(
+                "autograder.coderunner.handlers.compare_output", self._compare_output
+            ),
+        ):
+            entries = [Path(tmp) / "test" / f"{i}.txt" for i in range(1, 7)]
+            # test 4 fails first, then test 2 fails and takes over the verdict
+            verdict, insight, runtime, memory = _grade_tests(
+                1,
+                Path(tmp),
+                entries,
+                "python",
+                Path(tmp) / "usercode.py",
+                "usercode.py",
+                1000,
+                256,
+                1,
+                None,
+                StageTimer("python", 1),
+            )
+
+        self.assertEqual(verdict, "Time Limit Exceeded on test 2")
+        # tests after the failure are not reported, even those that finished
+        self.assertEqual((runtime, memory), (2000, 2000))
+        # cancelled before or while they ran
+        self.assertEqual(self.ran_on, [])
+        self.assertEqual(sorted(self.checks), ["1", "3"])
+
+
+class CompileCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(
+            override_settings(
+                CACHES={
+                    "default": {
+                        "BACKEND": "django.core.cache.backends.locmem.LocMemCache"
+                    }
+                },
+                CODERUNNER_COMPILE_CACHE_DIR=str(self.tmp / "cache"),
+                CODERUNNER_COMPILE_CACHE_MAX_MB=1,
+            )
+        )
+        cache.clear()
+
+    def _store(self, key, **files):
+        build = self.tmp / "build" / key
+        build.mkdir(parents=True)
+        for name, size in files.items():
+            (build / name).write_bytes(b"x" * size)
+        compile_cache.store(key, list(build.iterdir()))
+
+    def _fetch(self, key):
+        dest = self.tmp / "dest" / key
+        dest.mkdir(parents=True, exist_ok=True)
+        return compile_cache.fetch(key, dest), sorted(p.name for p in dest.iterdir())
+
+    def test_key(self):
+        key = compile_cache.cache_key("cpp", "int main() {}")
+        self.assertEqual(key, compile_cache.cache_key("cpp", "int main() {}"))
+        self.assertNotEqual(key, compile_cache.cache_key("cpp", "int main() { }"))
+        self.assertNotEqual(key, compile_cache.cache_key("java", "int main() {}"))
+        with patch.dict(compile_cache.COMPILE_FLAGS, cpp=["/usr/bin/g++", "-O0"]):
+            self.assertNotEqual(key, compile_cache.cache_key("cpp", "int main() {}"))
+
+    def test_hit_and_miss(self):
+        self.assertEqual(self._fetch("a"), (False, []))
+        self._store("a", **{"Main.class": 10, "Main$1.class": 20})
+        self.assertEqual(self._fetch("a"), (True, ["Main$1.class", "Main.class"]))
+
+        # an entry that lost a file to a concurrent eviction is a miss
+        (self.tmp / "cache" / "a" / "Main$1.class").unlink()
+        self.assertEqual(self._fetch("a")[0], False)
+        self.assertEqual(compile_cache.stats()["hits"], 1)
+        self.assertEqual(compile_cache.stats()["misses"], 2)
+
+    def test_evicts_least_recently_used(self):
+        with patch.object(compile_cache, "evict", wraps=compile_cache.evict) as evict:
+            for i, key in enumerate(["a", "b"], start=1):
+                self._store(key, usercode=400 * 1024)
+                os.utime(self.tmp / "cache" / key, (i, i))
+            # the size is only scanned to start the running total
+            self.assertEqual(evict.call_count, 1)
+
+            # a hit makes "a" the most recently used, so "b" goes first
+            self.assertTrue(self._fetch("a")[0])
+            self._store("c", usercode=400 * 1024)
+            self.assertEqual(evict.call_count, 2)
+        self.assertEqual(sorted(os.listdir(self.tmp / "cache")), ["a", "c"])
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    CODERUNNER_BUILTIN_CHECKER=True,
+)
+class VerdictCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.problem = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        for dirname in ("test", "sol"):
+            (self.problem / dirname).mkdir()
+            (self.problem / dirname / "1").write_text("1\n")
+        (self.problem / "default_checker.py").write_text("print('AC')\n")
+        cache.clear()
+
+    def _key(self):
+        return verdict_cache.cache_key(self.problem, "python", "print(1)", 1000, 256)
+
+    def test_key_changes_with_problem(self):
+        key = self._key()
+        self.assertEqual(key, self._key())
+
+        # what add_tests_to_coderunner does after writing new tests
+        (self.problem / "sol" / "1").write_text("2\n")
+        verdict_cache.write_fingerprint(self.problem)
+        self.assertNotEqual(key, self._key())
+        key = self._key()
+
+        (self.problem / "default_checker.py").write_text("print('WA')\n")
+        self.assertNotEqual(key, self._key())
+        key = self._key()
+
+        with self.settings(CODERUNNER_BUILTIN_CHECKER=False):
+            self.assertNotEqual(key, self._key())
+
+    def test_stores_deterministic_verdicts_only(self):
+        for verdict, stored in (
+            ("Accepted", True),
+            ("Wrong Answer on test 3", True),
+            ("Compilation Error", True),
+            ("Time Limit Exceeded on test 3", False),
+            ("Memory Limit Exceeded on test 3", False),
+            ("Runtime Error", False),
+            ("Grader Error", False),
+        ):
+            with self.subTest(verdict=verdict):
+                key = verdict_cache.cache_key(
+                    self.problem, "python", verdict, 1000, 256
+                )
+                verdict_cache.store(key, {"verdict": verdict, "runtime": 5})
+                self.assertEqual(verdict_cache.lookup(key) is not None, stored)
+
+    def test_failed_upload_drops_fingerprint(self):
+        key = self._key()
+        # add_tests_to_coderunner clears it before rewriting the tests
+        verdict_cache.clear_fingerprint(self.problem)
+        (self.problem / "sol" / "1").write_text("2\n")
+        self.assertNotEqual(key, self._key())
+
+
+class CgroupUsageTests(SimpleTestCase):
+    def test_read_usage(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cgroup = Path(tmp)
+            # nothing is accounted, e.g. the controllers are not enabled
+            self.assertEqual(read_usage(cgroup), (None, None, False))
+
+            (cgroup / "cpu.stat").write_text("usage_usec 1500000\nuser_usec 1\n")
+            self.assertEqual(read_usage(cgroup), (1500, None, False))
+
+            (cgroup / "memory.peak").write_text("2097152\n")
+            (cgroup / "memory.events").write_text("oom 1\noom_kill 1\n")
+            self.assertEqual(read_usage(cgroup), (1500, 2048, True))
+
+            # an unreadable file only loses its own value
+            (cgroup / "memory.peak").write_text("max\n")
+            self.assertEqual(read_usage(cgroup), (1500, None, True))
+
+
+@override_settings(CODERUNNER_CGROUP_ROOT="")
+class RunCodeVerdictTests(SimpleTestCase):
+    """The verdict run_code gives for how the jailed program ended."""
+
+    kill = "import os, signal; os.kill(os.getpid(), signal.SIGKILL)"
+    memory_error = (
+        "import sys; sys.stderr.write('Traceback (most recent call last):\\n"
+        "  File main.py, line 1\\nMemoryError\\n'); sys.exit(1)"
+    )
+
+    def _run(self, script, lang="python", usage=None, tl=1000):
+        with tempfile.TemporaryDirectory() as tmp:
+            with (
+                patch(
+                    "autograder.coderunner.runner.jail_command",
+                    lambda *args: [sys.executable, "-c", script],
+                ),
+                patch(
+                    "autograder.coderunner.runner.create_run_cgroup",
+                    return_value=Path(tmp) if usage else None,
+                ),
+                patch("autograder.coderunner.runner.read_usage", return_value=usage),
+                patch("autograder.coderunner.runner.remove_run_cgroup"),
+            ):
+                verdict, *_ = run_code(
+                    Path(tmp),
+                    None,
+                    lang,
+                    Path(tmp) / "usercode",
+                    "usercode",
+                    tl,
+                    256,
+                    False,
+                    None,
+                    None,
+                )
+        return verdict
+
+    def test_sigkill(self):
+        # without cgroup accounting an unexplained SIGKILL is the OOM killer's
+        self.assertEqual(self._run(self.kill), "Memory Limit Exceeded")
+        # with it, only the OOM kill count or the peak memory say so
+        self.assertEqual(self._run(self.kill, usage=(10, 1000, False)), "Runtime Error")
+        self.assertEqual(
+            self._run(self.kill, usage=(10, 1000, True)), "Memory Limit Exceeded"
+        )
+        self.assertEqual(
+            self._run(self.kill, usage=(10, 256 * 1024, False)),
+            "Memory Limit Exceeded",
+        )
+
+    def test_wall_clock(self):
+        # killed by the watchdog, not mistaken for running out of memory
+        self.assertEqual(
+            self._run("import time; time.sleep(10)", tl=10), "Time Limit Exceeded"
+        )
+
+    def test_memory_error(self):
+        self.assertEqual(self._run(self.memory_error), "Memory Limit Exceeded")
+        self.assertEqual(self._run(self.memory_error, lang="cpp"), "Runtime Error")
+        self.assertEqual(
+            self._run(
+                "import sys; sys.stderr.write('MemoryError\\nValueError\\n'); "
+                "sys.exit(1)"
+            ),
+            "Runtime Error",
+        )
+
+
+@override_settings(CODERUNNER_CGROUP_ROOT="")
+class InteractiveEngineTests(SimpleTestCase):
+    """Interactive tests with jail_command patched to run plain Python."""
+
+    # guesses the secret number between 1 and n with binary search
+    search = """
+import sys
+n = int(input())
+lo, hi = 1, n
+while lo < hi:
+    mid = (lo + hi) // 2
+    print(f"? {mid}", flush=True)
+    if input() == "<":
+        hi = mid
+    else:
+        lo = mid + 1
+print(f"! {lo}", flush=True)
+"""
+    per_query = """
+import sys
+n, secret, line = sys.stdin.read().split("\\n")[:3]
+kind, value = line.split()
+if kind == "?":
+    print("<" if int(secret) <= int(value) else ">")
+else:
+    print("AC" if value == secret else "WA")
+"""
+    streaming = """
+n, secret = input(), input()
+while True:
+    kind, value = input().split()
+    if kind == "!":
+        print("AC" if value == secret else "WA")
+        break
+    print("<" if int(secret) <= int(value) else ">", flush=True)
+"""
+
+    def _run(
+        self,
+        user,
+        interactor=per_query,
+        streaming=False,
+        tl=1000,
+        lang="python",
+        **kwargs,
+    ):
+        with tempfile.TemporaryDirectory() as tmp:
+            problem = Path(tmp) / "problem"
+            (problem / "test").mkdir(parents=True)
+            (problem / "answer").mkdir()
+            (problem / "interactor.py").write_text(interactor)
+            entries = []
+            for name, secret in (("1.txt", "7"), ("2.txt", "1")):
+                (problem / "test" / name).write_text("10\n")
+                (problem / "answer" / name.replace(".", "_answer.")).write_text(secret)
+                entries.append(problem / "test" / name)
+
+            def jail_command(lang, checker, tl, ml, mounts, argv, cgroup=None):
+                if argv[-1] == "/subcode/interactor.py":
+                    return [sys.executable, mounts[0][0]]
+                return [sys.executable, "-c", user]
+
+            with patch(
+                "autograder.coderunner.interactive_checker.jail_command", jail_command
+            ):
+                return run_interactive_tests(
+                    Path(tmp) / "sub",
+                    entries,
+                    lang,
+                    Path(tmp) / "main.py",
+                    "main.py",
+                    problem,
+                    tl,
+                    256,
+                    2,
+                    streaming,
+                    **kwargs,
+                )
+
+    def test_per_query(self):
+        results = self._run(self.search)
+        self.assertEqual([r[0] for r in results], ["Accepted", "Accepted"])
+
+    def test_streaming(self):
+        results = self._run(self.search, self.streaming, streaming=True)
+        self.assertEqual([r[0] for r in results], ["Accepted", "Accepted"])
+
+    def test_wrong_answer(self):
+        for interactor, streaming in ((self.per_query, False), (self.streaming, True)):
+            results = self._run(
+                "input(); print('! 7', flush=True)", interactor, streaming
+            )
+            self.assertEqual(results[0][0], "Accepted")
+            self.assertEqual(results[1][0], "Wrong Answer")
+
+    def test_time_limit(self):
+        results = self._run("import time; time.sleep(10)", tl=10)
+        self.assertEqual(results[0][:3], ("Time Limit Exceeded", "", 10))
+        # the second test runs alongside and may time out before it is cancelled
+        self.assertIn(results[1][0], ("Time Limit Exceeded", "Cancelled"))
+
+    def test_memory_error(self):
+        script = (
+            "import sys; input(); sys.stderr.write('Traceback (most recent call "
+            "last):\\nMemoryError\\n'); sys.exit(1)"
+        )
+        self.assertEqual(self._run(script)[0][0], "Memory Limit Exceeded")
+        # only a Python traceback ending in it says so
+        self.assertEqual(self._run(script, lang="cpp")[0][0], "Runtime Error")
+        printed = "import sys; input(); print('MemoryError', file=sys.stderr); 1/0"
+        self.assertEqual(self._run(printed)[0][0], "Runtime Error")
+
+    def test_cleanup_on_error(self):
+        # a failure inside the loop still reaps the running tests
+        # and removes their cgroups
+        started = []
+
+        def on_start(session):
+            if started:
+                raise RuntimeError("boom")
+            started.append(session)
+
+        with (
+            patch(
+                "autograder.coderunner.interactive_checker.create_run_cgroup",
+                return_value=Path("/sys/fs/cgroup/test"),
+            ),
+            patch("autograder.coderunner.interactive_checker.read_usage"),
+            patch(
+                "autograder.coderunner.interactive_checker.remove_run_cgroup"
+            ) as remove,
+            self.assertRaises(RuntimeError),
+        ):
+            self._run("import time; time.sleep(10)", on_start=on_start)
+        self.assertIsNotNone(started[0].user.returncode)
+        remove.assert_called_once_with(Path("/sys/fs/cgroup/test"))
+
+
+class QueueClassTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        with patch("autograder.apps.index.signals.schedule_codeforces_refresh"):
+            self.user = GraderUser.objects.create_user(email="a@a.com", username="a")
+            self.staff = GraderUser.objects.create_user(
+                email="b@b.com", username="b", is_staff=True
+            )
+        self.running = Contest.objects.create(
+            name="Running",
+            season=1,
+            start=now - timedelta(hours=1),
+            end=now + timedelta(hours=1),
+        )
+        self.ended = Contest.objects.create(
+            name="Ended",
+            season=1,
+            start=now - timedelta(hours=2),
+            end=now - timedelta(hours=1),
+        )
+
+    def test_classify(self):
+        self.assertEqual(classify_submission(self.user, self.running), Submission.LIVE)
+        self.assertEqual(
+            classify_submission(self.user, self.ended), Submission.PRACTICE
+        )
+        self.assertEqual(
+            classify_submission(self.staff, self.running), Submission.PRACTICE
+        )
+        self.assertEqual(
+            classify_submission(self.user, self.running, rejudge=True),
+            Submission.REJUDGE,
+        )
+
+
+class FairShareTests(TestCase):
+    def setUp(self):
+        with patch("autograder.apps.index.signals.schedule_codeforces_refresh"):
+            self.users = [
+                GraderUser.objects.create_user(email=f"{i}@a.com", username=f"u{i}")
+                for i in range(3)
+            ]
+        now = timezone.now()
+        contest = Contest.objects.create(
+            name="Practice", season=1, start=now, end=now + timedelta(hours=1)
+        )
+        self.problem = Problem.objects.create(
+            name="P",
+            contest=contest,
+            points=100,
+            statement="",
+            inputtxt="",
+            outputtxt="",
+            samples="",
+        )
+
+    def _submit(self, usr, queue_class=Submission.PRACTICE):
+        return Submission.objects.create(
+            usr=usr,
+            code="",
+            language="python",
+            problem=self.problem,
+            contest=self.problem.contest,
+            queue_class=queue_class,
+        ).id
+
+    def _drain(self):
+        order = []
+        while (submission_id := claim_next_submission(Submission.PRACTICE)) is not None:
+            order.append(submission_id)
+        return order
+
+    def test_burst_does_not_delay_other_users(self):
+        burst = [self._submit(self.users[0]) for _ in range(50)]
+        others = [self._submit(usr) for usr in self.users[1:]]
+
+        order = self._drain()
+        self.assertCountEqual(order, burst + others)
+        # each of them waits for at most one submission per user with pending work
+        for submission_id in others:
+            self.assertLess(order.index(submission_id), len(self.users))
+
+    def test_round_robin(self):
+        subs = {usr.id: [self._submit(usr) for _ in range(3)] for usr in self.users}
+        order = self._drain()
+        owners = list(Submission.objects.filter(id__in=order).values_list("id", "usr"))
+        owner = dict(owners)
+        self.assertEqual(
+            [owner[submission_id] for submission_id in order],
+            [usr.id for usr in self.users] * 3,
+        )
+        self.assertCountEqual(order, sum(subs.values(), []))
+
+    def test_claimed_submission_is_skipped(self):
+        first = self._submit(self.users[0])
+        second = self._submit(self.users[1])
+        Submission.objects.filter(id=first).update(started_at=timezone.now())
+        self.assertEqual(claim_next_submission(Submission.PRACTICE), second)
+        self.assertIsNone(claim_next_submission(Submission.PRACTICE))
+
+    @patch("autograder.apps.runtests.tasks.grade_next_submission.apply_async")
+    def test_old_task_enqueues_a_token(self, apply_async):
+        pending = self._submit(self.users[0], Submission.LIVE)
+        started = self._submit(self.users[1])
+        Submission.objects.filter(id=started).update(started_at=timezone.now())
+
+        grade_submission_task(pending)
+        grade_submission_task(started)
+        apply_async.assert_called_once_with((Submission.LIVE,), queue="coderunner_live")
+
+    def test_queue_positions(self):
+        practice = [self._submit(self.users[0]) for _ in range(2)]
+        practice.append(self._submit(self.users[1]))
+        rejudge = self._submit(self.users[2], Submission.REJUDGE)
+        live = self._submit(self.users[2], Submission.LIVE)
+
+        positions, depth = queue_positions()
+        self.assertEqual(depth, 5)
+        self.assertEqual(positions[live], 1)
+        self.assertEqual(
+            [positions[submission_id] for submission_id in practice], [2, 4, 3]
+        )
+        self.assertEqual(positions[rejudge], 5)
+        self.assertEqual(
+            queue_depths(),
+            {Submission.LIVE: 1, Submission.PRACTICE: 3, Submission.REJUDGE: 1},
+        )
+
+    @override_settings(CODERUNNER_BACKLOG_THRESHOLD=4, DEBUG=False)
+    def test_backlog_throttles_practice(self):
+        usr = self.users[0]
+        for _ in range(4):
+            self._submit(usr)
+        self.assertEqual(
+            submission_interval(usr, Submission.PRACTICE), THROTTLE_INTERVAL
+        )
+
+        for _ in range(4):
+            self._submit(usr)
+        self.assertEqual(
+            submission_interval(usr, Submission.PRACTICE), THROTTLE_INTERVAL * 2
+        )
+        self.assertEqual(submission_interval(usr, Submission.LIVE), THROTTLE_INTERVAL)
+
+    @override_settings(CODERUNNER_BACKLOG_THRESHOLD=4, DEBUG=False)
+    def test_retry_after_is_remaining_wait(self):
+        usr = self.users[0]
+        for _ in range(8):
+            self._submit(usr)
+        Submission.objects.filter(usr=usr).update(
+            timestamp=timezone.now() - timedelta(seconds=10)
+        )
+        # submissions to a contest that has ended are practice
+        Contest.objects.update(end=timezone.now())
+
+        request = RequestFactory().post(
+            "/submit", {"problemid": self.problem.id, "lang": "python", "code": "1"}
+        )
+        request.user = usr
+        response = submit_post(request)
+        self.assertEqual(response.status_code, 429)
+        # the interval is doubled to 60 seconds, 10 of which have passed
+        self.assertEqual(response["Retry-After"], "50")
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        with patch("autograder.apps.index.signals.schedule_codeforces_refresh"):
+            usr = GraderUser.objects.create_user(email="a@a.com", username="a")
+        now = timezone.now()
+        contest = Contest.objects.create(
+            name="Practice", season=1, start=now, end=now + timedelta(hours=1)
+        )
+        problem = Problem.objects.create(
+            name="P",
+            contest=contest,
+            points=100,
+            statement="",
+            inputtxt="",
+            outputtxt="",
+            samples="",
+        )
+        # pairs of submissions share a timestamp, so ties are broken by id
+        self.ids = [
+            Submission.objects.create(
+                usr=usr,
+                code="print()",
+                language="python",
+                problem=problem,
+                contest=contest,
+                timestamp=now + timedelta(seconds=i // 2),
+            ).id
+            for i in range(30)
+        ]
+
+    def test_walk_forward_and_back(self):
+        pages = [keyset_page(Submission.objects.all(), 1, per_page=7)]
+        while pages[-1].has_next():
+            after = pages[-1].next_query.removeprefix("?after=")
+            pages.append(
+                keyset_page(
+                    Submission.objects.all(), len(pages) + 1, after=after, per_page=7
+                )
+            )
+
+        newest_first = sorted(self.ids, reverse=True)
+        self.assertEqual(
+            [s.id for page in pages for s in page.object_list], newest_first
+        )
+        self.assertEqual([p.num_pages for p in pages], [5] * 5)
+        self.assertNotIn("source_id", pages[0].object_list[0].__dict__)
+
+        before = pages[3].previous_query.removeprefix("?before=")
+        back = keyset_page(Submission.objects.all(), 3, before=before, per_page=7)
+        self.assertEqual(
+            [s.id for s in back.object_list], [s.id for s in pages[2].object_list]
+        )
+        # page 1 is linked without a cursor
+        self.assertEqual(pages[1].previous_query, "")
+
+    # django_user_agents holds on to the cache configured when it was imported
+    @patch("django_user_agents.utils.cache", None)
+    def test_bad_cursor(self):
+        self.client.force_login(GraderUser.objects.get(username="a"))
+        # the last one is past the largest datetime
+        for cursor in ("x", "1_x", "99999999999999999999_1"):
+            response = self.client.get(f"/status/2/?after={cursor}")
+            self.assertRedirects(response, "/status/1/", fetch_redirect_response=False)
+
+    @patch("django_user_agents.utils.cache", None)
+    def test_unmeasured_memory(self):
+        Submission.objects.filter(id=self.ids[-1]).update(memory=512)
+        self.client.force_login(GraderUser.objects.get(username="a"))
+        response = self.client.get("/status/1/")
+        self.assertContains(response, "512KB")
+        # without a cgroup the memory is -1, which is shown as unknown
+        self.assertNotContains(response, "-1KB")
+
+    def test_source_is_stored_once(self):
+        sub = Submission.objects.get(id=self.ids[0])
+        self.assertEqual(sub.code, "print()")
+        self.assertEqual(SourceBlob.objects.count(), 1)
+
+        sub.code = "print(1)"
+        sub.save(update_fields=["code"])
+        self.assertEqual(Submission.objects.get(id=sub.id).code, "print(1)")
+        self.assertEqual(Submission.objects.get(id=self.ids[1]).source.text, "print()")
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    METRICS_TOKEN="secret",
+)
+class GradingMetricsTests(TestCase):
+    def test_histograms(self):
+        now = timezone.now()
+        contest = Contest.objects.create(
+            name="Contest", season=1, start=now, end=now + timedelta(hours=1)
+        )
+        Problem.objects.create(
+            id=12,
+            name="A",
+            contest=contest,
+            points=100,
+            statement="",
+            inputtxt="",
+            outputtxt="",
+            samples="",
+        )
+        for seconds in (0.003, 0.2, 0.2, 7):
+            timer = StageTimer("cpp", 12)
+            timer.observe("run", seconds)
+            timer.flush()
+
+        by_language, by_problem = collect([12, 13])
+        buckets, total = by_language[("cpp", "run")]
+        self.assertEqual(sum(buckets), 4)
+        self.assertAlmostEqual(total, 7.403)
+        self.assertEqual(list(by_problem), [(12, "run")])
+        # interpolated within the 0.1-0.25s bucket, as histogram_quantile does
+        self.assertAlmostEqual(quantile(buckets, 0.5), 0.175)
+
+        request = RequestFactory().get("/status/metrics/")
+        request.user = AnonymousUser()
+        self.assertEqual(metrics_view(request).status_code, 403)
+        request = RequestFactory().get(
+            "/status/metrics/", HTTP_AUTHORIZATION="Bearer secret"
+        )
+        request.user = AnonymousUser()
+        body = metrics_view(request).content.decode()
+        self.assertIn(
+            'autograder_grading_stage_seconds_bucket{language="cpp",stage="run",'
+            'le="0.25"} 3',
+            body,
+        )
+        self.assertIn(
+            'autograder_problem_grading_stage_seconds_count{problem="12",stage="run"} 4',
+            body,
+        )
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+    CODERUNNER_HANDLER="autograder.coderunner.fake_runner.run_code_handler",
+)
+class FakeRunnerTests(TestCase):
+    def test_verdict_from_directive(self):
+        now = timezone.now()
+        with patch("autograder.apps.index.signals.schedule_codeforces_refresh"):
+            user = GraderUser.objects.create_user(email="a@a.com", username="a")
+        contest = Contest.objects.create(
+            name="Contest", season=1, start=now, end=now + timedelta(hours=1)
+        )
+        problem = Problem.objects.create(
+            id=1,
+            name="A",
+            contest=contest,
+            points=100,
+            tl=1000,
+            statement="",
+            inputtxt="",
+            outputtxt="",
+            samples="",
+        )
+        submission = Submission.objects.create(
+            usr=user,
+            contest=contest,
+            problem=problem,
+            language="python",
+            code="# FAKE_VERDICT: Wrong Answer on test 3\n# FAKE_SECONDS: 0\n",
+            started_at=now,
+        )
+
+        _grade_submission(submission.id)
+
+        submission.refresh_from_db()
+        self.assertEqual(submission.verdict, "Wrong Answer on test 3")
+        self.assertIsNotNone(submission.finished_at)
+
+    def test_bench_coderunner(self):
+        # a smoke test of the benchmark, grading one example with the fake runner
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline = Path(tmp) / "baseline.json"
+            with override_settings(MEDIA_ROOT=tmp):
+                call_command(
+                    "bench_coderunner",
+                    runs=1,
+                    languages=["python"],
+                    baseline=str(baseline),
+                    save_baseline=True,
+                    stdout=StringIO(),
+                )
+            report = json.loads(baseline.read_text())
+        self.assertEqual(report["runs"], 1)
+        self.assertEqual(list(report["languages"]), ["python"])
+        self.assertGreater(report["languages"]["python"]["total"], 0)
+        self.assertFalse(Problem.objects.filter(name="Coderunner benchmark").exists())
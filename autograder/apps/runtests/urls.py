@@ -34,4 +34,6 @@ urlpatterns = [
     ),
     path("submission/<int:id>/", views.submission_view, name="submission"),
     path("process_submit/", views.submit_post, name="submit_post"),
+    path("metrics/", views.metrics_view, name="metrics"),
+    path("metrics/dashboard/", views.metrics_dashboard_view, name="metrics_dashboard"),
 ]
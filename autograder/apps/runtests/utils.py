@@ -0,0 +1,267 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, List, Optional, Set, Tuple
+from django.conf import settings
+from django.db.models import Count, F, OuterRef, Q, Subquery, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from .models import Submission
+import logging
+
+logger = logging.getLogger(__name__)
+
+# how many submissions to try claiming per query when other workers race us
+CLAIM_BATCH = 8
+
+# the order in which workers drain the queue classes
+PRIORITY = [Submission.LIVE, Submission.PRACTICE, Submission.REJUDGE]
+
+THROTTLE_INTERVAL = timedelta(seconds=30)
+
+# what non-staff see instead of the verdict of a submission made during a freeze
+FROZEN_VERDICT = "Pending"
+
+# the latest (positions, depth) from queue_positions, kept by broadcast_queue_positions
+QUEUE_POSITIONS_KEY = "queue_positions"
+
+
+def pending_submissions(queue_class: str):
+    return Submission.objects.filter(
+        queue_class=queue_class,
+        verdict=Submission.PENDING_VERDICT,
+        started_at__isnull=True,
+    )
+
+
+def _in_claim_order(queryset):
+    last_served = (
+        Submission.objects.filter(usr=OuterRef("usr"), started_at__isnull=False)
+        .order_by("-started_at")
+        .values("started_at")[:1]
+    )
+    return queryset.annotate(
+        user_rank=Window(RowNumber(), partition_by=[F("usr")], order_by=F("id").asc()),
+        last_served=Subquery(last_served),
+    ).order_by("user_rank", F("last_served").asc(nulls_first=True), "id")
+
+
+def claim_next_submission(queue_class: str) -> Optional[int]:
+    """
+    Claims the next pending submission of a queue class, round-robin over
+    users: every user's oldest pending submission goes before anyone's
+    second one, and among those the user who was served least recently goes
+    first. A burst from one user therefore only delays another user's
+    submission by at most one submission per user with pending work.
+    """
+    while True:
+        candidates = list(
+            _in_claim_order(pending_submissions(queue_class)).values_list(
+                "id", flat=True
+            )[:CLAIM_BATCH]
+        )
+        if not candidates:
+            return None
+
+        for submission_id in candidates:
+            # another worker may have claimed it since the query above
+            claimed = (
+                pending_submissions(queue_class)
+                .filter(id=submission_id)
+                .update(started_at=timezone.now())
+            )
+            if claimed:
+                return submission_id
+
+
+def queue_depths() -> Dict[str, int]:
+    depths = dict.fromkeys(PRIORITY, 0)
+    depths.update(
+        Submission.objects.filter(
+            verdict=Submission.PENDING_VERDICT, started_at__isnull=True
+        )
+        .values_list("queue_class")
+        .annotate(Count("id"))
+    )
+    return depths
+
+
+def queue_positions() -> Tuple[Dict[int, int], int]:
+    """
+    Returns the 1-based position of every pending submission, in the order it
+    will be claimed, and the total number of pending submissions. Positions in
+    a class count every pending submission of the classes drained before it.
+    """
+    positions = {}
+    ahead = 0
+    for queue_class in PRIORITY:
+        ids = _in_claim_order(pending_submissions(queue_class)).values_list(
+            "id", flat=True
+        )
+        for position, submission_id in enumerate(ids, start=ahead + 1):
+            positions[submission_id] = position
+        ahead = len(positions)
+    return positions, ahead
+
+
+def submission_interval(usr, queue_class: str) -> timedelta:
+    """
+    The minimum time between two submissions of a user. Staff are normally
+    exempt, but practice submissions from anyone are spaced out further the
+    more the backlog exceeds CODERUNNER_BACKLOG_THRESHOLD, which keeps
+    capacity for live contests during end-of-contest surges.
+    """
+    interval = timedelta(0) if usr.is_staff or settings.DEBUG else THROTTLE_INTERVAL
+
+    threshold = settings.CODERUNNER_BACKLOG_THRESHOLD
+    if queue_class != Submission.PRACTICE or threshold <= 0:
+        return interval
+
+    backlog = sum(queue_depths().values())
+    if backlog <= threshold:
+        return interval
+
+    throttle = min(
+        THROTTLE_INTERVAL * backlog / threshold,
+        timedelta(seconds=settings.CODERUNNER_BACKLOG_MAX_INTERVAL),
+    )
+    return max(interval, throttle)
+
+
+# columns the status pages show; code and insight are never loaded for them
+STATUS_FIELDS = (
+    "id",
+    "language",
+    "runtime",
+    "memory",
+    "verdict",
+    "timestamp",
+    "contest__id",
+    "contest__end",
+    "contest__freeze_minutes",
+    "usr__id",
+    "usr__display_name",
+    "problem__id",
+    "problem__name",
+)
+
+# status pages count matching submissions up to this many, and past it
+# only say that there are more
+STATUS_COUNT_LIMIT = 1000
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def encode_cursor(submission) -> str:
+    micros = (submission.timestamp - _EPOCH) // timedelta(microseconds=1)
+    return f"{micros}_{submission.id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    micros, sid = cursor.split("_")
+    try:
+        timestamp = _EPOCH + timedelta(microseconds=int(micros))
+    except OverflowError as e:
+        # callers treat every malformed cursor as a ValueError
+        raise ValueError(f"Cursor out of range: {cursor}") from e
+    return timestamp, int(sid)
+
+
+class KeysetPage:
+    """The parts of a Paginator page the status templates use."""
+
+    def __init__(
+        self,
+        object_list: List[Submission],
+        number: int,
+        num_pages: Optional[int],
+        has_next: bool,
+        next_query: str,
+        previous_query: str,
+    ):
+        self.object_list = object_list
+        self.number = number
+        self.num_pages = num_pages
+        self._has_next = has_next
+        self.next_query = next_query
+        self.previous_query = previous_query
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self.number > 1
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+def keyset_page(queryset, number: int, after=None, before=None, per_page: int = 25):
+    """
+    Returns the page of queryset, newest first, that follows the submission
+    `after` or precedes the submission `before` (cursors from encode_cursor).
+    Seeking on (timestamp, id) costs the same on every page, unlike OFFSET.
+    Raises ValueError for a malformed cursor.
+    """
+    count = queryset.order_by()[: STATUS_COUNT_LIMIT + 1].count()
+    num_pages = None if count > STATUS_COUNT_LIMIT else max(1, -(-count // per_page))
+
+    queryset = queryset.select_related("usr", "problem", "contest").only(*STATUS_FIELDS)
+    if before is not None:
+        timestamp, sid = decode_cursor(before)
+        rows = list(
+            queryset.filter(
+                Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=sid)
+            ).order_by("timestamp", "id")[:per_page]
+        )[::-1]
+        has_next = True
+    else:
+        if after is not None:
+            timestamp, sid = decode_cursor(after)
+            queryset = queryset.filter(
+                Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=sid)
+            )
+        rows = list(queryset.order_by("-timestamp", "-id")[: per_page + 1])
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+
+    return KeysetPage(
+        object_list=rows,
+        number=number,
+        num_pages=num_pages,
+        has_next=has_next and bool(rows),
+        next_query=f"?after={encode_cursor(rows[-1])}" if rows else "",
+        # page 1 is always the newest submissions, so it needs no cursor
+        previous_query=f"?before={encode_cursor(rows[0])}"
+        if rows and number > 2
+        else "",
+    )
+
+
+def frozen_submission_ids(user, submissions) -> Set[int]:
+    """
+    The ids of the submissions other users made after the freeze of a contest
+    that is still frozen. The submissions must have their contest loaded.
+    """
+    if user.is_staff:
+        return set()
+    return {
+        sub.id
+        for sub in submissions
+        if sub.usr_id != user.id
+        and sub.contest.is_frozen()
+        and sub.timestamp >= sub.contest.freeze_time
+    }
+
+
+def hide_frozen_results(user, submissions):
+    """
+    Shows the submissions from frozen_submission_ids as pending, so that the
+    status pages do not give away what the frozen standings hide.
+    """
+    hidden = frozen_submission_ids(user, submissions)
+    for sub in submissions:
+        if sub.id in hidden:
+            sub.verdict = FROZEN_VERDICT
+            sub.runtime = sub.memory = -1
@@ -1,15 +1,24 @@
+import hmac
+import math
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max
 from django.shortcuts import render, get_object_or_404, redirect
-from django.core.paginator import Paginator, EmptyPage
 from django.http import HttpResponse
 from django.views.decorators.http import require_POST
-from django.conf import settings
 from django.utils import timezone
-from datetime import timedelta
-from ..oauth.decorators import login_required
+from ...coderunner import metrics
+from ..oauth.decorators import login_required, admin_required
 from ..problems.models import Problem
 from ..contests.models import Contest
 from .models import Submission
-from .tasks import grade_submission_task
+from .tasks import classify_submission, enqueue_submission
+from .utils import (
+    THROTTLE_INTERVAL,
+    hide_frozen_results,
+    keyset_page,
+    submission_interval,
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -30,7 +39,8 @@ def submit_view(request, cid=None, pid=None):
         problem = get_object_or_404(Problem, id=pid)
 
         # Prevent non-TJIOI users from submitting to TJIOI problems
-        if problem.contest.tjioi and not request.user.is_staff and not request.user.is_tjioi:
+        tjioi = request.user.is_staff or request.user.is_tjioi
+        if problem.contest.tjioi and not tjioi:
             return redirect("runtests:submit")
 
         if (
@@ -85,7 +95,10 @@ def status_view(request, page, cid=None, mine=False):
         
         # Prevent non-TJIOI users from viewing submissions of TJIOI contests
         if contest.tjioi and not request.user.is_staff and not request.user.is_tjioi:
-            return HttpResponse("You do not have permission to view submissions for this contest", status=403)
+            return HttpResponse(
+                "You do not have permission to view submissions for this contest",
+                status=403,
+            )
         
         submissions = submissions.filter(contest=cid)
 
@@ -94,14 +107,17 @@ def status_view(request, page, cid=None, mine=False):
     elif request.user.is_tjioi:
         submissions = submissions.filter(usr__is_tjioi=True)
 
-    submissions = submissions.order_by("-timestamp")
-    paginator = Paginator(submissions, 25)  # 25 per page
-
+    # pages past the first are reached through the cursor of the page before
+    after, before = request.GET.get("after"), request.GET.get("before")
+    if page > 1 and after is None and before is None:
+        return redirect("runtests:status", cid=cid, mine=mine, page=1)
     try:
-        submissions_page = paginator.get_page(page)
-    except EmptyPage:
+        submissions_page = keyset_page(submissions, page, after, before, 25)
+    except ValueError:
         return redirect("runtests:status", cid=cid, mine=mine, page=1)
 
+    hide_frozen_results(request.user, submissions_page.object_list)
+
     context = {
         "submissions": submissions_page.object_list,
         "page_obj": submissions_page,
@@ -116,7 +132,7 @@ def status_view(request, page, cid=None, mine=False):
 
 @login_required
 def submission_view(request, id):
-    submission = get_object_or_404(Submission, id=id)
+    submission = get_object_or_404(Submission.objects.select_related("source"), id=id)
 
     if submission.usr == request.user or request.user.is_staff:
         context = {"admin": request.user.is_staff, "submission": submission}
@@ -144,11 +160,14 @@ def submit_post(request):
     problem = Problem.objects.select_related("contest").get(id=pid)
 
     # Prevent non-TJIOI users from submitting to TJIOI problems
-    if problem.contest.tjioi and not request.user.is_staff and not request.user.is_tjioi:
+    tjioi = request.user.is_staff or request.user.is_tjioi
+    if problem.contest.tjioi and not tjioi:
         logger.info(
             f"User {request.user} attempted to submit to TJIOI problem {problem.name}"
         )
-        return HttpResponse("You do not have permission to submit to this problem", status=403)
+        return HttpResponse(
+            "You do not have permission to submit to this problem", status=403
+        )
 
     if len(code) > 60000:
         return HttpResponse(status=413)
@@ -165,31 +184,98 @@ def submit_post(request):
     if not request.user.is_staff and timezone.now() < problem.contest.start:
         return HttpResponse("Contest has not started yet", status=403)
 
+    queue_class = classify_submission(request.user, problem.contest)
+    interval = submission_interval(request.user, queue_class)
+
     last_sub_time = None
     try:
         last_sub_time = Submission.objects.filter(usr=request.user).latest().timestamp
     except Exception:
         pass
 
-    if (
-        last_sub_time is None
-        or timezone.now() - last_sub_time > timedelta(seconds=30)
-        or request.user.is_staff
-        or settings.DEBUG
-    ):
+    now = timezone.now()
+    if last_sub_time is None or now - last_sub_time > interval:
         new_sub = Submission.objects.create(
             usr=request.user,
             code=code,
             problem=problem,
             language=lang,
             contest=problem.contest,
+            queue_class=queue_class,
         )
-        new_sub.save()
 
-        grade_submission_task.delay(new_sub.id)
-        return redirect("runtests:status", page=1)
+        enqueue_submission(new_sub)
+        response = redirect("runtests:status", page=1)
+        # lets scripted clients follow the submission they just made
+        response["X-Submission-Id"] = new_sub.id
+        return response
+    elif interval > THROTTLE_INTERVAL:
+        response = HttpResponse(
+            f"The grader is busy! Please wait at least {int(interval.total_seconds())} "
+            "seconds between practice submissions!",
+            status=429,
+        )
+        remaining = interval - (now - last_sub_time)
+        response["Retry-After"] = math.ceil(remaining.total_seconds())
+        return response
     else:
         return HttpResponse(
             "Too many requests! Please wait at least 30 seconds between submissions!",
             status=429,
         )
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get("Authorization", "")
+    authorized = request.user.is_authenticated and request.user.is_staff
+    if token and hmac.compare_digest(authorization, f"Bearer {token}"):
+        authorized = True
+    if not authorized:
+        return HttpResponse(status=403)
+
+    problem_ids = list(Problem.objects.values_list("id", flat=True))
+    return HttpResponse(
+        metrics.render_prometheus(problem_ids),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+@admin_required
+def metrics_dashboard_view(request):
+    by_language, by_problem = metrics.collect(
+        list(Problem.objects.values_list("id", flat=True))
+    )
+    problem_totals = sorted(
+        (row for row in metrics.summarize(by_problem) if row["stage"] == "total"),
+        key=lambda row: -row["count"],
+    )
+
+    # the same latencies straight from the submission timestamps
+    recent = Submission.objects.filter(
+        finished_at__gte=timezone.now() - timedelta(hours=1),
+        enqueued_at__isnull=False,
+        started_at__isnull=False,
+    ).annotate(
+        wait=ExpressionWrapper(
+            F("started_at") - F("enqueued_at"), output_field=DurationField()
+        ),
+        grading=ExpressionWrapper(
+            F("finished_at") - F("started_at"), output_field=DurationField()
+        ),
+    )
+    context = {
+        "stages": metrics.summarize(by_language),
+        "problems": problem_totals[:50],
+        "recent": recent.aggregate(
+            count=Count("id"),
+            avg_wait=Avg("wait"),
+            max_wait=Max("wait"),
+            avg_grading=Avg("grading"),
+            max_grading=Max("grading"),
+        ),
+        "pending": Submission.objects.filter(
+            verdict=Submission.PENDING_VERDICT, started_at__isnull=True
+        ).count(),
+    }
+    return render(request, "runtests/metrics.html", context)
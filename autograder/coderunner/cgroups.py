@@ -0,0 +1,68 @@
+import time
+import uuid
+from pathlib import Path
+from typing import Optional, Tuple
+from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def create_run_cgroup() -> Optional[Path]:
+    """
+    Creates a cgroup v2 directory to hand to nsjail as --cgroupv2_mount. nsjail
+    puts the jailed process in a child cgroup and removes it on exit, but its
+    usage stays accounted in this parent until we remove it ourselves.
+    """
+    if not settings.CODERUNNER_CGROUP_ROOT:
+        return None
+
+    path = Path(settings.CODERUNNER_CGROUP_ROOT) / f"run-{uuid.uuid4().hex}"
+    try:
+        path.mkdir()
+    except OSError as e:
+        logger.warning(f"Failed to create cgroup {path}: {e}")
+        return None
+    return path
+
+
+def read_usage(path: Path) -> Tuple[Optional[int], Optional[int], bool]:
+    """Returns (CPU time in ms, peak memory in KB, whether the OOM killer fired)."""
+    cpu_time = memory = None
+    oom_killed = False
+
+    try:
+        for line in (path / "cpu.stat").read_text().splitlines():
+            key, value = line.split()
+            if key == "usage_usec":
+                cpu_time = int(value) // 1000
+    except (OSError, ValueError):
+        pass
+
+    try:
+        memory = int((path / "memory.peak").read_text()) // 1024
+    except (OSError, ValueError):
+        pass
+
+    try:
+        for line in (path / "memory.events").read_text().splitlines():
+            key, value = line.split()
+            if key == "oom_kill":
+                oom_killed = int(value) > 0
+    except (OSError, ValueError):
+        pass
+
+    return cpu_time, memory, oom_killed
+
+
+def remove_run_cgroup(path: Path):
+    # nsjail's child cgroup can take a moment to disappear after the jail exits
+    for _ in range(20):
+        try:
+            path.rmdir()
+            return
+        except FileNotFoundError:
+            return
+        except OSError:
+            time.sleep(0.01)
+    logger.warning(f"Failed to remove cgroup {path}")
@@ -0,0 +1,69 @@
+from itertools import islice
+from pathlib import Path
+from typing import Iterator, Optional
+
+DEFAULT_CHECKER = Path(__file__).parent / "default_checker.py"
+
+
+def is_default_checker(checker_path: Path) -> bool:
+    try:
+        return checker_path.read_bytes() == DEFAULT_CHECKER.read_bytes()
+    except OSError:
+        return False
+
+
+def _lines(f) -> Iterator[str]:
+    for line in f:
+        line = line.strip()
+        if line:
+            yield line
+
+
+def compare_output(sol_path: Path, output_path: Path, test_path: Path) -> str:
+    """
+    Streaming equivalent of default_checker.py: compares the non-empty
+    stripped lines of both files one line at a time and returns the exact
+    text the checker would have printed.
+    """
+    with (
+        open(sol_path, "r", errors="replace") as sol,
+        open(output_path, "r", errors="replace") as out,
+    ):
+        expected, actual = _lines(sol), _lines(out)
+        prefix = ""
+        mismatch: Optional[tuple] = None
+
+        while True:
+            i = next(expected, None)
+            j = next(actual, None)
+            if j is not None and len(prefix) < 10:
+                prefix += j[: 10 - len(prefix)]
+            if i is None or j is None:
+                break
+            if mismatch is None and i != j:
+                mismatch = (i, j)
+
+        if i is not None or j is not None:
+            while len(prefix) < 10 and (j := next(actual, None)) is not None:
+                prefix += j[: 10 - len(prefix)]
+            prefix = prefix.strip()
+            if len(prefix) == 0:
+                return "User didn't output anything\nVerdict: WA\n"
+            return f"User output was {prefix}\nVerdict: WA\n"
+
+    if mismatch is None:
+        return "AC\n"
+
+    i, j = mismatch
+    res = ["Failed -- Wrong Answer:\n\n"]
+    with open(test_path, "r", errors="replace") as test:
+        head = list(islice(test, 11))
+    for line in head[:10]:
+        line = line.strip()
+        res.append(line[:100] + ("...\n" if len(line) > 100 else "\n"))
+    if len(head) > 10:
+        res.append("...\n")
+    res.append("\n")
+    res.append(f"User output was {j.strip()[:100]}; correct is {i.strip()[:100]}.\n")
+    res.append("Verdict: WA\n")
+    return "".join(res)
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import List
+from django.conf import settings
+from django.core.cache import cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+COMPILE_FLAGS = {
+    "cpp": ["/usr/bin/g++", "-std=c++17", "-O2"],
+    "java": ["/usr/bin/javac"],
+}
+
+VERSION_COMMANDS = {
+    "cpp": ["/usr/bin/g++", "--version"],
+    "java": ["/usr/bin/javac", "-version"],
+}
+
+# bumped whenever the layout of an entry changes, so old entries stop matching
+FORMAT = "2"
+# names and sizes of an entry's artifacts, written with them
+MANIFEST = "manifest.json"
+
+HITS_KEY = "compile_cache_hits"
+MISSES_KEY = "compile_cache_misses"
+# running total of the bytes stored, so that not every store scans the cache
+SIZE_KEY = "compile_cache_size"
+
+
+@lru_cache(maxsize=None)
+def compiler_version(lang: str) -> str:
+    try:
+        output = subprocess.run(VERSION_COMMANDS[lang], capture_output=True)
+    except OSError:
+        return ""
+    return (output.stdout + output.stderr).decode("utf-8", errors="ignore")
+
+
+def cache_key(lang: str, code: str) -> str:
+    h = hashlib.sha256()
+    for part in (
+        FORMAT,
+        lang,
+        compiler_version(lang),
+        " ".join(COMPILE_FLAGS[lang]),
+        code,
+    ):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _cache_dir() -> Path:
+    return Path(settings.CODERUNNER_COMPILE_CACHE_DIR)
+
+
+def _count(key: str):
+    try:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+    except Exception as e:
+        logger.warning(f"Failed to update {key}: {e}")
+
+
+def fetch(key: str, dest: Path) -> bool:
+    """Copies the cached artifacts for key into dest, returns False on a miss."""
+    entry = _cache_dir() / key
+    copied = []
+    try:
+        manifest = json.loads((entry / MANIFEST).read_text())
+        for name, size in manifest.items():
+            copied.append(dest / name)
+            shutil.copy2(entry / name, dest / name)
+            # evict may remove the entry while it is being copied
+            if (dest / name).stat().st_size != size:
+                raise OSError(f"{name} changed while it was copied")
+        os.utime(entry)
+    except (OSError, ValueError):
+        for path in copied:
+            path.unlink(missing_ok=True)
+        _count(MISSES_KEY)
+        return False
+
+    _count(HITS_KEY)
+    return True
+
+
+def store(key: str, artifacts: List[Path]):
+    entry = _cache_dir() / key
+    tmp = _cache_dir() / f".{key}.{uuid.uuid4().hex}"
+    try:
+        tmp.mkdir(parents=True)
+        manifest = {}
+        for artifact in artifacts:
+            shutil.copy2(artifact, tmp / artifact.name)
+            manifest[artifact.name] = (tmp / artifact.name).stat().st_size
+        (tmp / MANIFEST).write_text(json.dumps(manifest))
+        os.rename(tmp, entry)
+    except OSError as e:
+        # another worker stored the same entry first
+        logger.info(f"Could not store compile cache entry {key}: {e}")
+        shutil.rmtree(tmp, ignore_errors=True)
+        return
+
+    try:
+        total = cache.incr(SIZE_KEY, sum(manifest.values()))
+    except ValueError:
+        # not known yet, or the cache was cleared
+        total = None
+    except Exception as e:
+        logger.warning(f"Failed to update {SIZE_KEY}: {e}")
+        total = None
+
+    if total is None or total > settings.CODERUNNER_COMPILE_CACHE_MAX_MB * 1024 * 1024:
+        evict()
+
+
+def _entries():
+    res = []
+    for entry in _cache_dir().iterdir():
+        if entry.name.startswith("."):
+            continue
+        try:
+            size = sum(f.stat().st_size for f in entry.iterdir())
+            res.append((entry.stat().st_mtime, size, entry))
+        except OSError:
+            continue
+    return res
+
+
+def evict():
+    """Removes the least recently used entries until the cache fits its limit."""
+    limit = settings.CODERUNNER_COMPILE_CACHE_MAX_MB * 1024 * 1024
+    entries = _entries()
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total <= limit:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+
+    # stores that raced with the scan are lost from the total until the next one
+    try:
+        cache.set(SIZE_KEY, total, timeout=None)
+    except Exception as e:
+        logger.warning(f"Failed to update {SIZE_KEY}: {e}")
+
+
+def stats() -> dict:
+    entries = _entries() if _cache_dir().exists() else []
+    return {
+        "hits": cache.get(HITS_KEY, 0),
+        "misses": cache.get(MISSES_KEY, 0),
+        "entries": len(entries),
+        "size": sum(size for _, size, _ in entries),
+    }
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
@@ -0,0 +1,36 @@
+"""
+A stand-in for run_code_handler that never starts a sandbox, for load testing
+the web, queue and database path on machines without nsjail. Select it with
+CODERUNNER_HANDLER=autograder.coderunner.fake_runner.run_code_handler.
+
+The verdict and grading time are read from directives anywhere in the source,
+such as a comment containing "FAKE_VERDICT: Wrong Answer on test 2" or
+"FAKE_SECONDS: 0.5". Without them a submission is accepted after
+DEFAULT_SECONDS.
+"""
+
+import re
+import time
+from .handlers import broadcast_status_update
+from .metrics import StageTimer
+
+DEFAULT_SECONDS = 0.1
+
+VERDICT_DIRECTIVE = re.compile(r"FAKE_VERDICT:\s*([^\r\n*]+?)\s*$", re.MULTILINE)
+SECONDS_DIRECTIVE = re.compile(r"FAKE_SECONDS:\s*([0-9.]+)")
+
+
+def run_code_handler(tl, ml, lang, pid, sid, code, timer=None):
+    timer = timer or StageTimer(lang, pid)
+    verdict = VERDICT_DIRECTIVE.search(code)
+    verdict = verdict.group(1) if verdict else "Accepted"
+    seconds = SECONDS_DIRECTIVE.search(code)
+    seconds = float(seconds.group(1)) if seconds else DEFAULT_SECONDS
+
+    broadcast_status_update(sid, "Running on test 1")
+    with timer.span("run"):
+        time.sleep(seconds)
+
+    runtime = int(seconds * 1000)
+    broadcast_status_update(sid, verdict, runtime=runtime, memory=0)
+    return {"verdict": verdict, "output": "", "runtime": runtime, "memory": 0}
@@ -5,6 +5,7 @@ import tempfile
 from django.conf import settings
 from pathlib import Path
 from ..apps.problems.models import Problem
+from .verdict_cache import clear_fingerprint, write_fingerprint
 
 logger = logging.getLogger(__name__)
 
@@ -75,6 +76,8 @@ def add_tests_to_coderunner(pid: int):
                     else:
                         testcases[tid]["out"] = content
 
+            # a failed upload must not keep the fingerprint of the old tests
+            clear_fingerprint(base_path)
             for tid, tc in testcases.items():
                 try:
                     (test_dir / str(tid)).write_text(tc["test"])
@@ -83,6 +86,9 @@ def add_tests_to_coderunner(pid: int):
                     logger.error(f"Write error for test {tid}: {e}")
                     return
 
+        # changes the verdict cache keys of every submission to this problem
+        write_fingerprint(base_path)
+
     except Problem.DoesNotExist:
         logger.error(f"Problem {pid} not found for test upload.")
     except Exception as e:
@@ -2,9 +2,15 @@ import subprocess
 import os
 import re
 import shutil
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
+from django.conf import settings
 from .runner import run_code
-from .interactive_checker import run_interactive_problem
+from .comparator import compare_output, is_default_checker
+from . import compile_cache, verdict_cache
+from .metrics import StageTimer
+from .interactive_checker import run_interactive_tests
 from ..apps.runtests.models import Submission
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
@@ -25,7 +31,7 @@ def natural_key(s):
     ]
 
 
-def broadcast_status_update(submission_id, new_message, runtime=-1):
+def broadcast_status_update(submission_id, new_message, runtime=-1, memory=-1):
     channel_layer = get_channel_layer()
     async_to_sync(channel_layer.group_send)(
         f"submission_{submission_id}",
@@ -34,11 +40,208 @@ def broadcast_status_update(submission_id, new_message, runtime=-1):
             "submission_id": submission_id,
             "message": new_message,
             "runtime": runtime,
+            "memory": memory,
         },
     )
 
 
-def run_code_handler(tl, ml, lang, pid, sid, code):
+def _compile(lang, subdir, sol_path, code):
+    """Compiles the submission into subdir, returns the compiler output on failure."""
+    key = compile_cache.cache_key(lang, code)
+    if compile_cache.fetch(key, subdir):
+        logger.info(f"Compile cache hit for {sol_path}")
+        return None
+
+    if lang == "cpp":
+        cmd = compile_cache.COMPILE_FLAGS[lang] + [
+            "-o",
+            str(subdir / "usercode"),
+            str(sol_path),
+        ]
+    else:
+        cmd = compile_cache.COMPILE_FLAGS[lang] + [str(sol_path)]
+
+    output = subprocess.run(cmd, env=env_copy, capture_output=True)
+    if output.returncode != 0:
+        return output.stderr.decode("utf-8", errors="ignore")
+
+    if lang == "cpp":
+        artifacts = [subdir / "usercode"]
+    else:
+        artifacts = list(subdir.glob("*.class"))
+    compile_cache.store(key, artifacts)
+    return None
+
+
+def _run_test(
+    sid, subdir, entry, lang, sol_path, sol_filename, tl, ml, cancel_event, timer
+):
+    test_name = entry.stem
+    broadcast_status_update(sid, f"Running on test {test_name}")
+
+    output_dir = subdir / "tests" / entry.name
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    try:
+        with timer.span("run"):
+            output_text, insight, time_used, memory = run_code(
+                subdir,
+                entry,
+                lang,
+                sol_path,
+                sol_filename,
+                tl,
+                ml,
+                False,
+                None,
+                None,
+                output_dir=output_dir,
+                cancel_event=cancel_event,
+            )
+    except Exception as e:
+        return "Grader Error", f"Grader Error: {e}", 0, 0
+
+    if cancel_event.is_set():
+        return "Cancelled", "", 0, 0
+    timer.observe("user", time_used / 1000)
+    if output_text == "Runtime Error":
+        return "Runtime Error", insight, time_used, memory
+    if output_text in ("Time Limit Exceeded", "Memory Limit Exceeded"):
+        return f"{output_text} on test {test_name}", insight, time_used, memory
+
+    return "Accepted", "", time_used, memory
+
+
+def _check_test(subdir, entry, pid, checker_path, cancel_event, timer):
+    output_dir = subdir / "tests" / entry.name
+    try:
+        with timer.span("check"):
+            if checker_path is None:
+                problem_base_path = Path("/home/tjctgrader/problems") / str(pid)
+                check_out = compare_output(
+                    problem_base_path / "sol" / entry.name,
+                    output_dir / "output.txt",
+                    entry,
+                )
+            else:
+                check_out, _, _, _ = run_code(
+                    subdir,
+                    None,
+                    "python",
+                    checker_path,
+                    "default_checker.py",
+                    20000,
+                    1024,
+                    True,
+                    entry.name,
+                    pid,
+                    output_dir=output_dir,
+                    cancel_event=cancel_event,
+                )
+    except Exception as e:
+        return f"Checker Error: {e}", "", 0, 0
+
+    if cancel_event.is_set():
+        return "Cancelled", "", 0, 0
+    if check_out.strip().lower() not in ("ac", "accepted"):
+        return f"Wrong Answer on test {entry.stem}", check_out, 0, 0
+
+    return "Accepted", check_out, 0, 0
+
+
+def _grade_tests(
+    sid,
+    subdir,
+    entries,
+    lang,
+    sol_path,
+    sol_filename,
+    tl,
+    ml,
+    pid,
+    checker_path,
+    timer,
+):
+    """
+    Runs the tests over CODERUNNER_PARALLEL_SLOTS sandbox slots. A test is
+    checked as soon as its run finishes, while later tests keep running.
+    Once a test fails, every test after it is cancelled, but the tests before
+    it still finish so that the reported verdict is always the one of the
+    lowest-numbered failing test.
+    """
+    slots = max(1, settings.CODERUNNER_PARALLEL_SLOTS)
+    cancel_events = [threading.Event() for _ in entries]
+    results = [("Accepted", "", 0, 0)] * len(entries)
+    times = [0] * len(entries)
+    memories = [0] * len(entries)
+    first_failure = len(entries)
+
+    with (
+        ThreadPoolExecutor(max_workers=slots) as run_pool,
+        ThreadPoolExecutor(max_workers=slots) as check_pool,
+    ):
+        pending = {
+            run_pool.submit(
+                _run_test,
+                sid,
+                subdir,
+                entry,
+                lang,
+                sol_path,
+                sol_filename,
+                tl,
+                ml,
+                cancel_events[i],
+                timer,
+            ): ("run", i)
+            for i, entry in enumerate(entries)
+        }
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, i = pending.pop(future)
+                if future.cancelled() or i > first_failure:
+                    continue
+
+                verdict, insight, time_used, memory = future.result()
+                if stage == "run":
+                    times[i] = time_used
+                    memories[i] = memory
+                    if verdict == "Accepted":
+                        check_future = check_pool.submit(
+                            _check_test,
+                            subdir,
+                            entries[i],
+                            pid,
+                            checker_path,
+                            cancel_events[i],
+                            timer,
+                        )
+                        pending[check_future] = ("check", i)
+                        continue
+
+                results[i] = (verdict, insight, time_used, memory)
+                if verdict != "Accepted" and i < first_failure:
+                    first_failure = i
+                    for other, (_, j) in pending.items():
+                        if j > i:
+                            other.cancel()
+                            cancel_events[j].set()
+
+    overall_time = max(times[: first_failure + 1], default=0)
+    overall_memory = max(memories[: first_failure + 1], default=0)
+    if first_failure < len(entries):
+        verdict, insight, _, _ = results[first_failure]
+        return verdict, insight, overall_time, overall_memory
+
+    insight = results[-1][1] if results else ""
+    return "Accepted", insight, overall_time, overall_memory
+
+
+def run_code_handler(tl, ml, lang, pid, sid, code, timer=None):
+    """Grades a submission, recording its stage timings in timer if one is given."""
+    timer = timer or StageTimer(lang, pid)
     submission = Submission.objects.get(pk=sid)
     if lang not in ["python", "cpp", "java"]:
         return {"error": "Unacceptable code language"}
@@ -57,9 +260,26 @@ def run_code_handler(tl, ml, lang, pid, sid, code):
     )
     
     if has_interactor:
-        return run_interactive_handler(tl, ml, lang, pid, sid, code)
+        return run_interactive_handler(tl, ml, lang, pid, sid, code, timer)
+
+    memo_key = None
+    if settings.CODERUNNER_VERDICT_CACHE:
+        memo_key = verdict_cache.cache_key(problem_base_path, lang, code, tl, ml)
+        cached = verdict_cache.lookup(memo_key)
+        if cached is not None:
+            logger.info(f"Reusing cached verdict for submission {sid}")
+            broadcast_status_update(
+                submission.id,
+                cached["verdict"],
+                runtime=cached["runtime"],
+                memory=cached.get("memory", -1),
+            )
+            return cached
 
     checker_path = problem_base_path / "default_checker.py"
+    if settings.CODERUNNER_BUILTIN_CHECKER and is_default_checker(checker_path):
+        # the stock checker is trusted, so compare in-process instead of in a jail
+        checker_path = None
     test_dir = problem_base_path / "test"
 
     subdir = Path("/home/tjctgrader/submissions") / str(sid)
@@ -70,45 +290,28 @@ def run_code_handler(tl, ml, lang, pid, sid, code):
     sol_path = subdir / sol_filename
 
     try:
-        sol_path.write_text(code)
+        with timer.span("write"):
+            sol_path.write_text(code)
     except Exception as e:
         logger.error(f"Failed to write to file: {e}")
         raise
 
     if lang in ["cpp", "java"]:
         broadcast_status_update(submission.id, "Compiling")
-        if lang == "cpp":
-            output = subprocess.run(
-                [
-                    "/usr/bin/g++",
-                    "-std=c++17",
-                    "-O2",
-                    "-o",
-                    str(subdir / "usercode"),
-                    str(sol_path),
-                ],
-                env=env_copy,
-                capture_output=True,
-            )
-            sol_path = subdir / "usercode"
-            sol_filename = "usercode"
-        elif lang == "java":
-            output = subprocess.run(
-                ["/usr/bin/javac", str(sol_path)], env=env_copy, capture_output=True
-            )
-            sol_path = subdir / "usercode"
-            sol_filename = "usercode"
+        with timer.span("compile"):
+            compile_error = _compile(lang, subdir, sol_path, code)
+        sol_path = subdir / "usercode"
+        sol_filename = "usercode"
 
-        if output.returncode != 0:
-            return {
+        if compile_error is not None:
+            result = {
                 "verdict": "Compilation Error",
-                "output": output.stderr.decode("utf-8", errors="ignore"),
+                "output": compile_error,
                 "runtime": 0,
             }
-
-    verdict_overall = "Accepted"
-    insight_overall = ""
-    overall_time = 0
+            if memo_key:
+                verdict_cache.store(memo_key, result)
+            return result
 
     try:
         entries = sorted(test_dir.iterdir(), key=natural_key)
@@ -120,79 +323,44 @@ def run_code_handler(tl, ml, lang, pid, sid, code):
     elif lang == "python":
         tl *= 3
 
-    for entry in entries:
-        file_path = entry
-        test_name = file_path.stem
-        broadcast_status_update(submission.id, f"Running on test {test_name}")
-
-        try:
-            output_text, insight, time_used = run_code(
-                subdir,
-                file_path,
-                lang,
-                sol_path,
-                sol_filename,
-                tl,
-                ml,
-                False,
-                None,
-                None,
-            )
-        except Exception as e:
-            verdict_overall = "Grader Error"
-            insight_overall = f"Grader Error: {e}"
-            break
-
-        overall_time = max(overall_time, time_used)
-
-        if output_text == "Runtime Error":
-            verdict_overall = "Runtime Error"
-            insight_overall = insight
-            break
-        if output_text == "Time Limit Exceeded":
-            verdict_overall = f"Time Limit Exceeded on test {test_name}"
-            insight_overall = insight
-            break
-
-        # run checker
-        try:
-            check_out, _, _ = run_code(
-                subdir,
-                None,
-                "python",
-                checker_path,
-                "default_checker.py",
-                20000,
-                1024,
-                True,
-                file_path.name,
-                pid,
-            )
-            insight_overall = check_out
-        except Exception as e:
-            verdict_overall = f"Checker Error: {e}"
-            break
-
-        if check_out.strip().lower() not in ("ac", "accepted"):
-            verdict_overall = f"Wrong Answer on test {test_name}"
-            break
+    verdict_overall, insight_overall, overall_time, overall_memory = _grade_tests(
+        submission.id,
+        subdir,
+        entries,
+        lang,
+        sol_path,
+        sol_filename,
+        tl,
+        ml,
+        pid,
+        checker_path,
+        timer,
+    )
 
     # cleanup
     try:
-        shutil.rmtree(subdir)
+        with timer.span("cleanup"):
+            shutil.rmtree(subdir)
     except Exception:
         pass
 
-    broadcast_status_update(submission.id, verdict_overall, runtime=overall_time)
+    broadcast_status_update(
+        submission.id, verdict_overall, runtime=overall_time, memory=overall_memory
+    )
 
-    return {
+    result = {
         "verdict": verdict_overall,
         "output": insight_overall,
         "runtime": overall_time,
+        "memory": overall_memory,
     }
+    if memo_key:
+        verdict_cache.store(memo_key, result)
+    return result
 
 
-def run_interactive_handler(tl, ml, lang, pid, sid, code):
+def run_interactive_handler(tl, ml, lang, pid, sid, code, timer=None):
+    timer = timer or StageTimer(lang, pid)
     submission = Submission.objects.get(pk=sid)
     if lang not in ["python", "cpp", "java"]:
         return {"error": "Unacceptable code language"}
@@ -214,46 +382,26 @@ def run_interactive_handler(tl, ml, lang, pid, sid, code):
     sol_path = subdir / sol_filename
 
     try:
-        sol_path.write_text(code)
+        with timer.span("write"):
+            sol_path.write_text(code)
     except Exception as e:
         logger.error(f"Failed to write to file: {e}")
         raise
 
     if lang in ["cpp", "java"]:
         broadcast_status_update(submission.id, "Compiling")
-        if lang == "cpp":
-            output = subprocess.run(
-                [
-                    "/usr/bin/g++",
-                    "-std=c++17",
-                    "-O2",
-                    "-o",
-                    str(subdir / "usercode"),
-                    str(sol_path),
-                ],
-                env=env_copy,
-                capture_output=True,
-            )
-            sol_path = subdir / "usercode"
-            sol_filename = "usercode"
-        elif lang == "java":
-            output = subprocess.run(
-                ["/usr/bin/javac", str(sol_path)], env=env_copy, capture_output=True
-            )
-            sol_path = subdir / "usercode"
-            sol_filename = "usercode"
+        with timer.span("compile"):
+            compile_error = _compile(lang, subdir, sol_path, code)
+        sol_path = subdir / "usercode"
+        sol_filename = "usercode"
 
-        if output.returncode != 0:
+        if compile_error is not None:
             return {
                 "verdict": "Compilation Error",
-                "output": output.stderr.decode("utf-8", errors="ignore"),
+                "output": compile_error,
                 "runtime": 0,
             }
 
-    verdict_overall = "Accepted"
-    insight_overall = ""
-    overall_time = 0
-
     try:
         entries = sorted(test_dir.iterdir(), key=natural_key)
     except Exception:
@@ -264,40 +412,52 @@ def run_interactive_handler(tl, ml, lang, pid, sid, code):
     elif lang == "python":
         tl *= 3
 
-    for entry in entries:
-        test_name = entry.stem
-        broadcast_status_update(submission.id, f"Running on test {test_name}")
-
-        try:
-            verdict, message, time_used = run_interactive_problem(
-                user_executable=str(sol_path),
-                user_lang=lang,
-                problem_dir=str(problem_base_path),
-                test_input_path=str(entry),
-                time_limit_ms=tl,
-                memory_limit_mb=ml,
+    try:
+        with timer.span("interactive"):
+            results = run_interactive_tests(
+                subdir,
+                entries,
+                lang,
+                sol_path,
+                sol_filename,
+                problem_base_path,
+                tl,
+                ml,
+                max(1, settings.CODERUNNER_PARALLEL_SLOTS),
+                streaming=submission.problem.streaming_interactor,
+                on_start=lambda session: broadcast_status_update(
+                    submission.id, f"Running on test {session.name}"
+                ),
             )
-        except Exception as e:
-            verdict_overall = "Grader Error"
-            insight_overall = f"Grader Error: {e}"
-            break
+    except Exception as e:
+        results = [("Grader Error", f"Grader Error: {e}", 0, 0)]
 
+    # tests after the first failure were cancelled, so only the ones up to it count
+    verdict_overall = "Accepted"
+    insight_overall = ""
+    overall_time = 0
+    overall_memory = 0
+    for entry, (verdict, message, time_used, memory) in zip(entries, results):
         overall_time = max(overall_time, time_used)
-
+        overall_memory = max(overall_memory, memory)
         if verdict != "Accepted":
-            verdict_overall = f"{verdict} on test {test_name}"
+            verdict_overall = f"{verdict} on test {entry.stem}"
             insight_overall = message
             break
 
     try:
-        shutil.rmtree(subdir)
+        with timer.span("cleanup"):
+            shutil.rmtree(subdir)
     except Exception:
         pass
 
-    broadcast_status_update(submission.id, verdict_overall, runtime=overall_time)
+    broadcast_status_update(
+        submission.id, verdict_overall, runtime=overall_time, memory=overall_memory
+    )
 
     return {
         "verdict": verdict_overall,
         "output": insight_overall,
         "runtime": overall_time,
+        "memory": overall_memory,
     }
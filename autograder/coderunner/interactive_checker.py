@@ -1,285 +1,631 @@
+import os
+import selectors
+import signal
 import subprocess
 import time
-import threading
-import os
 from pathlib import Path
-from typing import Tuple, Optional
+from typing import Callable, List, Optional, Tuple
+from .cgroups import create_run_cgroup, read_usage, remove_run_cgroup
+from .runner import (
+    MAX_STDERR,
+    POLL_INTERVAL,
+    _python_memory_error,
+    jail_command,
+    user_program,
+    wall_limit,
+)
 import logging
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MAX_QUERIES = 10000
+QUERY_TIMEOUT = 1.0
+VERDICT_TIMEOUT = 2.0
+MAX_LINE = 1 << 20
+USAGE_INTERVAL = 0.05
+REAP_TIMEOUT = 1.0
+
+# The interactor is trusted; the limits of its jail only stop a broken streaming
+# interactor from hanging the worker
+INTERACTOR_TL = 20000
+INTERACTOR_ML = 1024
+
+
+class _Process:
+    """A child process whose stdin and stdout are non-blocking pipes."""
+
+    def __init__(
+        self, cmd: List[str], stderr_path: Path, cgroup: Optional[Path] = None
+    ):
+        self.cgroup = cgroup
+        self.stderr_path = stderr_path
+        with open(stderr_path, "wb") as stderr_file:
+            self.popen = subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=stderr_file,
+            )
+        os.set_blocking(self.popen.stdin.fileno(), False)
+        os.set_blocking(self.popen.stdout.fileno(), False)
+
+        self.session = None
+        self.in_buf = bytearray()
+        self.out_buf = bytearray()
+        self.close_stdin = False
+        self.writing = False
+        self.stdin_open = True
+        self.stdout_open = True
+        self.killed = False
+        self.returncode = None
+        self.rusage = None
+
+    def poll(self) -> bool:
+        if self.returncode is None:
+            pid, status, rusage = os.wait4(self.popen.pid, os.WNOHANG)
+            if pid != 0:
+                self.returncode = os.waitstatus_to_exitcode(status)
+                self.popen.returncode = self.returncode
+                self.rusage = rusage
+        return self.returncode is not None
+
+    @property
+    def finished(self) -> bool:
+        return self.returncode is not None and not self.stdout_open
+
+    def kill(self):
+        if self.returncode is None and not self.killed:
+            # sudo forwards SIGTERM to nsjail, which kills the jail. not
+            # popen.terminate(), which may reap the process before poll() does
+            os.kill(self.popen.pid, signal.SIGTERM)
+            self.killed = True
+
+    def reap(self):
+        """Waits for the process to exit, killing it outright if it lingers."""
+        self.kill()
+        if self.returncode is None:
+            try:
+                self.popen.wait(timeout=REAP_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                self.popen.kill()
+                self.popen.wait()
+            self.returncode = self.popen.returncode
+
+    def stderr(self) -> str:
+        try:
+            with open(self.stderr_path, "rb") as f:
+                return f.read(MAX_STDERR).decode("utf-8", errors="ignore")
+        except OSError:
+            return ""
+
+
+class InteractiveSession:
+    """
+    One interactive test. The user's lines starting with '?' are forwarded to
+    the interactor and its reply is sent back; the line starting with '!' is
+    the final answer, which the interactor turns into a verdict.
+
+    A streaming interactor is started once and reads the test input and the
+    answer once, then one line per query, replying with one line. After the
+    final answer it prints its verdict and exits. Otherwise a new interactor
+    is started for every query with the test input, answer and query on stdin.
+    """
 
-class InteractiveRunner:
-    
     def __init__(
         self,
-        user_cmd: list,
-        interactor_cmd: list,
-        test_input_path: Optional[str],
-        answer_path: Optional[str],
-        queries_path: Optional[str],
-        time_limit_ms: int,
-        memory_limit_mb: int,
+        index: int,
+        name: str,
+        output_dir: Path,
+        user_lang: str,
+        user_mounts: List[Tuple[str, str]],
+        user_argv: List[str],
+        interactor_cmd: List[str],
+        test_input: bytes,
+        answer: bytes,
+        max_queries: int,
+        tl: int,
+        ml: int,
+        streaming: bool,
     ):
-        self.user_cmd = user_cmd
+        self.index = index
+        self.name = name
+        self.output_dir = output_dir
+        self.user_lang = user_lang
+        self.user_mounts = user_mounts
+        self.user_argv = user_argv
         self.interactor_cmd = interactor_cmd
-        self.test_input_path = test_input_path
-        self.answer_path = answer_path
-        self.time_limit_ms = time_limit_ms
-        self.memory_limit_mb = memory_limit_mb
-        
-        self.max_queries = 10000 
-        if queries_path and os.path.exists(queries_path):
-            try:
-                with open(queries_path, 'r') as f:
-                    self.max_queries = int(f.read().strip())
-            except Exception as e:
-                logger.warning(f"Failed to read query limit from {queries_path}: {e}, using default")
-        
-        self.verdict = "Accepted"
+        self.header = _with_newline(test_input) + _with_newline(answer)
+        self.test_input = test_input
+        self.max_queries = max_queries
+        self.tl = tl
+        self.ml = ml
+        self.streaming = streaming
+
+        self.engine = None
+        self.user = None
+        self.interactor = None
+        self.cgroup = None
+        self.verdict = None
         self.message = ""
-        self.query_count = 0
-        self.start_time = None
-        self.error_occurred = False
+        self.answer = None
         self.got_answer = False
-        
-    def run(self) -> Tuple[str, str, int]:
-        self.start_time = time.time()
-        
+        self.query_count = 0
+        self.waiting = None  # "query" or "verdict" while the interactor has the turn
+        self.deadline = 0.0
+        self.user_wall = 0.0
+        self.last_tick = 0.0
+        self.last_usage = 0.0
+        self.result = None
+
+    def start(self, engine: "InteractiveEngine"):
+        self.engine = engine
+        self.last_tick = self.last_usage = time.monotonic()
         try:
-            user_process = subprocess.Popen(
-                self.user_cmd,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1,
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            self.cgroup = create_run_cgroup()
+            cmd = jail_command(
+                self.user_lang,
+                False,
+                self.tl,
+                self.ml,
+                self.user_mounts,
+                self.user_argv,
+                self.cgroup,
             )
-            
-            test_input_data = ""
-            if self.test_input_path and os.path.exists(self.test_input_path):
-                with open(self.test_input_path, 'r') as f:
-                    test_input_data = f.read()
-        
-            answer_data = ""
-            if self.answer_path and os.path.exists(self.answer_path):
-                with open(self.answer_path, 'r') as f:
-                    answer_data = f.read()
-            
-            if test_input_data:
-                try:
-                    user_process.stdin.write(test_input_data)
-                    if not test_input_data.endswith('\n'):
-                        user_process.stdin.write('\n')
-                    user_process.stdin.flush()
-                except Exception as e:
-                    return "Grader Error", f"Failed to send initial input to user: {e}", 0
-            
-            interaction_thread = threading.Thread(
-                target=self._interact,
-                args=(user_process, test_input_data, answer_data),
-                daemon=True
-            )
-            interaction_thread.start()
-            
-            timeout_seconds = self.time_limit_ms / 1000.0
-            interaction_thread.join(timeout=timeout_seconds)
-            
-            elapsed_ms = int((time.time() - self.start_time) * 1000)
-            
-            if interaction_thread.is_alive():
-                user_process.kill()
-                return "Time Limit Exceeded", "", min(elapsed_ms, self.time_limit_ms)
-            
-            if user_process.returncode and user_process.returncode != 0:
-                stderr = user_process.stderr.read() if user_process.stderr else ""
-                return "Runtime Error", stderr[:1000], elapsed_ms
-            
-            if not self.got_answer and self.verdict == "Accepted":
-                return "Runtime Error", "Program exited without submitting answer", elapsed_ms
-            
-            return self.verdict, self.message, elapsed_ms
-            
-        except Exception as e:
-            elapsed_ms = int((time.time() - self.start_time) * 1000)
-            return "Grader Error", f"Exception: {str(e)}", elapsed_ms
-    
-    def _interact(self, user_process, test_input_data, answer_data):
-        try:
-            while True:
-                elapsed = (time.time() - self.start_time) * 1000
-                if elapsed >= self.time_limit_ms:
-                    self.verdict = "Time Limit Exceeded"
-                    user_process.kill()
-                    break
-                
-                line = user_process.stdout.readline()
-                
-                if not line:
-                    break
-                
-                line = line.strip()
-                
-                if not line:
-                    continue
-                
-                if line.startswith("?"):
-                    self.query_count += 1
-                    
-                    if self.query_count > self.max_queries:
-                        self.verdict = "Query Limit Exceeded"
-                        self.message = f"Exceeded {self.max_queries} queries"
-                        user_process.kill()
-                        break
-                    
-                    response = self._answer_query(line, test_input_data, answer_data)
-                    
-                    if response is None:
-                        self.verdict = "Grader Error"
-                        self.message = "Interactor failed"
-                        user_process.kill()
-                        break
-                    
-                    try:
-                        user_process.stdin.write(response + "\n")
-                        user_process.stdin.flush()
-                    except Exception as e:
-                        self.verdict = "Runtime Error"
-                        self.message = f"Failed to send response to user: {e}"
-                        break
-                
-                elif line.startswith("!"):
-                    verdict, message = self._check_answer(line, test_input_data, answer_data)
-                    self.verdict = verdict
-                    self.message = message
-                    self.got_answer = True
-                    break
-                
-                else:
-                    self.verdict = "Protocol Violation"
-                    self.message = f"Output must start with '?' or '!', got: {line[:100]}"
-                    user_process.kill()
-                    break
-            
+            self.user = _Process(cmd, self.output_dir / "stderr.txt", self.cgroup)
+            engine.watch(self.user, self)
+            if self.streaming:
+                self.interactor = self._start_interactor()
+                engine.send(self.interactor, self.header)
         except Exception as e:
+            logger.error(f"Failed to start interactive test {self.name}: {e}")
             self.verdict = "Grader Error"
-            self.message = f"Interaction error: {str(e)}"
-            try:
-                user_process.kill()
-            except:
-                pass
-    
-    def _answer_query(self, query: str, test_input: str, answer: str) -> Optional[str]:
+            self.message = f"Failed to start: {e}"
+            self._kill()
+            if self.user is None:
+                self._finish()
+            return
+
+        engine.send(self.user, _with_newline(self.test_input))
+
+    def cancel(self):
+        if self.result is None and self.verdict != "Cancelled":
+            self._fail("Cancelled", "")
+
+    def _start_interactor(self) -> _Process:
+        proc = _Process(self.interactor_cmd, self.output_dir / "interactor_stderr.txt")
+        self.engine.watch(proc, self)
+        return proc
+
+    def abort(self):
+        """Stops the test's processes, reaps them and removes its cgroup."""
+        for proc in (self.user, self.interactor):
+            if proc is not None:
+                self.engine.forget(proc)
+                proc.reap()
+        if self.cgroup is not None:
+            remove_run_cgroup(self.cgroup)
+            self.cgroup = None
+
+    def _kill(self):
+        for proc in (self.user, self.interactor):
+            if proc is not None:
+                proc.kill()
+
+    def _fail(self, verdict: str, message: str):
+        self.verdict = verdict
+        self.message = message
+        self.waiting = None
+        self._kill()
+
+    def on_output(self, proc: _Process):
+        if proc is self.interactor:
+            self._read_reply()
+        elif self.got_answer or self.verdict is not None:
+            # nothing the program prints after its answer is read
+            proc.out_buf.clear()
+        else:
+            self._read_user_lines()
+
+    def _read_user_lines(self):
+        buf = self.user.out_buf
+        while self.waiting is None and not self.got_answer and self.verdict is None:
+            end = buf.find(b"\n")
+            if end == -1:
+                if len(buf) > MAX_LINE:
+                    self._fail("Protocol Violation", "Output line is too long")
+                    return
+                if self.user.stdout_open or not buf:
+                    return
+                end = len(buf)
+
+            line = bytes(buf[:end]).decode("utf-8", errors="replace").strip()
+            del buf[: end + 1]
+            if not line:
+                continue
+
+            if line.startswith("?"):
+                self.query_count += 1
+                if self.query_count > self.max_queries:
+                    self._fail(
+                        "Query Limit Exceeded", f"Exceeded {self.max_queries} queries"
+                    )
+                    return
+                self._ask(line, "query", QUERY_TIMEOUT)
+            elif line.startswith("!"):
+                self.got_answer = True
+                self._ask(line, "verdict", VERDICT_TIMEOUT)
+            else:
+                self._fail(
+                    "Protocol Violation",
+                    f"Output must start with '?' or '!', got: {line[:100]}",
+                )
+
+    def _ask(self, line: str, waiting: str, timeout: float):
+        data = line.encode("utf-8") + b"\n"
+        final = waiting == "verdict"
         try:
-            test_input_clean = test_input.rstrip('\n') + '\n' if test_input else ''
-            answer_clean = answer.rstrip('\n') + '\n' if answer else ''
-            interactor_input = test_input_clean + answer_clean + query + '\n'
-            
-            result = subprocess.run(
-                self.interactor_cmd,
-                input=interactor_input,
-                capture_output=True,
-                text=True,
-                timeout=1.0,
-            )
-            
-            if result.returncode != 0:
-                stderr = result.stderr if result.stderr else ""
-                logger.error(f"Interactor failed: {stderr}")
-                return None
-            
-            response = result.stdout.strip()
-            return response
-            
-        except subprocess.TimeoutExpired:
-            logger.error("Interactor timed out")
-            return None
+            if self.streaming:
+                self.engine.send(self.interactor, data, close=final)
+            else:
+                self.engine.forget(self.interactor)
+                self.interactor = self._start_interactor()
+                self.engine.send(self.interactor, self.header + data, close=True)
         except Exception as e:
             logger.error(f"Interactor exception: {e}")
-            return None
-    
-    def _check_answer(self, answer: str, test_input: str, secret_answer: str) -> Tuple[str, str]:
-        try:
-            test_input_clean = test_input.rstrip('\n') + '\n' if test_input else ''
-            answer_clean = secret_answer.rstrip('\n') + '\n' if secret_answer else ''
-            interactor_input = test_input_clean + answer_clean + answer + '\n'
-            
-            result = subprocess.run(
-                self.interactor_cmd,
-                input=interactor_input,
-                capture_output=True,
-                text=True,
-                timeout=2.0,
-            )
-            
-            output = result.stdout.strip()
-            
-            if "AC" in output or "ACCEPTED" in output.upper():
-                return "Accepted", output
-            elif "WA" in output or "WRONG" in output.upper():
-                return "Wrong Answer", output
-            elif result.returncode == 0:
-                return "Accepted", output
+            self._fail("Grader Error", "Interactor failed")
+            return
+        self.waiting = waiting
+        self.deadline = time.monotonic() + timeout
+        if final:
+            self.engine.send(self.user, b"", close=True)
+
+    def _read_reply(self):
+        # a streaming interactor answers a query with one line; every other
+        # exchange is complete once the interactor has exited
+        if self.waiting != "query" or not self.streaming:
+            return
+        buf = self.interactor.out_buf
+        end = buf.find(b"\n")
+        if end == -1:
+            return
+        reply = bytes(buf[:end]).strip()
+        del buf[: end + 1]
+        self._reply(reply)
+
+    def _reply(self, reply: bytes):
+        self.waiting = None
+        self.engine.send(self.user, reply + b"\n")
+        self._read_user_lines()
+
+    def _interactor_exited(self):
+        proc = self.interactor
+        output = bytes(proc.out_buf).decode("utf-8", errors="replace").strip()
+        if self.waiting == "verdict":
+            self.waiting = None
+            self.answer = _parse_verdict(output, proc.returncode)
+        elif self.waiting == "query":
+            if self.streaming or proc.returncode != 0:
+                logger.error(f"Interactor failed: {proc.stderr()}")
+                self._fail("Grader Error", "Interactor failed")
             else:
-                return "Wrong Answer", output
-                
-        except subprocess.TimeoutExpired:
-            return "Checker Error", "Interactor timed out"
-        except Exception as e:
-            return "Checker Error", f"Interactor exception: {str(e)}"
-
-
-def run_interactive_problem(
-    user_executable: str,
-    user_lang: str,
-    problem_dir: str,
-    test_input_path: str,
-    time_limit_ms: int,
-    memory_limit_mb: int,
-) -> Tuple[str, str, int]:
-    problem_path = Path(problem_dir)
-    
-    if user_lang == "cpp":
-        user_cmd = [user_executable]
-    elif user_lang == "python":
-        user_cmd = ["python3", user_executable]
-    elif user_lang == "java":
-        class_name = Path(user_executable).stem
-        user_cmd = ["/usr/bin/java", "-cp", str(Path(user_executable).parent), class_name]
+                proc.out_buf.clear()
+                self._reply(output.encode("utf-8"))
+
+    def tick(self, now: float):
+        if self.result is not None:
+            return
+        if self.waiting is None:
+            self.user_wall += now - self.last_tick
+        self.last_tick = now
+
+        if self.user.poll() and self.user.finished and self.waiting == "query":
+            # the program exited in the middle of a query, so nobody wants the reply
+            self.waiting = None
+        interactor = self.interactor
+        if interactor is not None and interactor.poll() and interactor.finished:
+            if self.waiting is not None:
+                self._interactor_exited()
+
+        if self.waiting is not None and now > self.deadline:
+            logger.error("Interactor timed out")
+            if self.waiting == "verdict":
+                self._fail("Checker Error", "Interactor timed out")
+            else:
+                self._fail("Grader Error", "Interactor failed")
+
+        if self.user.returncode is None and self.verdict is None:
+            # the clock is stopped while the interactor has the turn
+            if self.user_wall * 1000 > wall_limit(self.tl):
+                self._fail("Time Limit Exceeded", "")
+            elif self.cgroup is not None and now - self.last_usage > USAGE_INTERVAL:
+                self.last_usage = now
+                cpu_time, _, _ = read_usage(self.cgroup)
+                if cpu_time is not None and cpu_time > self.tl:
+                    self._fail("Time Limit Exceeded", "")
+
+        if not self.user.finished or self.waiting == "verdict":
+            return
+        if self.interactor is not None and not self.interactor.finished:
+            self.interactor.kill()
+            return
+        self._finish()
+
+    def _finish(self):
+        self.engine.forget(self.user)
+        self.engine.forget(self.interactor)
+
+        cpu_time = 0
+        memory = -1
+        oom_killed = False
+        if self.user is not None and self.user.rusage is not None:
+            rusage = self.user.rusage
+            cpu_time = int((rusage.ru_utime + rusage.ru_stime) * 1000)
+        if self.cgroup is not None:
+            cgroup_cpu_time, cgroup_memory, oom_killed = read_usage(self.cgroup)
+            remove_run_cgroup(self.cgroup)
+            if cgroup_cpu_time is not None:
+                cpu_time = cgroup_cpu_time
+            if cgroup_memory is not None:
+                memory = cgroup_memory
+
+        if self.verdict == "Cancelled":
+            self.result = ("Cancelled", "", 0, 0)
+        elif self.verdict == "Time Limit Exceeded" or cpu_time > self.tl:
+            self.result = ("Time Limit Exceeded", "", self.tl, memory)
+        elif self.verdict is not None:
+            self.result = (self.verdict, self.message, cpu_time, memory)
+        elif self.user.returncode != 0:
+            stderr_text = self.user.stderr()
+            # the same signals as in run_code
+            if self.cgroup is not None:
+                out_of_memory = oom_killed or memory >= self.ml * 1024
+            else:
+                # without a cgroup, an unexplained SIGKILL is the OOM killer
+                out_of_memory = self.user.returncode in (-9, 128 + 9)
+            if out_of_memory or (
+                self.user_lang == "python"
+                and _python_memory_error(self.user.stderr_path)
+            ):
+                self.result = ("Memory Limit Exceeded", stderr_text, cpu_time, memory)
+            else:
+                self.result = ("Runtime Error", stderr_text, cpu_time, memory)
+        elif not self.got_answer:
+            self.result = (
+                "Runtime Error",
+                "Program exited without submitting answer",
+                cpu_time,
+                memory,
+            )
+        else:
+            verdict, message = self.answer
+            self.result = (verdict, message, cpu_time, memory)
+
+
+class InteractiveEngine:
+    """
+    Runs interactive tests in a single thread. One selector loop moves lines
+    between the pipes of every running user program and interactor, so many
+    tests can run at once without a thread per test.
+    """
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+
+    def watch(self, proc: _Process, session: InteractiveSession):
+        proc.session = session
+        self.selector.register(proc.popen.stdout, selectors.EVENT_READ, proc)
+
+    def forget(self, proc: Optional[_Process]):
+        if proc is None:
+            return
+        if proc.writing:
+            self.selector.unregister(proc.popen.stdin)
+            proc.writing = False
+        if proc.stdout_open:
+            self.selector.unregister(proc.popen.stdout)
+            proc.stdout_open = False
+        proc.kill()
+        proc.stdin_open = False
+        proc.popen.stdin.close()
+        proc.popen.stdout.close()
+
+    def send(self, proc: _Process, data: bytes, close: bool = False):
+        if not proc.stdin_open:
+            return
+        proc.in_buf += data
+        proc.close_stdin = proc.close_stdin or close
+        self._flush(proc)
+
+    def _flush(self, proc: _Process):
+        try:
+            while proc.in_buf:
+                written = os.write(proc.popen.stdin.fileno(), proc.in_buf)
+                del proc.in_buf[:written]
+        except BlockingIOError:
+            self._set_writing(proc, True)
+            return
+        except OSError:
+            # the process exited or closed its stdin; what it did not read is lost
+            proc.in_buf.clear()
+
+        self._set_writing(proc, False)
+        if proc.close_stdin:
+            proc.stdin_open = False
+            proc.popen.stdin.close()
+
+    def _set_writing(self, proc: _Process, writing: bool):
+        if writing and not proc.writing:
+            self.selector.register(proc.popen.stdin, selectors.EVENT_WRITE, proc)
+        elif not writing and proc.writing:
+            self.selector.unregister(proc.popen.stdin)
+        proc.writing = writing
+
+    def _read(self, proc: _Process):
+        try:
+            chunk = os.read(proc.popen.stdout.fileno(), 1 << 16)
+        except BlockingIOError:
+            return
+        except OSError:
+            chunk = b""
+
+        if chunk:
+            proc.out_buf += chunk
+        else:
+            self.selector.unregister(proc.popen.stdout)
+            proc.stdout_open = False
+        proc.session.on_output(proc)
+
+    def run(
+        self,
+        sessions: List[InteractiveSession],
+        slots: int,
+        on_start: Optional[Callable[[InteractiveSession], None]] = None,
+    ):
+        """
+        Runs up to slots sessions at a time. Once a test fails, every test
+        after it is cancelled, while the tests before it still finish.
+        """
+        queue = list(sessions)
+        active = []
+        first_failure = len(sessions)
+
+        try:
+            while queue or active:
+                while queue and len(active) < slots:
+                    session = queue.pop(0)
+                    if session.index > first_failure:
+                        session.result = ("Cancelled", "", 0, 0)
+                        continue
+                    if on_start is not None:
+                        on_start(session)
+                    session.start(self)
+                    active.append(session)
+
+                for key, mask in self.selector.select(POLL_INTERVAL):
+                    if mask & selectors.EVENT_WRITE:
+                        self._flush(key.data)
+                    else:
+                        self._read(key.data)
+
+                now = time.monotonic()
+                for session in list(active):
+                    session.tick(now)
+                    if session.result is None:
+                        continue
+                    active.remove(session)
+                    failed = session.result[0] != "Accepted"
+                    if failed and session.index < first_failure:
+                        first_failure = session.index
+                        for other in active:
+                            if other.index > first_failure:
+                                other.cancel()
+        finally:
+            for session in active:
+                session.abort()
+            self.selector.close()
+
+
+def _with_newline(data: bytes) -> bytes:
+    return data.rstrip(b"\n") + b"\n" if data else b""
+
+
+def _parse_verdict(output: str, returncode: int) -> Tuple[str, str]:
+    if "AC" in output or "ACCEPTED" in output.upper():
+        return "Accepted", output
+    elif "WA" in output or "WRONG" in output.upper():
+        return "Wrong Answer", output
+    elif returncode == 0:
+        return "Accepted", output
     else:
-        return "Grader Error", f"Unsupported language: {user_lang}", 0
-    
-    interactor_cmd = None
-    for ext, lang_cmd in [
-        ("interactor.py", ["python3"]),
-        ("interactor", []),
-        ("interactor.cpp", None),
-    ]:
-        path = problem_path / ext
-        if path.exists():
-            if lang_cmd is None:
-                continue
-            interactor_cmd = lang_cmd + [str(path)]
-            break
-    
-    if not interactor_cmd:
-        return "Grader Error", "Interactor not found", 0
-    
-    test_path = Path(test_input_path)
-    answer_filename = test_path.stem + "_answer" + test_path.suffix
-    answer_path = problem_path / "answer" / answer_filename
-
-    queries_filename = test_path.stem + "_queries" + test_path.suffix
-    queries_path = problem_path / "queries" / queries_filename
-    
-    runner = InteractiveRunner(
-        user_cmd=user_cmd,
-        interactor_cmd=interactor_cmd,
-        test_input_path=test_input_path,
-        answer_path=str(answer_path) if answer_path.exists() else None,
-        queries_path=str(queries_path) if queries_path.exists() else None,
-        time_limit_ms=time_limit_ms,
-        memory_limit_mb=memory_limit_mb,
-    )
-    
-    return runner.run()
+        return "Wrong Answer", output
+
+
+def interactor_command(problem_path: Path, streaming: bool) -> Optional[List[str]]:
+    """
+    A streaming interactor is started once per test and runs under nsjail. A
+    per-query interactor is started for every query, so it runs directly as
+    before: starting a jail each time would cost more than the query timeout.
+    """
+    for name, lang, argv in (
+        ("interactor.py", "python", ["/usr/bin/python3", "/subcode/interactor.py"]),
+        ("interactor", "cpp", ["/subcode/interactor"]),
+    ):
+        path = problem_path / name
+        if not path.exists():
+            continue
+        if not streaming:
+            return (["python3"] if lang == "python" else []) + [str(path)]
+        return jail_command(
+            lang,
+            False,
+            INTERACTOR_TL,
+            INTERACTOR_ML,
+            [(str(path), f"/subcode/{name}")],
+            argv,
+        )
+    return None
+
+
+def _read_optional(path: Path) -> bytes:
+    try:
+        return path.read_bytes()
+    except OSError:
+        return b""
+
+
+def run_interactive_tests(
+    subdir: Path,
+    entries: List[Path],
+    lang: str,
+    source_path: Path,
+    source_filename: str,
+    problem_dir: Path,
+    tl: int,
+    ml: int,
+    slots: int,
+    streaming: bool = False,
+    on_start: Optional[Callable[[InteractiveSession], None]] = None,
+) -> List[Tuple[str, str, int, int]]:
+    """Returns (verdict, message, CPU time in ms, peak memory in KB) per test."""
+    interactor_cmd = interactor_command(problem_dir, streaming)
+    if interactor_cmd is None:
+        return [("Grader Error", "Interactor not found", 0, 0)] * len(entries)
+
+    mounts, argv = user_program(subdir, lang, source_path, source_filename, ml)
+
+    sessions = []
+    for index, entry in enumerate(entries):
+        answer_path = problem_dir / "answer" / f"{entry.stem}_answer{entry.suffix}"
+        queries_path = problem_dir / "queries" / f"{entry.stem}_queries{entry.suffix}"
+
+        max_queries = DEFAULT_MAX_QUERIES
+        if queries_path.exists():
+            try:
+                max_queries = int(queries_path.read_text().strip())
+            except (OSError, ValueError) as e:
+                logger.warning(
+                    f"Failed to read query limit from {queries_path}: {e}, "
+                    "using default"
+                )
+
+        sessions.append(
+            InteractiveSession(
+                index=index,
+                name=entry.stem,
+                output_dir=subdir / "tests" / entry.name,
+                user_lang=lang,
+                user_mounts=mounts,
+                user_argv=argv,
+                interactor_cmd=interactor_cmd,
+                test_input=_read_optional(entry),
+                answer=_read_optional(answer_path),
+                max_queries=max_queries,
+                tl=tl,
+                ml=ml,
+                streaming=streaming,
+            )
+        )
+
+    InteractiveEngine().run(sessions, slots, on_start)
+    return [session.result for session in sessions]
@@ -0,0 +1,205 @@
+"""
+Timings of the grading stages, kept as histograms in the shared cache so that
+every coderunner worker adds to the same counters. A submission's timings are
+collected in a StageTimer and written out together once it is graded.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from django.core.cache import cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+LANGUAGES = ("python", "cpp", "java")
+STAGES = (
+    "queue_wait",
+    "write",
+    "compile",
+    "run",
+    # CPU time of the solution as measured in the jail, out of its run
+    "user",
+    "check",
+    "interactive",
+    "cleanup",
+    "db_update",
+    "total",
+)
+# upper bounds of the histogram buckets, in seconds; one more bucket is kept
+# for everything slower
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+def _series_key(kind, label, stage):
+    return f"grading_metrics_{kind}_{label}_{stage}"
+
+
+def _seen_key(problem_id):
+    return f"grading_metrics_seen_{problem_id}"
+
+
+def _add(counts):
+    for key, delta in counts.items():
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            cache.add(key, 0, timeout=None)
+            cache.incr(key, delta)
+
+
+class StageTimer:
+    """Collects the stage timings of one submission, by language and by problem."""
+
+    def __init__(self, language, problem_id):
+        self.language = language
+        self.problem_id = problem_id
+        self._observed = []
+        # tests are run and checked from several threads
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self._observed.append((stage, max(0.0, seconds)))
+
+    @contextmanager
+    def span(self, stage):
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - begin)
+
+    def totals(self):
+        """Returns {stage: total seconds} of what has been observed so far."""
+        totals = Counter()
+        with self._lock:
+            for stage, seconds in self._observed:
+                totals[stage] += seconds
+        return dict(totals)
+
+    def flush(self):
+        with self._lock:
+            observed, self._observed = self._observed, []
+        if not observed:
+            return
+
+        counts = Counter()
+        for stage, seconds in observed:
+            bucket = bisect_left(BUCKETS, seconds)
+            for kind, label in (
+                ("language", self.language),
+                ("problem", self.problem_id),
+            ):
+                key = _series_key(kind, label, stage)
+                counts[f"{key}_b{bucket}"] += 1
+                # kept in microseconds, as the cache only increments integers
+                counts[f"{key}_sum"] += round(seconds * 1_000_000)
+
+        try:
+            _add(counts)
+            cache.set(_seen_key(self.problem_id), True, timeout=None)
+        except Exception as e:
+            logger.warning(f"Failed to record grading metrics: {e}")
+
+
+def _read(kind, labels):
+    keys = [
+        f"{_series_key(kind, label, stage)}_{suffix}"
+        for label in labels
+        for stage in STAGES
+        for suffix in [f"b{i}" for i in range(len(BUCKETS) + 1)] + ["sum"]
+    ]
+    values = cache.get_many(keys)
+
+    series = {}
+    for label in labels:
+        for stage in STAGES:
+            key = _series_key(kind, label, stage)
+            buckets = [values.get(f"{key}_b{i}", 0) for i in range(len(BUCKETS) + 1)]
+            if any(buckets):
+                series[(label, stage)] = (buckets, values.get(f"{key}_sum", 0) / 1e6)
+    return series
+
+
+def collect(problem_ids=()):
+    """
+    Returns ({(language, stage): (buckets, sum)}, {(problem, stage): (buckets, sum)})
+    for the series that have observations. Problems are only read for the given ids.
+    """
+    seen = cache.get_many([_seen_key(pid) for pid in problem_ids])
+    problems = [pid for pid in problem_ids if _seen_key(pid) in seen]
+    return _read("language", LANGUAGES), _read("problem", problems)
+
+
+def quantile(buckets, q):
+    """Estimates the q-quantile the way Prometheus' histogram_quantile does."""
+    total = sum(buckets)
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for i, count in enumerate(buckets):
+        if seen + count >= rank and count:
+            if i == len(BUCKETS):
+                return BUCKETS[-1]
+            lower = BUCKETS[i - 1] if i else 0
+            return lower + (BUCKETS[i] - lower) * (rank - seen) / count
+        seen += count
+    return BUCKETS[-1]
+
+
+def summarize(series):
+    """Returns rows of count, mean and approximate percentiles, in seconds."""
+    rows = []
+    for (label, stage), (buckets, total) in sorted(
+        series.items(), key=lambda item: (str(item[0][0]), STAGES.index(item[0][1]))
+    ):
+        count = sum(buckets)
+        rows.append(
+            {
+                "label": label,
+                "stage": stage,
+                "count": count,
+                "mean": total / count,
+                "p50": quantile(buckets, 0.5),
+                "p95": quantile(buckets, 0.95),
+                "p99": quantile(buckets, 0.99),
+            }
+        )
+    return rows
+
+
+def _histogram_lines(name, label_name, series):
+    lines = []
+    for (label, stage), (buckets, total) in sorted(
+        series.items(), key=lambda item: (str(item[0][0]), STAGES.index(item[0][1]))
+    ):
+        labels = f'{label_name}="{label}",stage="{stage}"'
+        cumulative = 0
+        for bound, count in zip(BUCKETS, buckets):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {sum(buckets)}')
+        lines.append(f"{name}_sum{{{labels}}} {total}")
+        lines.append(f"{name}_count{{{labels}}} {sum(buckets)}")
+    return lines
+
+
+def render_prometheus(problem_ids=()):
+    """The histograms in the Prometheus text exposition format."""
+    by_language, by_problem = collect(problem_ids)
+    lines = [
+        "# HELP autograder_grading_stage_seconds Time spent in each grading stage.",
+        "# TYPE autograder_grading_stage_seconds histogram",
+        *_histogram_lines("autograder_grading_stage_seconds", "language", by_language),
+        "# HELP autograder_problem_grading_stage_seconds Time spent in each grading "
+        "stage, by problem.",
+        "# TYPE autograder_problem_grading_stage_seconds histogram",
+        *_histogram_lines(
+            "autograder_problem_grading_stage_seconds", "problem", by_problem
+        ),
+    ]
+    return "\n".join(lines) + "\n"
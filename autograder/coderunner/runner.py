@@ -1,86 +1,87 @@
+import os
 import subprocess
+import threading
 import time
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 from django.conf import settings
+from .cgroups import create_run_cgroup, read_usage, remove_run_cgroup
 import logging
 
 logger = logging.getLogger(__name__)
 
+POLL_INTERVAL = 0.005
+MAX_STDERR = 64 * 1024
 
-def run_code(
-    subdir: Path,
-    input_path: Optional[Path],
+
+NSJAIL_CONFIG_DIR = "/home/tjctgrader/autograder/autograder/coderunner/nsjail_configs/"
+NSJAIL_CONFIGS = {
+    ("cpp", False): "executable.cfg",
+    ("cpp", True): "executablechecker.cfg",
+    ("python", False): "python.cfg",
+    ("python", True): "pythonchecker.cfg",
+    ("java", False): "java.cfg",
+    ("java", True): "java.cfg",
+}
+
+
+def wall_limit(tl: int) -> int:
+    return tl * 2 + 1000
+
+
+def jail_command(
     lang: str,
-    source_path: Path,
-    source_filename: str,
+    checker: bool,
     tl: int,
     ml: int,  # in MB
-    checker: bool,
-    checker_testid: Optional[str],
-    checker_problemid: Optional[str],
-) -> Tuple[str, str, int]:
+    mounts: List[Tuple[str, str]],
+    argv: List[str],
+    cgroup: Optional[Path] = None,
+) -> List[str]:
     if not settings.DEBUG:
         cmd = ["/usr/bin/sudo", "/usr/bin/nsjail"]
     else:
         cmd = ["/usr/bin/nsjail"]
 
+    cmd += ["--config", NSJAIL_CONFIG_DIR + NSJAIL_CONFIGS[(lang, checker)]]
+
+    # Limits have to come after --config, which resets every option it does not
+    # set. The CPU rlimit and the wall clock limit are only backstops; the time
+    # limit itself is enforced by the caller in milliseconds of CPU time.
     cmd += [
         "--time_limit",
-        str(tl // 1000),
+        str(-(-wall_limit(tl) // 1000)),
+        "--rlimit_cpu",
+        str(-(-tl // 1000) + 1),
         "--cgroup_mem_max",
         str(ml * 1024 * 1024),
         "--cgroup_pids_max",
         "256",
     ]
 
-    cfg = (
-        "/home/tjctgrader/autograder/autograder/coderunner/"
-        + {
-            ("cpp", False): "nsjail_configs/executable.cfg",
-            ("cpp", True): "nsjail_configs/executablechecker.cfg",
-            ("python", False): "nsjail_configs/python.cfg",
-            ("python", True): "nsjail_configs/pythonchecker.cfg",
-            ("java", False): "nsjail_configs/java.cfg",
-            ("java", True): "nsjail_configs/java.cfg",
-        }[(lang, checker)]
-    )
-
-    cmd += ["--config", cfg]
-
-    # mount code into jail
-    if lang == "python":
-        cmd += ["-R", f"{source_path}:{'/subcode/' + source_filename}"]
-    elif lang == "cpp":
-        cmd += ["-R", f"{subdir / 'usercode'}:/subcode/usercode"]
-    elif lang == "java":
-        class_dir = source_path.parent
-        cmd += ["-R", f"{class_dir}:/subcode"]
-    else:
-        raise RuntimeError("Unsupported language")
+    if cgroup is not None:
+        cmd += ["--use_cgroupv2", "--cgroupv2_mount", str(cgroup)]
 
-    if checker:
-        cmd += [
-            "-R",
-            f"/home/tjctgrader/problems/{checker_problemid}/sol/{checker_testid}:/subcode/sol.txt",
-            "-R",
-            f"/home/tjctgrader/problems/{checker_problemid}/test/{checker_testid}:/subcode/test.txt",
-            "-R",
-            f"{subdir}/output.txt:/subcode/output.txt",
-        ]
+    for src, dst in mounts:
+        cmd += ["-R", f"{src}:{dst}"]
+
+    return cmd + ["--"] + argv
 
-    cmd += ["--"]
 
-    # command to run inside jail
-    if lang == "cpp":
-        cmd += ["/subcode/usercode"]
-    elif lang == "python" and not checker:
-        cmd += ["/usr/bin/python3", f"/subcode/{source_filename}"]
-    elif lang == "python" and checker:
-        cmd += ["/usr/bin/python3", "/subcode/default_checker.py"]
+def user_program(
+    subdir: Path, lang: str, source_path: Path, source_filename: str, ml: int
+) -> Tuple[List[Tuple[str, str]], List[str]]:
+    """Returns the mounts and the command line that run the code in the jail."""
+    if lang == "python":
+        mounts = [(str(source_path), f"/subcode/{source_filename}")]
+        argv = ["/usr/bin/python3", f"/subcode/{source_filename}"]
+    elif lang == "cpp":
+        mounts = [(str(subdir / "usercode"), "/subcode/usercode")]
+        argv = ["/subcode/usercode"]
     elif lang == "java":
         class_name = source_filename.split(".")[0] or "usercode"
-        cmd += [
+        mounts = [(str(source_path.parent), "/subcode")]
+        argv = [
             "/usr/bin/java",
             "-XX:+UseSerialGC",
             "-Xss256k",
@@ -89,36 +90,141 @@ def run_code(
         ]
     else:
         raise RuntimeError("Unsupported language")
+    return mounts, argv
 
-    out_path = subdir / ("checker_output.txt" if checker else "output.txt")
 
-    stdin_file = open(input_path, "rb") if input_path else None
-    stdout_file = open(out_path, "wb")
+def _python_memory_error(err_path: Path) -> bool:
+    """Whether a Python traceback in err_path ends in a MemoryError."""
+    with open(err_path, "rb") as f:
+        f.seek(max(0, f.seek(0, os.SEEK_END) - 4096))
+        lines = f.read().decode("utf-8", errors="ignore").strip().splitlines()
+    return bool(lines) and lines[-1].startswith("MemoryError")
 
-    start = time.time()
-    proc = subprocess.Popen(
-        cmd,
-        stdin=stdin_file,
-        stdout=stdout_file,
-        stderr=subprocess.PIPE,
-    )
-    _, stderr = proc.communicate()
-    elapsed = int((time.time() - start) * 1000)
 
-    if stdin_file:
-        stdin_file.close()
-    stdout_file.close()
+def run_code(
+    subdir: Path,
+    input_path: Optional[Path],
+    lang: str,
+    source_path: Path,
+    source_filename: str,
+    tl: int,
+    ml: int,  # in MB
+    checker: bool,
+    checker_testid: Optional[str],
+    checker_problemid: Optional[str],
+    output_dir: Optional[Path] = None,
+    cancel_event: Optional[threading.Event] = None,
+) -> Tuple[str, str, int, int]:
+    # Returns (output or verdict, insight, CPU time in ms, peak memory in KB).
+    # output_dir keeps the output of concurrently running tests apart;
+    # setting cancel_event kills the jail and returns "Cancelled"
+    if output_dir is None:
+        output_dir = subdir
+
+    # the checker is mounted as default_checker.py and run like user code
+    mounts, argv = user_program(subdir, lang, source_path, source_filename, ml)
+    if checker:
+        mounts += [
+            (
+                f"/home/tjctgrader/problems/{checker_problemid}/sol/{checker_testid}",
+                "/subcode/sol.txt",
+            ),
+            (
+                f"/home/tjctgrader/problems/{checker_problemid}/test/{checker_testid}",
+                "/subcode/test.txt",
+            ),
+            (f"{output_dir}/output.txt", "/subcode/output.txt"),
+        ]
 
-    if elapsed >= tl:
-        return "Time Limit Exceeded", "", tl
+    cgroup = create_run_cgroup()
+    cmd = jail_command(lang, checker, tl, ml, mounts, argv, cgroup)
 
-    if proc.returncode != 0:
-        stderr_text = stderr.decode("utf-8", errors="ignore")
-        return "Runtime Error", stderr_text, elapsed
+    out_path = output_dir / ("checker_output.txt" if checker else "output.txt")
+    err_path = output_dir / ("checker_stderr.txt" if checker else "stderr.txt")
+
+    stdin_file = open(input_path, "rb") if input_path else None
+    stdout_file = open(out_path, "wb")
+    stderr_file = open(err_path, "wb")
 
     try:
-        output_text = out_path.read_text()
-    except Exception:
-        output_text = ""
+        start = time.monotonic()
+        proc = subprocess.Popen(
+            cmd,
+            stdin=stdin_file,
+            stdout=stdout_file,
+            stderr=stderr_file,
+        )
+        killed = None
+        while True:
+            # wait4 also reports the CPU time of the reaped jail and its children
+            pid, status, rusage = os.wait4(proc.pid, os.WNOHANG)
+            if pid != 0:
+                break
+
+            if killed is None:
+                if cancel_event is not None and cancel_event.is_set():
+                    killed = "Cancelled"
+                elif (time.monotonic() - start) * 1000 > wall_limit(tl):
+                    killed = "Time Limit Exceeded"
+                if killed is not None:
+                    # sudo forwards SIGTERM to nsjail, which kills the jail
+                    proc.terminate()
+            time.sleep(POLL_INTERVAL)
+        elapsed = (time.monotonic() - start) * 1000
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    except BaseException:
+        if cgroup is not None:
+            remove_run_cgroup(cgroup)
+        raise
+    finally:
+        if stdin_file:
+            stdin_file.close()
+        stdout_file.close()
+        stderr_file.close()
+
+    # The run cgroup only contains the jailed process, so prefer its accounting.
+    # ru_maxrss is no use as a fallback for memory: it includes the worker's own
+    # resident set, which the forked child carries until it execs.
+    cpu_time = int((rusage.ru_utime + rusage.ru_stime) * 1000)
+    memory = -1
+    oom_killed = False
+    if cgroup is not None:
+        cgroup_cpu_time, cgroup_memory, oom_killed = read_usage(cgroup)
+        remove_run_cgroup(cgroup)
+        if cgroup_cpu_time is not None:
+            cpu_time = cgroup_cpu_time
+        if cgroup_memory is not None:
+            memory = cgroup_memory
+
+    if killed == "Cancelled":
+        return "Cancelled", "", 0, 0
+
+    if killed is not None or cpu_time > tl:
+        return "Time Limit Exceeded", "", tl, memory
+
+    if proc.returncode != 0:
+        with open(err_path, "rb") as f:
+            stderr_text = f.read(MAX_STDERR).decode("utf-8", errors="ignore")
+        sigkill = proc.returncode in (-9, 128 + 9)
+        if sigkill and elapsed >= wall_limit(tl):
+            # nsjail's own wall clock limit, which rounds up to whole seconds
+            return "Time Limit Exceeded", "", tl, memory
+        if cgroup is not None:
+            out_of_memory = oom_killed or (memory is not None and memory >= ml * 1024)
+        else:
+            # without cgroup accounting, a SIGKILL that was not a time limit
+            # kill can only have come from the OOM killer
+            out_of_memory = sigkill
+        if out_of_memory or (lang == "python" and _python_memory_error(err_path)):
+            return "Memory Limit Exceeded", stderr_text, cpu_time, memory
+        return "Runtime Error", stderr_text, cpu_time, memory
+
+    # only checker output is read back; user output is compared from the file
+    output_text = ""
+    if checker:
+        try:
+            output_text = out_path.read_text()
+        except Exception:
+            pass
 
-    return output_text, "", elapsed
+    return output_text, "", cpu_time, memory
@@ -0,0 +1,92 @@
+import hashlib
+from pathlib import Path
+from typing import Optional
+from django.conf import settings
+from django.core.cache import cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_FILE = "fingerprint"
+
+
+def compute_fingerprint(problem_base_path: Path) -> str:
+    h = hashlib.sha256()
+    for dirname in ("test", "sol"):
+        directory = problem_base_path / dirname
+        if not directory.exists():
+            continue
+        for path in sorted(directory.iterdir()):
+            h.update(f"{dirname}/{path.name}\0".encode("utf-8"))
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+            h.update(b"\0")
+    return h.hexdigest()
+
+
+def write_fingerprint(problem_base_path: Path) -> str:
+    fingerprint = compute_fingerprint(problem_base_path)
+    (problem_base_path / FINGERPRINT_FILE).write_text(fingerprint)
+    return fingerprint
+
+
+def clear_fingerprint(problem_base_path: Path):
+    # without the file the fingerprint is recomputed from the tests on disk
+    (problem_base_path / FINGERPRINT_FILE).unlink(missing_ok=True)
+
+
+def problem_fingerprint(problem_base_path: Path) -> str:
+    try:
+        return (problem_base_path / FINGERPRINT_FILE).read_text().strip()
+    except OSError:
+        return write_fingerprint(problem_base_path)
+
+
+def checker_fingerprint(problem_base_path: Path) -> str:
+    # read every time, as the checker can change without new tests being uploaded
+    try:
+        checker = (problem_base_path / "default_checker.py").read_bytes()
+    except OSError:
+        checker = b""
+    builtin = "builtin" if settings.CODERUNNER_BUILTIN_CHECKER else "jailed"
+    return f"{builtin}:{hashlib.sha256(checker).hexdigest()}"
+
+
+def cache_key(problem_base_path: Path, lang: str, code: str, tl: int, ml: int) -> str:
+    h = hashlib.sha256()
+    for part in (
+        problem_fingerprint(problem_base_path),
+        checker_fingerprint(problem_base_path),
+        lang,
+        str(tl),
+        str(ml),
+        code,
+    ):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return f"verdict_{h.hexdigest()}"
+
+
+def is_cacheable(verdict: str) -> bool:
+    # timing and memory verdicts depend on machine load, so they are always rejudged
+    return verdict in ("Accepted", "Compilation Error") or verdict.startswith(
+        "Wrong Answer on test"
+    )
+
+
+def lookup(key: str) -> Optional[dict]:
+    try:
+        return cache.get(key)
+    except Exception as e:
+        logger.warning(f"Verdict cache lookup failed: {e}")
+        return None
+
+
+def store(key: str, result: dict):
+    if not is_cacheable(result.get("verdict", "")):
+        return
+    try:
+        cache.set(key, result, timeout=settings.CODERUNNER_VERDICT_CACHE_TTL)
+    except Exception as e:
+        logger.warning(f"Verdict cache store failed: {e}")
@@ -222,11 +222,65 @@ CELERY_TASK_TIME_LIMIT = 30 * 60
 
 CELERY_QUEUES = {
     "default": {},
+    "coderunner_live": {"exchange": "coderunner", "routing_key": "coderunner_live"},
     "coderunner_queue": {"exchange": "coderunner", "routing_key": "coderunner"},
+    "coderunner_rejudge": {
+        "exchange": "coderunner",
+        "routing_key": "coderunner_rejudge",
+    },
 }
 
+# Workers drain the queues they consume in the order given to -Q instead of
+# round-robin, so live contest submissions always go before practice and rejudges
+CELERY_BROKER_TRANSPORT_OPTIONS = {"queue_order_strategy": "priority"}
+
 CELERY_TASK_DEFAULT_QUEUE = "default"
 
+# Number of sandboxes a single submission may use at once to run its tests
+CODERUNNER_PARALLEL_SLOTS = config("CODERUNNER_PARALLEL_SLOTS", default=1, cast=int)
+
+# Compare against the stock default_checker.py in-process instead of in nsjail
+CODERUNNER_BUILTIN_CHECKER = config(
+    "CODERUNNER_BUILTIN_CHECKER", default=True, cast=bool
+)
+
+# Compiled C++ binaries and Java classes, keyed by a hash of source and compiler
+CODERUNNER_COMPILE_CACHE_DIR = config(
+    "CODERUNNER_COMPILE_CACHE_DIR", default="/home/tjctgrader/compile_cache"
+)
+CODERUNNER_COMPILE_CACHE_MAX_MB = config(
+    "CODERUNNER_COMPILE_CACHE_MAX_MB", default=512, cast=int
+)
+
+# A cgroup v2 directory the coderunner may create children in, with the cpu,
+# memory and pids controllers enabled in its cgroup.subtree_control. Every run
+# gets its own cgroup there, which is where CPU time, peak memory and OOM kills
+# are read from. Without it, memory usage is not measured.
+CODERUNNER_CGROUP_ROOT = config("CODERUNNER_CGROUP_ROOT", default="")
+
+# Reuse deterministic verdicts of byte-identical submissions to the same tests
+CODERUNNER_VERDICT_CACHE = config("CODERUNNER_VERDICT_CACHE", default=False, cast=bool)
+CODERUNNER_VERDICT_CACHE_TTL = 7 * 24 * 60 * 60
+
+# Past this many pending submissions, the interval between two practice
+# submissions of a user grows with the backlog, up to the max interval (seconds)
+CODERUNNER_BACKLOG_THRESHOLD = config(
+    "CODERUNNER_BACKLOG_THRESHOLD", default=50, cast=int
+)
+CODERUNNER_BACKLOG_MAX_INTERVAL = config(
+    "CODERUNNER_BACKLOG_MAX_INTERVAL", default=600, cast=int
+)
+
+# The function that grades a submission. Load tests on machines without nsjail
+# can use autograder.coderunner.fake_runner.run_code_handler instead
+CODERUNNER_HANDLER = config(
+    "CODERUNNER_HANDLER", default="autograder.coderunner.handlers.run_code_handler"
+)
+
+# Bearer token a Prometheus scraper sends for /status/metrics/; staff sessions
+# can read it without one
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+
 SESSION_COOKIE_SECURE = False
 CSRF_COOKIE_SECURE = False
 SECURE_SSL_REDIRECT = False
@@ -237,6 +291,25 @@ if not DEBUG:
     SECURE_SSL_REDIRECT = True
     SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 
+# Codeforces ratings are fetched this many handles per user.info request, at
+# most one request per interval (seconds), as the API asks
+CODEFORCES_API_URL = config("CODEFORCES_API_URL", default="https://codeforces.com/api")
+CODEFORCES_BATCH_SIZE = config("CODEFORCES_BATCH_SIZE", default=300, cast=int)
+CODEFORCES_API_INTERVAL = config("CODEFORCES_API_INTERVAL", default=2, cast=float)
+# Saving a user refreshes their rating only if it is older than this (seconds)
+# or their handle changed
+CODEFORCES_RATING_TTL = config("CODEFORCES_RATING_TTL", default=24 * 60 * 60, cast=int)
+
+# Shared by the web and coderunner processes, which count cache hits, debounce
+# broadcasts and read cached standings through it; the default in-memory cache
+# would give every process its own copy
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": "redis://redis:6379/1" if DEBUG else "redis://127.0.0.1:6379/1",
+    }
+}
+
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
@@ -0,0 +1,401 @@
+"""
+Submits a mix of solutions to a running grader at a target rate, follows each
+one over ws/submissions/ until its verdict arrives and writes a JSON report of
+submit-to-verdict latency and throughput.
+
+    python config/scripts/load_test.py --rate 5 --count 200 --mix mix.json
+
+The mix is a JSON list of entries such as
+
+    {"problem": 1, "lang": "cpp", "source": "config/example_sols/example_sol.cpp",
+     "verdict": "Accepted", "weight": 3}
+
+where verdict is the one the entry is expected to get. With --fake, a directive
+for autograder.coderunner.fake_runner is added to each source so it returns
+that verdict, which lets the grader run with CODERUNNER_HANDLER set to the
+fake runner on a machine without nsjail. The account must be staff, as other
+users can only submit every 30 seconds.
+"""
+
+import argparse
+import base64
+import json
+import os
+import random
+import socket
+import ssl
+import struct
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlparse
+
+import requests
+
+EXAMPLE_SOLS = Path(__file__).resolve().parent.parent / "example_sols"
+DEFAULT_MIX = [
+    {"lang": "cpp", "source": str(EXAMPLE_SOLS / "example_sol.cpp")},
+    {"lang": "java", "source": str(EXAMPLE_SOLS / "example_sol.java")},
+    {"lang": "python", "source": str(EXAMPLE_SOLS / "example_sol.py")},
+]
+COMMENT = {"cpp": "//", "java": "//", "python": "#"}
+PERCENTILES = (50, 90, 95, 99)
+
+
+class WebSocket:
+    """Just enough of RFC 6455 to follow the submission status consumer."""
+
+    def __init__(self, url, cookies):
+        parsed = urlparse(url)
+        secure = parsed.scheme == "wss"
+        port = parsed.port or (443 if secure else 80)
+        sock = socket.create_connection((parsed.hostname, port))
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(
+                sock, server_hostname=parsed.hostname
+            )
+        self.sock = sock
+        self.buffer = b""
+        self.lock = threading.Lock()
+
+        key = base64.b64encode(os.urandom(16)).decode()
+        cookie = "; ".join(f"{name}={value}" for name, value in cookies.items())
+        sock.sendall(
+            (
+                f"GET {parsed.path or '/'} HTTP/1.1\r\n"
+                f"Host: {parsed.netloc}\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                f"Sec-WebSocket-Key: {key}\r\n"
+                "Sec-WebSocket-Version: 13\r\n"
+                f"Cookie: {cookie}\r\n\r\n"
+            ).encode()
+        )
+        while b"\r\n\r\n" not in self.buffer:
+            self._fill()
+        head, self.buffer = self.buffer.split(b"\r\n\r\n", 1)
+        status = head.split(b"\r\n", 1)[0].decode()
+        if " 101 " not in status:
+            raise ConnectionError(f"Websocket handshake failed: {status}")
+
+    def _fill(self):
+        data = self.sock.recv(65536)
+        if not data:
+            raise ConnectionError("Websocket closed")
+        self.buffer += data
+
+    def _read(self, n):
+        while len(self.buffer) < n:
+            self._fill()
+        data, self.buffer = self.buffer[:n], self.buffer[n:]
+        return data
+
+    def _send_frame(self, opcode, payload):
+        header = bytes([0x80 | opcode])
+        if len(payload) < 126:
+            header += bytes([0x80 | len(payload)])
+        elif len(payload) < 1 << 16:
+            header += bytes([0x80 | 126]) + struct.pack("!H", len(payload))
+        else:
+            header += bytes([0x80 | 127]) + struct.pack("!Q", len(payload))
+        mask = os.urandom(4)
+        masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        with self.lock:
+            self.sock.sendall(header + mask + masked)
+
+    def send(self, text):
+        self._send_frame(0x1, text.encode())
+
+    def recv(self):
+        """Returns the next text message, or None once the server closes."""
+        message = b""
+        while True:
+            first, second = self._read(2)
+            opcode = first & 0x0F
+            length = second & 0x7F
+            if length == 126:
+                length = struct.unpack("!H", self._read(2))[0]
+            elif length == 127:
+                length = struct.unpack("!Q", self._read(8))[0]
+            payload = self._read(length)
+            if opcode == 0x8:
+                return None
+            if opcode == 0x9:
+                self._send_frame(0xA, payload)
+                continue
+            if opcode in (0x0, 0x1):
+                message += payload
+                if first & 0x80:
+                    return message.decode()
+
+    def close(self):
+        try:
+            self._send_frame(0x8, b"")
+        finally:
+            self.sock.close()
+
+
+def is_final(message):
+    return message not in ("Compiling", "Waiting in Queue") and not message.startswith(
+        "Running on test"
+    )
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def summarize(latencies):
+    return {
+        "count": len(latencies),
+        "mean": sum(latencies) / len(latencies) if latencies else None,
+        **{f"p{p}": percentile(latencies, p) for p in PERCENTILES},
+        "max": max(latencies, default=None),
+    }
+
+
+class LoadTest:
+    def __init__(self, args, mix):
+        self.args = args
+        self.mix = mix
+        self.base = args.url.rstrip("/")
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        # submission id -> (mix index, submit time, expected verdict)
+        self.pending = {}
+        self.results = []
+        self.errors = Counter()
+        self.early = {}
+        self.sent_all = False
+        self.done = threading.Event()
+
+    def login(self):
+        session = requests.Session()
+        login_url = f"{self.base}/djangoadmin/login/"
+        session.get(login_url).raise_for_status()
+        response = session.post(
+            login_url,
+            data={
+                "username": self.args.username,
+                "password": self.args.password,
+                "csrfmiddlewaretoken": session.cookies["csrftoken"],
+                "next": "/",
+            },
+            headers={"Referer": login_url},
+        )
+        response.raise_for_status()
+        if "sessionid" not in session.cookies:
+            sys.exit("Login failed: check the username and password")
+        self.cookies = session.cookies.get_dict()
+
+    def session(self):
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+            self.local.session.cookies.update(self.cookies)
+        return self.local.session
+
+    def listen(self):
+        while True:
+            try:
+                text = self.ws.recv()
+            except (ConnectionError, OSError):
+                text = None
+            if text is None:
+                self.done.set()
+                return
+            data = json.loads(text)
+            if "message" not in data or not is_final(data["message"]):
+                continue
+            now = time.perf_counter()
+            submission_id = int(data["submission_id"])
+            with self.lock:
+                if submission_id not in self.pending:
+                    # the verdict beat the response to the submission
+                    self.early[submission_id] = (now, data["message"])
+                    continue
+                self._finish(submission_id, now, data["message"])
+
+    def _finish(self, submission_id, now, verdict):
+        index, submitted, expected = self.pending.pop(submission_id)
+        self.results.append(
+            {
+                "id": submission_id,
+                "entry": index,
+                "latency": now - submitted,
+                "verdict": verdict,
+                "expected": expected,
+            }
+        )
+        if not self.pending and self.sent_all:
+            self.done.set()
+
+    def submit(self, index):
+        entry = self.mix[index]
+        session = self.session()
+        begin = time.perf_counter()
+        try:
+            response = session.post(
+                f"{self.base}/status/process_submit/",
+                data={
+                    "problemid": entry["problem"],
+                    "lang": entry["lang"],
+                    "code": entry["code"],
+                    "csrfmiddlewaretoken": self.cookies["csrftoken"],
+                },
+                headers={"Referer": f"{self.base}/status/submit/"},
+                allow_redirects=False,
+            )
+        except requests.RequestException as e:
+            with self.lock:
+                self.errors[type(e).__name__] += 1
+            return
+        submission_id = response.headers.get("X-Submission-Id")
+        if submission_id is None:
+            with self.lock:
+                self.errors[f"HTTP {response.status_code}"] += 1
+            return
+
+        submission_id = int(submission_id)
+        self.ws.send(
+            json.dumps({"type": "join_submissions", "submission_ids": [submission_id]})
+        )
+        with self.lock:
+            self.pending[submission_id] = (index, begin, entry.get("verdict"))
+            if submission_id in self.early:
+                now, verdict = self.early.pop(submission_id)
+                self._finish(submission_id, now, verdict)
+
+    def run(self):
+        args = self.args
+        self.login()
+        ws_base = "ws" + self.base[len("http") :]
+        self.ws = WebSocket(f"{ws_base}/ws/submissions/", self.cookies)
+        threading.Thread(target=self.listen, daemon=True).start()
+
+        rng = random.Random(args.seed)
+        weights = [entry.get("weight", 1) for entry in self.mix]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for i in range(args.count):
+                # open loop: submissions go out on schedule however slow the grader is
+                delay = start + i / args.rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self.submit, rng.choices(range(len(self.mix)), weights)[0])
+        sent_elapsed = time.perf_counter() - start
+        with self.lock:
+            self.sent_all = True
+            if not self.pending:
+                self.done.set()
+
+        self.done.wait(args.timeout)
+        elapsed = time.perf_counter() - start
+        self.ws.close()
+        return self.report(sent_elapsed, elapsed)
+
+    def report(self, sent_elapsed, elapsed):
+        latencies = [r["latency"] for r in self.results]
+        by_entry = defaultdict(list)
+        for result in self.results:
+            by_entry[result["entry"]].append(result)
+
+        entries = []
+        for index, entry in enumerate(self.mix):
+            results = by_entry[index]
+            entries.append(
+                {
+                    "problem": entry["problem"],
+                    "lang": entry["lang"],
+                    "source": entry["source"],
+                    "expected": entry.get("verdict"),
+                    "latency": summarize([r["latency"] for r in results]),
+                    "verdicts": dict(Counter(r["verdict"] for r in results)),
+                }
+            )
+
+        return {
+            "config": {
+                "url": self.base,
+                "rate": self.args.rate,
+                "count": self.args.count,
+                "concurrency": self.args.concurrency,
+                "fake": self.args.fake,
+                "seed": self.args.seed,
+            },
+            "submitted": len(self.results) + len(self.pending),
+            "completed": len(self.results),
+            "timed_out": len(self.pending),
+            "errors": dict(self.errors),
+            "unexpected_verdicts": sum(
+                1
+                for r in self.results
+                if r["expected"] is not None and r["verdict"] != r["expected"]
+            ),
+            "offered_rate": self.args.count / sent_elapsed if sent_elapsed else None,
+            "throughput": len(self.results) / elapsed if elapsed else None,
+            "elapsed": elapsed,
+            "latency": summarize(latencies),
+            "entries": entries,
+        }
+
+
+def load_mix(args):
+    mix = json.loads(Path(args.mix).read_text()) if args.mix else DEFAULT_MIX
+    for entry in mix:
+        entry.setdefault("problem", args.problem)
+        entry["code"] = Path(entry["source"]).read_text()
+        if args.fake:
+            comment = COMMENT[entry["lang"]]
+            entry["code"] += (
+                f"\n{comment} FAKE_VERDICT: {entry.get('verdict', 'Accepted')}\n"
+            )
+            if "seconds" in entry:
+                entry["code"] += f"{comment} FAKE_SECONDS: {entry['seconds']}\n"
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="http://127.0.0.1:3000")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="123")
+    parser.add_argument("--mix", help="JSON file of weighted submissions")
+    parser.add_argument(
+        "--problem", type=int, default=1, help="problem of mix entries without one"
+    )
+    parser.add_argument("--rate", type=float, default=2, help="submissions per second")
+    parser.add_argument("--count", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--timeout", type=float, default=300, help="seconds to wait for verdicts"
+    )
+    parser.add_argument("--fake", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report", default="load_test_report.json")
+    args = parser.parse_args()
+
+    report = LoadTest(args, load_mix(args)).run()
+    Path(args.report).write_text(json.dumps(report, indent=2))
+
+    latency = report["latency"]
+    print(
+        f"{report['completed']}/{report['submitted']} graded, "
+        f"{report['timed_out']} timed out, errors {report['errors']}"
+    )
+    if latency["count"]:
+        print(
+            f"latency p50 {latency['p50']:.2f}s p95 {latency['p95']:.2f}s "
+            f"p99 {latency['p99']:.2f}s max {latency['max']:.2f}s, "
+            f"throughput {report['throughput']:.2f}/s"
+        )
+    print(f"Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()